@@ -0,0 +1,353 @@
+"""
+Benchmarks the assembler on the bundled programs and on synthetic ones.
+
+Usage: python3 Benchmark.py [--synthetic N ...] [--repeats R]
+                            [--history PATH] [--codec] [<.asm file> ...]
+
+For every input the assembler is run phase by phase, as Main runs it
+(parse, the first pass that defines the labels, the second pass that
+encodes the commands and allocates the variables, write), reporting the
+best time of a few repeats, the peak memory allocated during the phase and
+the throughput in instructions per second. The whole-file assembler modes
+are timed as well, and their outputs are compared to make sure that all of
+them produce the same .hack file.
+
+Every run is appended as one JSON line to the history file (by default in
+the temporary directory, outside of the source tree), and the totals are
+compared to the previous run in the history, to spot regressions.
+
+--codec instead compares the NumPy text .hack codec of HackFile to per-line
+int(x, 2) and decimal_to_binary_16bit calls, on the output of Pong.asm.
+"""
+import argparse
+import array
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing
+import HackFile
+from Main import ASSEMBLER_VERSION, assemble_file, \
+    assemble_file_single_pass, assemble_file_streaming, \
+    decimal_to_binary_16bit, define_labels, encode_instructions, \
+    write_words
+from Parser import Parser
+from SymbolTable import ROM_SIZE, SymbolTable
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INPUTS = [
+    os.path.join(BENCHMARK_DIRECTORY, "add", "Add.asm"),
+    os.path.join(BENCHMARK_DIRECTORY, "max", "Max.asm"),
+    os.path.join(BENCHMARK_DIRECTORY, "rect", "Rect.asm"),
+    os.path.join(BENCHMARK_DIRECTORY, "pong", "Pong.asm"),
+    os.path.join(BENCHMARK_DIRECTORY, "pong", "PongL.asm"),
+]
+DEFAULT_HISTORY = os.path.join(tempfile.gettempdir(),
+                               f"hack-assembler-benchmark-{os.getuid()}.jsonl")
+MODES = {
+    "two-pass": assemble_file,
+    "single-pass": assemble_file_single_pass,
+    "streaming": assemble_file_streaming,
+}
+PHASES = ("parse", "first pass", "second pass", "write")
+REPEATS = 5
+
+# labels are only defined below this address, so they fit in the ROM:
+SYNTHETIC_LABELS_END = ROM_SIZE
+SYNTHETIC_VARIABLES = 200
+
+
+def generate_program(instructions: int, output_file: typing.TextIO,
+                     seed: int = 0) -> None:
+    """Writes a synthetic program that looks like VM translator output.
+
+    Args:
+        instructions (int): the number of instructions to generate.
+        output_file (typing.TextIO): writes the program to this file.
+        seed (int): the seed of the random generator.
+    """
+    generator = random.Random(seed)
+    labels = []
+    lines = []
+    for address in range(instructions):
+        if address < SYNTHETIC_LABELS_END and generator.random() < 0.02:
+            labels.append(f"LABEL_{len(labels)}")
+            lines.append(f"({labels[-1]})")
+        choice = generator.random()
+        if choice < 0.3:
+            lines.append(generator.choice(("@SP", "@LCL", "@ARG", "@R13")))
+        elif choice < 0.4:
+            lines.append(f"@var{generator.randrange(SYNTHETIC_VARIABLES)}")
+        elif choice < 0.5:
+            lines.append(f"@{generator.randrange(32768)}")
+        elif choice < 0.55 and labels:
+            lines.append(f"@{generator.choice(labels)}")
+        elif choice < 0.6:
+            lines.append("D;JNE  // conditional jump")
+        else:
+            lines.append(generator.choice(
+                ("AM=M-1", "D=M", "M=D", "A=A-1", "M=D+M", "D=D-A", "M=M+1",
+                 "0;JMP", "D=A", "M=-1")))
+        if len(lines) >= 65536:
+            output_file.write("\n".join(lines) + "\n")
+            lines.clear()
+    output_file.write("\n".join(lines) + "\n")
+
+
+def run_phases(source: str) -> typing.Dict[str, typing.Callable[[], None]]:
+    """Splits the assembly of a source into separately runnable phases.
+
+    Args:
+        source (str): the assembly program.
+
+    Returns:
+        typing.Dict[str, typing.Callable[[], None]]: a function per phase,
+        in the order of PHASES. Each phase uses the result of the previous
+        one, so they have to be called in order.
+    """
+    state = {}
+
+    def parse() -> None:
+        state["instructions"] = Parser.parse_lines(source.splitlines())
+
+    # the passes of assemble_instructions:
+    def first_pass() -> None:
+        symbol_table = SymbolTable()
+        define_labels(state["instructions"], symbol_table)
+        state["symbol_table"] = symbol_table
+
+    def second_pass() -> None:
+        state["words"] = array.array("H", encode_instructions(
+            state["instructions"], state["symbol_table"]))
+
+    def write() -> None:
+        with tempfile.TemporaryFile('w') as output_file:
+            write_words(state["words"], output_file)
+
+    return {"parse": parse, "first pass": first_pass,
+            "second pass": second_pass, "write": write}
+
+
+def benchmark_phases(source: str, repeats: int) \
+        -> typing.Dict[str, typing.Dict[str, float]]:
+    """Times and measures the memory of every assembler phase.
+
+    Args:
+        source (str): the assembly program.
+        repeats (int): the number of timed runs, the best one is kept.
+
+    Returns:
+        typing.Dict[str, typing.Dict[str, float]]: the best time in seconds
+        and the peak allocated memory in bytes of every phase.
+    """
+    results = {phase: {"seconds": float("inf")} for phase in PHASES}
+    for _ in range(repeats):
+        for phase, run in run_phases(source).items():
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            results[phase]["seconds"] = min(
+                results[phase]["seconds"], elapsed)
+
+    # memory is measured in a separate run, as tracing slows everything down:
+    tracemalloc.start()
+    try:
+        for phase, run in run_phases(source).items():
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+            results[phase]["peak_bytes"] = peak - baseline
+    finally:
+        tracemalloc.stop()
+    return results
+
+
+def benchmark_modes(source: str, repeats: int) -> typing.Dict[str, float]:
+    """Times every whole-file assembler mode, in memory.
+
+    Args:
+        source (str): the assembly program.
+        repeats (int): the number of timed runs, the best one is kept.
+
+    Returns:
+        typing.Dict[str, float]: the best time in seconds of every mode.
+    """
+    results = {}
+    expected_output = None
+    for mode, assemble in MODES.items():
+        best_time = float("inf")
+        for _ in range(repeats):
+            input_file = io.StringIO(source)
+            output_file = io.StringIO()
+            start = time.perf_counter()
+            assemble(input_file, output_file)
+            best_time = min(best_time, time.perf_counter() - start)
+        output = output_file.getvalue()
+        if expected_output is None:
+            expected_output = output
+        elif output != expected_output:
+            sys.exit(f"{mode} output differs from the two-pass output")
+        results[mode] = best_time
+    return results
+
+
+def benchmark_source(name: str, source: str, repeats: int) \
+        -> typing.Dict[str, typing.Any]:
+    """Benchmarks a single program and prints a report.
+
+    Args:
+        name (str): the name of the program in the report.
+        source (str): the assembly program.
+        repeats (int): the number of timed runs, the best one is kept.
+
+    Returns:
+        typing.Dict[str, typing.Any]: the results, as stored in the history.
+    """
+    phases = benchmark_phases(source, repeats)
+    instructions = sum(
+        1 for instruction in Parser.parse_lines(source.splitlines())
+        if instruction.kind != Parser.L_COMMAND)
+    total = sum(result["seconds"] for result in phases.values())
+    print(f"{name} ({instructions} instructions):")
+    for phase, result in phases.items():
+        print(f"  {phase:<12} {result['seconds'] * 1000:9.2f} ms "
+              f"{instructions / result['seconds']:12.0f} instr/s "
+              f"{result['peak_bytes'] / 1024:10.1f} KiB peak")
+    print(f"  {'total':<12} {total * 1000:9.2f} ms "
+          f"{instructions / total:12.0f} instr/s")
+    modes = benchmark_modes(source, repeats)
+    for mode, best_time in modes.items():
+        print(f"  {mode:<12} {best_time * 1000:9.2f} ms "
+              f"(x{modes['two-pass'] / best_time:.2f})")
+    return {"instructions": instructions, "phases": phases,
+            "total_seconds": total, "modes": modes}
+
+
+def benchmark_codec(path: str, repeats: int) -> None:
+    """Times decoding and encoding the text .hack output of a program, with
+    the NumPy codec and line by line.
+
+    Args:
+        path (str): path of the .asm file.
+        repeats (int): the number of timed runs, the best one is kept.
+    """
+    with open(path, 'r') as input_file:
+        output_file = io.StringIO()
+        assemble_file(input_file, output_file)
+    data = output_file.getvalue().encode("ascii")
+    words = HackFile.decode_text(data)
+    if HackFile.encode_text(words) != data:
+        sys.exit("the codec does not round-trip")
+
+    def decode_lines() -> None:
+        array.array("H", [int(line, 2) for line in data.splitlines()])
+
+    def encode_lines() -> None:
+        "".join(decimal_to_binary_16bit(word) + "\n"
+                for word in words.tolist()).encode("ascii")
+
+    print(f"{os.path.relpath(path, BENCHMARK_DIRECTORY)} "
+          f"({len(words)} words):")
+    timings = {}
+    for name, run in (("decode lines", decode_lines),
+                      ("decode numpy", lambda: HackFile.decode_text(data)),
+                      ("encode lines", encode_lines),
+                      ("encode numpy", lambda: HackFile.encode_text(words))):
+        best_time = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            run()
+            best_time = min(best_time, time.perf_counter() - start)
+        timings[name] = best_time
+        print(f"  {name:<12} {best_time * 1000:9.3f} ms")
+    for direction in ("decode", "encode"):
+        speedup = timings[f"{direction} lines"] / \
+            timings[f"{direction} numpy"]
+        print(f"  {direction} speedup x{speedup:.1f}")
+
+
+def compare_to_history(results: typing.Dict[str, typing.Any],
+                       history_path: str) -> None:
+    """Prints how the totals changed since the last run in the history.
+
+    Args:
+        results (typing.Dict[str, typing.Any]): the results of this run.
+        history_path (str): path of the history file.
+    """
+    if not os.path.exists(history_path):
+        return
+    with open(history_path, 'r') as history_file:
+        lines = history_file.read().splitlines()
+    if not lines:
+        return
+    previous = json.loads(lines[-1])
+    print(f"compared to {previous['timestamp']} "
+          f"(version {previous['version']}):")
+    for name, result in results["inputs"].items():
+        if name not in previous["inputs"]:
+            continue
+        ratio = result["total_seconds"] / \
+            previous["inputs"][name]["total_seconds"]
+        marker = "  <-- slower" if ratio > 1.1 else ""
+        print(f"  {name:<24} x{ratio:.2f} time{marker}")
+
+
+def main() -> None:
+    argument_parser = argparse.ArgumentParser(
+        description="Benchmarks the Hack assembler.")
+    argument_parser.add_argument(
+        "inputs", nargs="*", help=".asm files (default: the bundled ones)")
+    argument_parser.add_argument(
+        "--synthetic", type=int, action="append", default=[], metavar="N",
+        help="also benchmark a generated program of N instructions")
+    argument_parser.add_argument(
+        "--repeats", type=int, default=REPEATS,
+        help="the number of timed runs per benchmark")
+    argument_parser.add_argument(
+        "--history", default=DEFAULT_HISTORY,
+        help="the JSON lines file that results are appended to (default: "
+             "a per-user file in the temporary directory)")
+    argument_parser.add_argument(
+        "--codec", action="store_true",
+        help="benchmark the NumPy text .hack codec instead")
+    arguments = argument_parser.parse_args()
+
+    if arguments.codec:
+        for path in arguments.inputs or \
+                [os.path.join(BENCHMARK_DIRECTORY, "pong", "Pong.asm")]:
+            benchmark_codec(os.path.abspath(path), arguments.repeats)
+        return
+
+    results = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "version": ASSEMBLER_VERSION,
+        "python": platform.python_version(),
+        "inputs": {}}
+    for path in arguments.inputs or DEFAULT_INPUTS:
+        path = os.path.abspath(path)
+        with open(path, 'r') as input_file:
+            source = input_file.read()
+        name = os.path.relpath(path, BENCHMARK_DIRECTORY)
+        results["inputs"][name] = benchmark_source(
+            name, source, arguments.repeats)
+    for instructions in arguments.synthetic:
+        source_file = io.StringIO()
+        generate_program(instructions, source_file)
+        name = f"synthetic-{instructions}"
+        results["inputs"][name] = benchmark_source(
+            name, source_file.getvalue(), arguments.repeats)
+
+    compare_to_history(results, arguments.history)
+    with open(arguments.history, 'a') as history_file:
+        history_file.write(json.dumps(results) + "\n")
+
+
+if "__main__" == __name__:
+    main()
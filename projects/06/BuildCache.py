@@ -0,0 +1,180 @@
+"""
+An on-disk cache of assembled .hack files.
+
+Every entry is a file in the cache directory, named by a hash of the .asm
+source and of everything else the output depends on (the assembler version
+and options). An entry's modification time is refreshed whenever it is
+used, and when the total size of the entries goes over the size cap, the
+least recently used entries are evicted.
+
+The directory is listed once, on the first store, into an in-memory index of
+the entries in least recently used order, which later stores, hits and
+evictions keep up to date, so a build that stores n files does not list the
+directory n times. Entries that other processes store in the same directory
+are only seen by a full evict(), which Main runs once at the end of a build.
+"""
+import collections
+import hashlib
+import os
+import shutil
+import tempfile
+import typing
+
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+ENTRY_SUFFIX = ".hack"
+CHUNK_SIZE = 1024 * 1024
+
+
+class BuildCache:
+    """A size-capped, least-recently-used cache of assembled files."""
+
+    def __init__(self, directory: str,
+                 max_size: int = DEFAULT_MAX_SIZE) -> None:
+        """Opens the cache directory, creating it if needed.
+
+        Args:
+            directory (str): the cache directory.
+            max_size (int): the maximal total size of the entries, in bytes.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # the size of every entry by its path, least recently used first,
+        # None until the first store:
+        self._index = None
+        self._size = 0
+
+    @staticmethod
+    def key(source_file: typing.BinaryIO, *parameters: str) -> str:
+        """
+        Args:
+            source_file (typing.BinaryIO): the .asm file, which is hashed in
+                chunks of CHUNK_SIZE bytes.
+            *parameters (str): everything else the output depends on.
+
+        Returns:
+            str: the cache key of the output.
+        """
+        digest = hashlib.sha256()
+        for parameter in parameters:
+            digest.update(parameter.encode() + b"\0")
+        for chunk in iter(lambda: source_file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def fetch(self, key: str, output_path: str) -> bool:
+        """Copies an entry to the output path if it is in the cache, and
+        marks it as the most recently used.
+
+        Args:
+            key (str): the cache key.
+            output_path (str): where to copy the cached output to.
+
+        Returns:
+            bool: True on a hit, False on a miss.
+        """
+        entry_path = self._entry_path(key)
+        try:
+            shutil.copyfile(entry_path, output_path)
+            os.utime(entry_path)
+        except FileNotFoundError:
+            # a missing entry, or one evicted by another process meanwhile:
+            self.misses += 1
+            return False
+        self.hits += 1
+        if self._index is not None and entry_path in self._index:
+            self._index.move_to_end(entry_path)
+        return True
+
+    def store(self, key: str, output_path: str) -> None:
+        """Adds an entry, evicting old entries if the cache is too big.
+
+        Args:
+            key (str): the cache key.
+            output_path (str): the output file to cache.
+        """
+        # copy to a temporary file first, so readers never see half an entry:
+        file_descriptor, temporary_path = tempfile.mkstemp(
+            dir=self.directory, suffix=".tmp")
+        os.close(file_descriptor)
+        shutil.copyfile(output_path, temporary_path)
+        entry_path = self._entry_path(key)
+        if self._index is None:
+            self._load_index()
+        # an entry with the same key is replaced:
+        self._size -= self._index.pop(entry_path, 0)
+        self._index[entry_path] = os.stat(temporary_path).st_size
+        self._size += self._index[entry_path]
+        os.replace(temporary_path, entry_path)
+        self._shrink()
+
+    def _entries(self) -> typing.List[typing.Tuple[float, int, str]]:
+        entries = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(ENTRY_SUFFIX):
+                continue
+            entry_path = os.path.join(self.directory, filename)
+            try:
+                status = os.stat(entry_path)
+            except FileNotFoundError:
+                continue
+            entries.append((status.st_mtime, status.st_size, entry_path))
+        return entries
+
+    def _load_index(self) -> None:
+        self._index = collections.OrderedDict(
+            (entry_path, size)
+            for _, size, entry_path in sorted(self._entries()))
+        self._size = sum(self._index.values())
+
+    def _shrink(self) -> None:
+        # removes the least recently used entries of the index:
+        while self._size > self.max_size:
+            entry_path, size = self._index.popitem(last=False)
+            try:
+                os.remove(entry_path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            self._size -= size
+
+    def size(self) -> int:
+        """
+        Returns:
+            int: the total size of the entries, in bytes.
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> None:
+        """Removes the least recently used entries until the total size of
+        the entries is at most max_size, listing the directory again to see
+        the entries of other processes.
+        """
+        self._load_index()
+        self._shrink()
+
+    def record(self, hit: bool) -> None:
+        """Counts a lookup that was done by another process.
+
+        Args:
+            hit (bool): whether the lookup was a hit.
+        """
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def statistics(self) -> typing.Dict[str, int]:
+        """
+        Returns:
+            typing.Dict[str, int]: the hit, miss and eviction counts, and the
+            current size of the cache.
+        """
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "size": self.size()}
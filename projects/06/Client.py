@@ -0,0 +1,199 @@
+"""
+A client of the resident assembler, see Server.py.
+
+Usage: python3 Client.py [--socket PATH] [--format {text,binary}]
+                         [--optimize] <.asm file> ...
+       python3 Client.py [--socket PATH] --stats | --shutdown
+       python3 Client.py [--socket PATH] --benchmark N <.asm file> ...
+
+Every .asm file is assembled by the server into the .hack file next to it,
+like Main.py does. --benchmark compares the latency of N cold runs of
+Main.py, N runs of this client and N requests over an open connection.
+"""
+import argparse
+import base64
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+import HackFile
+
+# the client does not import the assembler, so that it starts quickly:
+CLIENT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def default_socket_path() -> str:
+    """
+    Returns:
+        str: the socket that the server and the client use by default,
+        which is private to the current user.
+    """
+    return os.path.join(tempfile.gettempdir(),
+                        f"hack-assembler-{os.getuid()}.sock")
+
+
+class AssemblerClient:
+    """A connection to a running assembler server."""
+
+    def __init__(self, socket_path: str) -> None:
+        """Connects to a server.
+
+        Args:
+            socket_path (str): path of the server's Unix domain socket.
+        """
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(socket_path)
+        self.socket_file = self.socket.makefile('rwb')
+
+    def request(self, request: typing.Dict[str, typing.Any]) \
+            -> typing.Dict[str, typing.Any]:
+        """Sends a request and waits for its response.
+
+        Args:
+            request (typing.Dict[str, typing.Any]): the request, see Server.
+
+        Returns:
+            typing.Dict[str, typing.Any]: the response.
+
+        Raises:
+            RuntimeError: if the server reports an error.
+        """
+        self.socket_file.write(json.dumps(request).encode() + b"\n")
+        self.socket_file.flush()
+        line = self.socket_file.readline()
+        if not line:
+            raise RuntimeError("the server closed the connection")
+        response = json.loads(line)
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+        return response
+
+    def assemble_path(self, input_path: str,
+                      output_format: str = HackFile.TEXT_FORMAT,
+                      optimize: bool = False) -> bool:
+        """Assembles an .asm file into the .hack file next to it.
+
+        Args:
+            input_path (str): path of the .asm file.
+            output_format (str): the format of the .hack file.
+            optimize (bool): optimize the program.
+
+        Returns:
+            bool: whether the server had the output cached.
+        """
+        response = self.request({"command": "assemble",
+                                 "path": os.path.abspath(input_path),
+                                 "format": output_format,
+                                 "optimize": optimize})
+        output_path = os.path.splitext(input_path)[0] + ".hack"
+        if output_format == HackFile.BINARY_FORMAT:
+            with open(output_path, 'wb') as output_file:
+                output_file.write(base64.b64decode(response["hack"]))
+        else:
+            with open(output_path, 'w') as output_file:
+                output_file.write(response["hack"])
+        return response["cached"]
+
+    def close(self) -> None:
+        self.socket_file.close()
+        self.socket.close()
+
+    def __enter__(self) -> "AssemblerClient":
+        return self
+
+    def __exit__(self, *exception_info) -> None:
+        self.close()
+
+
+def _time_runs(runs: int, run: typing.Callable[[], None]) \
+        -> typing.List[float]:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def benchmark(socket_path: str, input_paths: typing.List[str],
+              runs: int) -> None:
+    """Prints the median and worst latency of assembling the files cold,
+    with the client CLI and over an open connection.
+
+    Args:
+        socket_path (str): path of the server's Unix domain socket.
+        input_paths (typing.List[str]): the .asm files.
+        runs (int): the number of runs of every way.
+    """
+    for input_path in input_paths:
+        cold = _time_runs(runs, lambda: subprocess.run(
+            [sys.executable, os.path.join(CLIENT_DIRECTORY, "Main.py"),
+             input_path], check=True))
+        client = _time_runs(runs, lambda: subprocess.run(
+            [sys.executable, os.path.join(CLIENT_DIRECTORY, "Client.py"),
+             "--socket", socket_path, input_path], check=True))
+        with AssemblerClient(socket_path) as connection:
+            warm = _time_runs(
+                runs, lambda: connection.assemble_path(input_path))
+        print(f"{os.path.relpath(input_path)}:")
+        for name, timings in (("cold Main.py", cold), ("Client.py", client),
+                              ("connection", warm)):
+            print(f"  {name:<14} median "
+                  f"{statistics.median(timings) * 1000:9.3f} ms, "
+                  f"max {max(timings) * 1000:9.3f} ms")
+
+
+def main() -> None:
+    argument_parser = argparse.ArgumentParser(
+        description="Assembles files with a running assembler server.")
+    argument_parser.add_argument("inputs", nargs="*", help=".asm files")
+    argument_parser.add_argument(
+        "--socket", default=default_socket_path(),
+        help="the server's socket (default: %(default)s)")
+    argument_parser.add_argument(
+        "--format", choices=HackFile.FORMATS, default=HackFile.TEXT_FORMAT,
+        help="the format of the .hack files")
+    argument_parser.add_argument(
+        "--optimize", action="store_true",
+        help="remove redundant instructions with the peephole optimizer")
+    argument_parser.add_argument(
+        "--stats", action="store_true", help="print the server's counters")
+    argument_parser.add_argument(
+        "--shutdown", action="store_true", help="stop the server")
+    argument_parser.add_argument(
+        "--benchmark", type=int, metavar="N",
+        help="compare N cold runs of Main.py to N requests to the server")
+    arguments = argument_parser.parse_args()
+
+    if arguments.benchmark is not None:
+        benchmark(arguments.socket,
+                  [os.path.abspath(path) for path in arguments.inputs],
+                  arguments.benchmark)
+        return
+    failures = 0
+    with AssemblerClient(arguments.socket) as connection:
+        for input_path in arguments.inputs:
+            try:
+                connection.assemble_path(
+                    input_path, arguments.format, arguments.optimize)
+            except (RuntimeError, OSError) as exception:
+                failures += 1
+                print(f"{input_path}: {exception}", file=sys.stderr)
+        if arguments.stats:
+            response = connection.request({"command": "stats"})
+            print(f"requests: {response['requests']}, "
+                  f"hits: {response['hits']}, "
+                  f"cached: {response['entries']}")
+        if arguments.shutdown:
+            connection.request({"command": "shutdown"})
+    if failures:
+        sys.exit(1)
+
+
+if "__main__" == __name__:
+    main()
@@ -5,12 +5,51 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
-import re
+import typing
+from Diagnostics import AssemblerError
 
-class Code:
-    """Translates Hack assembly language mnemonics into binary codes."""
+
+# the binary codes of the mnemonics, a missing dest or jump is None:
+DEST_CODES = {None: "000", "0": "000", "M": "001", "D": "010", "MD": "011",
+              "A": "100", "AM": "101", "AD": "110", "ADM": "111"}
+
+COMP_CODES = {"0": "0101010", "1": "0111111", "-1": "0111010",
+              "D": "0001100", "A": "0110000", "!D": "0001101",
+              "!A": "0110001", "-D": "0001111", "-A": "0110011",
+              "D+1": "0011111", "A+1": "0110111", "D-1": "0001110",
+              "A-1": "0110010", "D+A": "0000010",
+              "D-A": "0010011", "A-D": "0000111", "D&A": "0000000",
+              "D|A": "0010101", "M": "1110000", "!M": "1110001",
+              "-M": "1110011", "M+1": "1110111", "M-1": "1110010",
+              "D+M": "1000010", "D-M": "1010011", "M-D": "1000111",
+              "D&M": "1000000", "D|M": "1010101", "A<<": "0100000",
+              "D<<": "0110000", "M<<": "1100000", "A>>": "0000000",
+              "D>>": "0010000", "M>>": "1000000"}
+
+JUMP_CODES = {None: "000", "JGT": "001", "JEQ": "010", "JGE": "011",
+              "JLT": "100", "JNE": "101", "JLE": "110", "JMP": "111"}
+
+# C-commands have the MSB set and A-commands have it cleared, see section
+# 6.2.2 of the book:
+C_COMMAND_BIT = 0x8000
+# the extended shift instructions use the 101 prefix instead of 111:
+SHIFT_COMPS = frozenset({"A<<", "D<<", "M<<", "A>>", "D>>", "M>>"})
+C_COMMAND_PREFIX = 0b111 << 13
+SHIFT_COMMAND_PREFIX = 0b101 << 13
+
+# the 16-bit word of every valid (dest, comp, jump) triple:
+C_INSTRUCTIONS = {
+    (dest, comp, jump):
+        (SHIFT_COMMAND_PREFIX if comp in SHIFT_COMPS else C_COMMAND_PREFIX)
+        | int(comp_code, 2) << 6 | int(dest_code, 2) << 3 | int(jump_code, 2)
+    for dest, dest_code in DEST_CODES.items()
+    for comp, comp_code in COMP_CODES.items()
+    for jump, jump_code in JUMP_CODES.items()
+}
 
 
+class Code:
+    """Translates Hack assembly language mnemonics into binary codes."""
 
     @staticmethod
     def dest(mnemonic: str) -> str:
@@ -21,16 +60,7 @@ class Code:
         Returns:
             str: 3-bit long binary code of the given mnemonic.
         """
-        if mnemonic is None:
-            return "000"
-
-        if mnemonic == "0":
-            return "000"
-
-        dest_dict = {"M": "001", "D": "010", "MD": "011",
-                     "A": "100", "AM": "101", "AD": "110", "ADM": "111"}
-
-        return dest_dict[mnemonic]
+        return DEST_CODES[mnemonic]
 
     @staticmethod
     def comp(mnemonic: str) -> str:
@@ -43,19 +73,7 @@ class Code:
         """
         if mnemonic is None:
             return "0000000"
-        comp_dict = {"0": "0101010", "1": "0111111", "-1": "0111010",
-                     "D": "0001100", "A": "0110000", "!D": "0001101",
-                     "!A": "0110001", "-D": "0001111", "-A": "0110011",
-                     "D+1": "0011111", "A+1": "0110111", "D-1": "0001110", "A-1": "0110010", "D+A": "0000010",
-                     "D-A": "0010011", "A-D": "0000111", "D&A": "0000000",
-                     "D|A": "0010101", "M": "1110000", "!M": "1110001",
-                     "-M": "1110011", "M+1": "1110111", "M-1": "1110010",
-                     "D+M": "1000010", "D-M": "1010011", "M-D": "1000111",
-                     "D&M": "1000000", "D|M": "1010101", "A<<": "0100000",
-                     "D<<": "0110000", "M<<": "1100000", "A>>": "0000000",
-                     "D>>": "0010000", "M>>": "1000000"}
-
-        return comp_dict[mnemonic]
+        return COMP_CODES[mnemonic]
 
     @staticmethod
     def jump(mnemonic: str) -> str:
@@ -66,10 +84,46 @@ class Code:
         Returns:
             str: 3-bit long binary code of the given mnemonic.
         """
-        if mnemonic is None:
-            return "000"
-        jump_dict = {"JGT": "001", "JEQ": "010", "JGE": "011",
-                     "JLT": "100", "JNE": "101", "JLE": "110",
-                     "JMP": "111"}
+        return JUMP_CODES[mnemonic]
 
-        return jump_dict[mnemonic]
+    @staticmethod
+    def encode(dest: typing.Optional[str], comp: str,
+               jump: typing.Optional[str]) -> int:
+        """
+        Args:
+            dest (typing.Optional[str]): the dest mnemonic, or None.
+            comp (str): the comp mnemonic.
+            jump (typing.Optional[str]): the jump mnemonic, or None.
+
+        Returns:
+            int: the 16-bit word of the C-command, including the 111 prefix
+            (or 101 for shift commands).
+        """
+        return C_INSTRUCTIONS[(dest, comp, jump)]
+
+    @staticmethod
+    def encode_error(dest: typing.Optional[str], comp: str,
+                     jump: typing.Optional[str],
+                     line_number: int) -> AssemblerError:
+        """Explains why encode rejected a C-command. It is only called once
+        encode has failed, so that valid commands are not checked twice.
+
+        Args:
+            dest (typing.Optional[str]): the dest mnemonic, or None.
+            comp (str): the comp mnemonic.
+            jump (typing.Optional[str]): the jump mnemonic, or None.
+            line_number (int): the line of the command.
+
+        Returns:
+            AssemblerError: the error of the first bad mnemonic.
+        """
+        if dest not in DEST_CODES:
+            return AssemblerError(line_number, f"unknown dest {dest!r}",
+                                  dest + "=")
+        if not comp:
+            return AssemblerError(line_number, "missing comp",
+                                  (dest or "") + "=")
+        if comp not in COMP_CODES:
+            return AssemblerError(line_number, f"unknown comp {comp!r}", comp)
+        return AssemblerError(line_number, f"unknown jump {jump!r}",
+                              ";" + jump)
@@ -0,0 +1,157 @@
+"""
+Errors of assembly programs, and a collector that reports all of them.
+
+The assembler raises an AssemblerError at the first error in a program,
+unless it is given a Diagnostics collector, in which case it records the
+error and goes on, so that one run reports every error of a file.
+
+Errors are detected where the assembler already looks at the code: a bad
+mnemonic is the KeyError of the encoding table lookup, and symbol names are
+checked once per label and once per variable, when they are added to the
+symbol table. So a program without errors costs nothing extra, and the
+column of an error is only computed when it is reported.
+"""
+import re
+import sys
+import typing
+
+# a Hack symbol, as in section 6.2.1 of the book, plus the & that the VM
+# translator of projects/07 and projects/08 uses in its labels:
+SYMBOL = re.compile(r"[A-Za-z_.$:&][\w.$:&]*")
+
+
+class AssemblerError(ValueError):
+    """An error in an assembly program.
+
+    Attributes:
+        line_number (int): the line of the error, 0 if it is unknown.
+        message (str): what is wrong.
+        text (typing.Optional[str]): the text in the line that is wrong,
+            used to find the column of the error.
+    """
+
+    def __init__(self, line_number: int, message: str,
+                 text: typing.Optional[str] = None) -> None:
+        super().__init__(f"line {line_number}: {message}")
+        self.line_number = line_number
+        self.message = message
+        self.text = text
+
+
+class DiagnosticsError(ValueError):
+    """Raised when a file had errors, after a Diagnostics reported them."""
+
+    def __init__(self, diagnostics: "Diagnostics") -> None:
+        super().__init__(f"{diagnostics.path}: {len(diagnostics)} "
+                         f"error{'s' if len(diagnostics) != 1 else ''}")
+        self.diagnostics = diagnostics
+
+
+def check_symbol(symbol: str, line_number: int, kind: str) -> None:
+    """
+    Args:
+        symbol (str): a label or a variable.
+        line_number (int): the line of the symbol.
+        kind (str): "label" or "variable", for the message.
+
+    Raises:
+        AssemblerError: if the symbol is not a valid Hack symbol.
+    """
+    if SYMBOL.fullmatch(symbol) is None:
+        raise AssemblerError(
+            line_number, f"invalid {kind} name {symbol!r}", symbol)
+
+
+def find_column(line: str, text: typing.Optional[str]) -> int:
+    """
+    Args:
+        line (str): a source line.
+        text (typing.Optional[str]): the text to find, ignoring white space,
+            as the parser removes it.
+
+    Returns:
+        int: the 1-based column of the text in the line, or of the first
+        character that is not white space if the text is not found.
+    """
+    code = line.split("//", 1)[0]
+    if text:
+        pattern = r"\s*".join(re.escape(character) for character in text)
+        match = re.search(pattern, code)
+        if match is not None:
+            return match.start() + 1
+    return len(code) - len(code.lstrip()) + 1
+
+
+class Diagnostics:
+    """Collects the errors of a single file and reports them together, like
+    a compiler: path:line:column: error: message, the line and a caret.
+    """
+
+    def __init__(self, path: str,
+                 lines: typing.Optional[typing.List[str]] = None,
+                 origins: typing.Optional[
+                     typing.List[typing.Tuple[str, int]]] = None) -> None:
+        """Creates an empty collector.
+
+        Args:
+            path (str): the file that is assembled.
+            lines (typing.Optional[typing.List[str]]): the source lines, if
+                they are not the contents of path (for example after
+                preprocessing). Otherwise, the lines are read from path when
+                the errors are reported.
+            origins (typing.Optional[typing.List[typing.Tuple[str, int]]]):
+                the file and line that every line came from, as given by
+                the Preprocessor.
+        """
+        self.path = path
+        self.lines = lines
+        self.origins = origins
+        self.errors = []
+
+    def add(self, error: AssemblerError) -> None:
+        """Records an error.
+
+        Args:
+            error (AssemblerError): the error.
+        """
+        self.errors.append(error)
+
+    def __len__(self) -> int:
+        return len(self.errors)
+
+    def format(self) -> typing.List[str]:
+        """
+        Returns:
+            typing.List[str]: the report of every error, in line order.
+        """
+        lines = self.lines
+        if lines is None:
+            with open(self.path, 'r') as source_file:
+                lines = source_file.read().splitlines()
+        reports = []
+        for error in sorted(self.errors, key=lambda error: error.line_number):
+            line = lines[error.line_number - 1] \
+                if 0 < error.line_number <= len(lines) else ""
+            column = find_column(line, error.text)
+            path, line_number = self.path, error.line_number
+            if self.origins is not None and 0 < line_number <= len(lines):
+                path, line_number = self.origins[line_number - 1]
+            reports.append(
+                f"{path}:{line_number}:{column}: error: {error.message}\n"
+                f"    {line}\n"
+                f"    {' ' * (column - 1)}^")
+        return reports
+
+    def report(self, output_file: typing.Optional[typing.TextIO] = None) \
+            -> None:
+        """Writes the report of every error, and their number.
+
+        Args:
+            output_file (typing.Optional[typing.TextIO]): writes the report
+                to this file, stderr by default.
+        """
+        if output_file is None:
+            output_file = sys.stderr
+        for report in self.format():
+            print(report, file=output_file)
+        print(DiagnosticsError(self), file=output_file)
@@ -0,0 +1,188 @@
+"""
+A disassembler of .hack files, the inverse of the assembler.
+
+Usage: python3 Disassembler.py [--format {text,binary}] [--labels]
+                               [--output PATH] <.hack file>
+
+The assembly of every possible 16-bit word is computed once, when the
+module is imported, into a table of 65536 entries: A-commands are @value,
+and C-commands (including the 101 shift commands) come from inverting
+Code.C_INSTRUCTIONS. A whole ROM is then decoded with one table lookup per
+word. Words that no command encodes, such as C-commands with an unknown
+comp code or the unused 100 and 110 prefixes, have no entry and are
+reported with their address, as the output could not reproduce them.
+
+Assembling the output gives back the same words: every entry is the text
+of a command that encodes to the entry's word, and the optional labels
+(L<address>, for the targets of jumps) resolve to the addresses they
+replace. The command line checks this by assembling the output again.
+"""
+import argparse
+import array
+import sys
+import typing
+import HackFile
+from Code import C_COMMAND_BIT, C_INSTRUCTIONS
+from Parser import Parser, Instruction
+
+WORD_COUNT = 1 << HackFile.WORD_BITS
+JUMP_BITS = 0b111
+LABEL_PREFIX = "L"
+
+
+def _build_table() -> typing.List[typing.Optional[str]]:
+    table = [None] * WORD_COUNT
+    for word in range(C_COMMAND_BIT):
+        table[word] = f"@{word}"
+    for (dest, comp, jump), word in C_INSTRUCTIONS.items():
+        # a "0" dest encodes like a missing one, which reads better:
+        if dest == "0":
+            continue
+        table[word] = str(Instruction(Parser.C_COMMAND, dest=dest,
+                                      comp=comp, jump=jump))
+    return table
+
+
+# the command of every word, None if no command encodes it:
+DISASSEMBLY = _build_table()
+
+
+class DisassemblerError(ValueError):
+    """Raised for a word that no command encodes."""
+
+    def __init__(self, address: int, word: int) -> None:
+        super().__init__(f"ROM address {address}: {word:016b} is not a Hack "
+                         f"command")
+        self.address = address
+        self.word = word
+
+
+def read_words(path: str,
+               input_format: str = HackFile.TEXT_FORMAT) -> array.array:
+    """Reads a .hack file.
+
+    Args:
+        path (str): path of the .hack file.
+        input_format (str): the format of the file, see Main.write_words.
+
+    Returns:
+        array.array: the words, as an array of type 'H'.
+    """
+    if input_format == HackFile.BINARY_FORMAT:
+        with HackFile.RomImage(path) as rom:
+            return array.array("H", rom.words)
+    with open(path, 'rb') as input_file:
+        return HackFile.read_text(input_file.read())
+
+
+def jump_loads(words: typing.Sequence[int]) -> typing.Dict[int, int]:
+    """
+    Args:
+        words (typing.Sequence[int]): the words of a program.
+
+    Returns:
+        typing.Dict[int, int]: maps the address of every A-command that is
+        followed by a jump to the address it loads, if that is in the
+        program or just after it.
+    """
+    loads = {}
+    for address in range(len(words) - 1):
+        target = words[address]
+        following = words[address + 1]
+        if target < C_COMMAND_BIT and target <= len(words) and \
+                following & C_COMMAND_BIT and following & JUMP_BITS:
+            loads[address] = target
+    return loads
+
+
+def disassemble(words: typing.Sequence[int],
+                labels: bool = False) -> typing.List[str]:
+    """Disassembles a program.
+
+    Args:
+        words (typing.Sequence[int]): the words of the program.
+        labels (bool): name the targets of jumps with labels, instead of
+            loading their addresses as numbers.
+
+    Returns:
+        typing.List[str]: the assembly lines of the program.
+
+    Raises:
+        DisassemblerError: for a word that no command encodes.
+    """
+    table = DISASSEMBLY
+    lines = [table[word] for word in words]
+    if None in lines:
+        address = lines.index(None)
+        raise DisassemblerError(address, words[address])
+    if not labels:
+        return lines
+
+    loads = jump_loads(words)
+    targets = set(loads.values())
+    for address, target in loads.items():
+        lines[address] = f"@{LABEL_PREFIX}{target}"
+    labelled_lines = []
+    for address, line in enumerate(lines):
+        if address in targets:
+            labelled_lines.append(f"({LABEL_PREFIX}{address})")
+        labelled_lines.append(line)
+    if len(words) in targets:
+        labelled_lines.append(f"({LABEL_PREFIX}{len(words)})")
+    return labelled_lines
+
+
+def verify(words: typing.Sequence[int], lines: typing.List[str]) -> None:
+    """Checks that disassembled lines assemble back into the same words.
+
+    Args:
+        words (typing.Sequence[int]): the words of the program.
+        lines (typing.List[str]): their disassembly.
+
+    Raises:
+        ValueError: if the words differ.
+    """
+    # imported here, as only the check needs the assembler:
+    from Main import assemble_instructions
+    assembled = assemble_instructions(Parser.parse_lines(lines))
+    if assembled != array.array("H", words):
+        address = next(
+            (address for address, (word, other)
+             in enumerate(zip(words, assembled)) if word != other),
+            min(len(words), len(assembled)))
+        raise ValueError(f"the disassembly does not reproduce ROM address "
+                         f"{address}")
+
+
+def main() -> None:
+    argument_parser = argparse.ArgumentParser(
+        description="Disassembles a .hack file into Hack assembly.")
+    argument_parser.add_argument("input_path", help="a .hack file")
+    argument_parser.add_argument(
+        "--format", choices=HackFile.FORMATS, default=HackFile.TEXT_FORMAT,
+        help="the format of the .hack file")
+    argument_parser.add_argument(
+        "--labels", action="store_true",
+        help="name the targets of jumps with labels")
+    argument_parser.add_argument(
+        "--output", metavar="PATH",
+        help="write the assembly to this file (default: stdout)")
+    arguments = argument_parser.parse_args()
+
+    try:
+        words = read_words(arguments.input_path, arguments.format)
+        lines = disassemble(words, arguments.labels)
+        verify(words, lines)
+    except (ValueError, OSError) as error:
+        print(f"{arguments.input_path}: {error}", file=sys.stderr)
+        sys.exit(1)
+    text = "".join(line + "\n" for line in lines)
+    if arguments.output is None:
+        sys.stdout.write(text)
+    else:
+        with open(arguments.output, 'w') as output_file:
+            output_file.write(text)
+
+
+if "__main__" == __name__:
+    main()
@@ -0,0 +1,208 @@
+"""
+Reading and writing of .hack ROM images.
+
+A .hack file is written in one of two formats:
+- "text" (the default): one line of 16 '0'/'1' characters per word.
+- "binary": the words packed as little-endian 16-bit integers, 2 bytes per
+  word, which can be memory-mapped by RomImage without parsing or copying.
+
+decode_text and encode_text convert whole text files to and from NumPy
+uint16 arrays with a few vectorised operations, for tools that diff ROMs or
+feed emulators. NumPy is only imported by the functions that need it.
+"""
+import array
+import mmap
+import sys
+import typing
+
+if typing.TYPE_CHECKING:
+    # only for the annotations, NumPy stays an optional dependency:
+    import numpy
+
+TEXT_FORMAT = "text"
+BINARY_FORMAT = "binary"
+FORMATS = (TEXT_FORMAT, BINARY_FORMAT)
+
+WORD_SIZE = 2
+WORD_BITS = 16
+ZERO_CHARACTER = ord("0")
+
+
+def write_binary(words: array.array, output_file: typing.BinaryIO) -> None:
+    """Writes machine words as packed little-endian 16-bit integers.
+
+    Args:
+        words (array.array): the machine words, as an array of type 'H'.
+        output_file (typing.BinaryIO): writes all output to this file.
+    """
+    if sys.byteorder == "big":
+        words = array.array("H", words)
+        words.byteswap()
+    output_file.write(memoryview(words).cast("B"))
+
+
+def read_text(data: bytes) -> array.array:
+    """Reads a text .hack file line by line, without NumPy.
+
+    Blank lines and the white space around the words are skipped.
+
+    Args:
+        data (bytes): the contents of the file.
+
+    Returns:
+        array.array: the words, as an array of type 'H'.
+
+    Raises:
+        ValueError: if a line is not a 16-bit binary number.
+    """
+    words = array.array("H")
+    for line_number, line in enumerate(data.decode("ascii").splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        if len(line) != WORD_BITS or line.strip("01"):
+            raise ValueError(
+                f"line {line_number}: {line!r} is not a 16-bit binary word")
+        words.append(int(line, 2))
+    return words
+
+
+def decode_text(data: bytes) -> "numpy.ndarray":
+    """Decodes a whole text .hack file.
+
+    Files with one word per line and "\n" or "\r\n" line endings are
+    decoded by reshaping the bytes into a table with a row per line, and
+    packing the bits of the digit columns. Other layouts (blank lines,
+    trailing spaces, a missing final newline) fall back to read_text.
+
+    Args:
+        data (bytes): the contents of the file.
+
+    Returns:
+        numpy.ndarray: the words, as a uint16 array.
+
+    Raises:
+        ValueError: if a line is not a 16-bit binary number.
+    """
+    import numpy
+    characters = numpy.frombuffer(data, dtype=numpy.uint8)
+    for line_ending in (b"\n", b"\r\n"):
+        line_size = WORD_BITS + len(line_ending)
+        if len(characters) % line_size:
+            continue
+        table = characters.reshape(-1, line_size)
+        if not (table[:, WORD_BITS:] ==
+                numpy.frombuffer(line_ending, dtype=numpy.uint8)).all():
+            continue
+        bits = table[:, :WORD_BITS] - ZERO_CHARACTER
+        if (bits > 1).any():
+            # the subtraction wraps around, so this covers anything that is
+            # not a '0' or a '1':
+            break
+        # packbits makes 2 big-endian bytes per row:
+        return numpy.packbits(bits, axis=1).view(">u2").ravel() \
+            .astype(numpy.uint16)
+
+    return numpy.array(read_text(data), dtype=numpy.uint16)
+
+
+def encode_text(words: typing.Union["numpy.ndarray", array.array,
+                                    typing.Sequence[int]]) -> bytes:
+    """Encodes words as a text .hack file, the inverse of decode_text.
+
+    Args:
+        words (typing.Union[numpy.ndarray, array.array,
+            typing.Sequence[int]]): the words.
+
+    Returns:
+        bytes: the contents of the file, with a "\n" after every word.
+    """
+    import numpy
+    words = numpy.asarray(words, dtype=numpy.uint16)
+    bits = numpy.unpackbits(
+        words.astype(">u2").view(numpy.uint8).reshape(-1, WORD_SIZE), axis=1)
+    table = numpy.empty((len(words), WORD_BITS + 1), dtype=numpy.uint8)
+    table[:, :WORD_BITS] = bits + ZERO_CHARACTER
+    table[:, WORD_BITS] = ord("\n")
+    return table.tobytes()
+
+
+class RomImage:
+    """A binary .hack file, memory-mapped as a read-only sequence of words.
+
+    The words are exposed without copying the file, either as a memoryview
+    of format 'H' (words) or as a NumPy uint16 view (as_numpy()). Use it as
+    a context manager, or call close() once the views are no longer used;
+    views that outlive it keep the file mapped.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Memory-maps a binary .hack file.
+
+        Args:
+            path (str): path of the binary .hack file.
+        """
+        self._mmap = None
+        with open(path, "rb") as rom_file:
+            size = rom_file.seek(0, 2)
+            if size % WORD_SIZE:
+                raise ValueError(
+                    f"{path}: size {size} is not a multiple of {WORD_SIZE}, "
+                    f"is this a text .hack file?")
+            if size:
+                self._mmap = mmap.mmap(
+                    rom_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap is None:
+            self.words = memoryview(array.array("H"))
+        elif sys.byteorder == "big":
+            # the file is little-endian, so the words have to be swapped:
+            words = array.array("H", self._mmap[:])
+            words.byteswap()
+            self.words = memoryview(words)
+        else:
+            self.words = memoryview(self._mmap).cast("H")
+
+    def as_numpy(self) -> "numpy.ndarray":
+        """
+        Returns:
+            numpy.ndarray: a read-only uint16 view of the words, which shares
+            the memory of the mapped file.
+        """
+        import numpy
+        if self._mmap is None:
+            return numpy.zeros(0, dtype="<u2")
+        return numpy.frombuffer(self._mmap, dtype="<u2")
+
+    def close(self) -> None:
+        """Releases the views and unmaps the file.
+
+        Views that are still held, such as an as_numpy() array or a slice
+        of words, keep the file mapped until they are garbage collected,
+        instead of making close() fail.
+        """
+        try:
+            self.words.release()
+        except BufferError:
+            # a view of the words is still held:
+            pass
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # the views that are still held reference the mapping, which
+                # is unmapped when the last one is freed:
+                pass
+            self._mmap = None
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def __getitem__(self, address: int) -> int:
+        return self.words[address]
+
+    def __enter__(self) -> "RomImage":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,219 @@
+"""
+Incremental re-assembly of a file that changes a little between runs.
+
+IncrementalAssembler keeps the state of its previous run: the source lines,
+the parsed command of every line, the machine words and the addresses of
+all the symbols. When it is given a new version of the source, it finds the
+region that changed (everything between the longest common prefix and the
+longest common suffix of lines), re-parses and re-encodes only that region,
+and re-encodes the unchanged A-commands whose symbol moved to a different
+address (labels after the change, or variables allocated in another order).
+The words of everything else are reused, so the result is identical to a
+full rebuild, which verify=True checks.
+
+The state can be saved to disk between runs with save() and load().
+
+Errors are reported like in the other modes: with a Diagnostics, all of
+them are recorded, and the state of the previous run is kept, so the bad
+lines are parsed again in the next run.
+"""
+import array
+import copy
+import pickle
+import typing
+from Diagnostics import AssemblerError, Diagnostics
+from Main import assemble_instructions, encode_c_command, resolve_symbols
+from Parser import Parser, Instruction
+from SymbolTable import SymbolTable
+
+
+class IncrementalAssembler:
+    """Assembles successive versions of a file, reusing the previous run."""
+
+    def __init__(self) -> None:
+        """Creates an assembler without a previous run."""
+        self.lines = []
+        # the parsed command of every line, None for lines without one:
+        self.line_instructions = []
+        self.words = array.array("H")
+        self.symbol_table = SymbolTable()
+        # statistics of the last run:
+        self.reparsed_lines = 0
+        self.reencoded_words = 0
+
+    def assemble(self, lines: typing.List[str], verify: bool = False,
+                 diagnostics: typing.Optional[Diagnostics] = None) \
+            -> array.array:
+        """Assembles a new version of the source.
+
+        Args:
+            lines (typing.List[str]): the lines of the new version.
+            verify (bool): also assemble from scratch, and raise a
+                RuntimeError if the incremental result differs.
+            diagnostics (typing.Optional[Diagnostics]): if given, errors are
+                recorded in it instead of being raised. If there are any,
+                the returned words are meaningless and the state of the
+                previous run is kept.
+
+        Returns:
+            array.array: the machine words, as an array of type 'H'.
+
+        Raises:
+            AssemblerError: for the first error, without diagnostics.
+        """
+        errors = len(diagnostics) if diagnostics is not None else 0
+        old_lines = self.lines
+        old_line_instructions = self.line_instructions
+        old_words = self.words
+        old_table = self.symbol_table.table
+
+        # the changed region is old_lines[prefix:old_end], which was replaced
+        # by lines[prefix:new_end]:
+        shortest = min(len(old_lines), len(lines))
+        prefix = 0
+        while prefix < shortest and old_lines[prefix] == lines[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < shortest - prefix and \
+                old_lines[-1 - suffix] == lines[-1 - suffix]:
+            suffix += 1
+        old_end = len(old_lines) - suffix
+        new_end = len(lines) - suffix
+
+        changed_instructions = [
+            self._parse(line, line_number, diagnostics)
+            for line_number, line in enumerate(lines[prefix:new_end],
+                                               prefix + 1)]
+        suffix_instructions = old_line_instructions[old_end:]
+        if new_end != old_end:
+            # renumbered copies, so that a failed run keeps the previous one:
+            suffix_instructions = [
+                self._move(instruction, new_end - old_end)
+                for instruction in suffix_instructions]
+        line_instructions = old_line_instructions[:prefix] + \
+            changed_instructions + suffix_instructions
+
+        instructions = [instruction for instruction in line_instructions
+                        if instruction is not None]
+        symbol_table = SymbolTable()
+        resolve_symbols(instructions, symbol_table, diagnostics)
+        table = symbol_table.table
+
+        def word_count(region: typing.List[Instruction]) -> int:
+            return sum(1 for instruction in region if instruction is not None
+                       and instruction.kind != Parser.L_COMMAND)
+
+        prefix_words = word_count(old_line_instructions[:prefix])
+        old_suffix_words = prefix_words + \
+            word_count(old_line_instructions[prefix:old_end])
+
+        # the changed region is always encoded:
+        changed_words = array.array("H")
+        for instruction in changed_instructions:
+            if instruction is None or instruction.kind == Parser.L_COMMAND:
+                continue
+            changed_words.append(
+                self._encode(instruction, table, diagnostics))
+        words = old_words[:prefix_words] + changed_words + \
+            old_words[old_suffix_words:]
+        if diagnostics is not None and len(diagnostics) > errors:
+            return words
+
+        # the unchanged regions are re-encoded only where a symbol moved:
+        reencoded_words = len(changed_words)
+        moved = {symbol for symbol, address in table.items()
+                 if old_table.get(symbol) != address}
+        if moved:
+            address = 0
+            changed_start = prefix_words
+            changed_end = prefix_words + len(changed_words)
+            for instruction in instructions:
+                if instruction.kind == Parser.L_COMMAND:
+                    continue
+                if instruction.kind == Parser.A_COMMAND and \
+                        instruction.symbol in moved and \
+                        not changed_start <= address < changed_end:
+                    words[address] = table[instruction.symbol]
+                    reencoded_words += 1
+                address += 1
+
+        self.lines = list(lines)
+        self.line_instructions = line_instructions
+        self.words = words
+        self.symbol_table = symbol_table
+        self.reparsed_lines = new_end - prefix
+        self.reencoded_words = reencoded_words
+
+        if verify:
+            expected = assemble_instructions(Parser.parse_lines(lines))
+            if expected != words:
+                mismatch = next(
+                    (index for index, (word, expected_word)
+                     in enumerate(zip(words, expected))
+                     if word != expected_word),
+                    min(len(words), len(expected)))
+                raise RuntimeError(
+                    f"incremental assembly differs from a full rebuild at "
+                    f"ROM address {mismatch}")
+        return words
+
+    @staticmethod
+    def _move(instruction: typing.Optional[Instruction],
+              offset: int) -> typing.Optional[Instruction]:
+        if instruction is None:
+            return None
+        moved = copy.copy(instruction)
+        moved.line_number += offset
+        return moved
+
+    @staticmethod
+    def _parse(line: str, line_number: int,
+               diagnostics: typing.Optional[Diagnostics]) \
+            -> typing.Optional[Instruction]:
+        try:
+            return Parser.parse_line(line, line_number)
+        except AssemblerError as error:
+            if diagnostics is None:
+                raise
+            diagnostics.add(error)
+            return None
+
+    @staticmethod
+    def _encode(instruction: Instruction, table: typing.Dict[str, int],
+                diagnostics: typing.Optional[Diagnostics]) -> int:
+        if instruction.kind == Parser.A_COMMAND:
+            if instruction.value is not None:
+                return instruction.value
+            # a variable that could not be allocated was recorded:
+            return table.get(instruction.symbol, 0)
+        return encode_c_command(instruction, diagnostics)
+
+    def save(self, state_path: str) -> None:
+        """Saves the state of the last run.
+
+        Args:
+            state_path (str): the file to save the state to.
+        """
+        with open(state_path, 'wb') as state_file:
+            pickle.dump(self, state_file, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(state_path: str) -> "IncrementalAssembler":
+        """Loads the state saved by save(). Only load state files that were
+        written by this assembler, as they are pickles.
+
+        Args:
+            state_path (str): the file to load the state from.
+
+        Returns:
+            IncrementalAssembler: the loaded assembler, or a new one if the
+            state file does not exist or cannot be read.
+        """
+        try:
+            with open(state_path, 'rb') as state_file:
+                assembler = pickle.load(state_file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return IncrementalAssembler()
+        if not isinstance(assembler, IncrementalAssembler):
+            return IncrementalAssembler()
+        return assembler
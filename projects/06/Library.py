@@ -0,0 +1,113 @@
+"""
+The assembler as a library, for programs that assemble many small sources.
+
+Everything happens in memory: a source is a str, ASCII bytes or an iterable
+of lines, and the result is an array of machine words together with the
+symbol table of the program, so no files are read or written. For example:
+
+    words, symbol_table = Library.assemble("@2\\nD=A\\n@3\\nD=D+A\\n")
+    hack_text = Library.to_hack_text(words)
+"""
+import array
+import io
+import typing
+import HackFile
+from Main import assemble_instructions, write_words
+from Optimizer import PeepholeOptimizer
+from Parser import Parser
+from SymbolTable import SymbolTable
+
+Source = typing.Union[str, bytes, typing.Iterable[str]]
+
+
+def source_lines(source: Source) -> typing.Iterable[str]:
+    """
+    Args:
+        source (Source): an assembly program, as a str, ASCII bytes or an
+            iterable of lines (with or without their line endings).
+
+    Returns:
+        typing.Iterable[str]: the lines of the program.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = bytes(source).decode("ascii")
+    if isinstance(source, str):
+        return source.splitlines()
+    return source
+
+
+def assemble(source: Source, optimize: bool = False) \
+        -> typing.Tuple[array.array, SymbolTable]:
+    """Assembles a program in memory.
+
+    Args:
+        source (Source): the program, see source_lines.
+        optimize (bool): optimize the program with the peephole optimizer.
+
+    Returns:
+        typing.Tuple[array.array, SymbolTable]: the machine words, as an
+        array of type 'H', and the symbol table of the program.
+
+    Raises:
+        AssemblerError: for the first error of the program, such as a bad
+            mnemonic, a duplicate label or too many variables.
+    """
+    instructions = Parser.parse_lines(source_lines(source))
+    if optimize:
+        instructions = PeepholeOptimizer().optimize(instructions)
+    symbol_table = SymbolTable()
+    return assemble_instructions(instructions, symbol_table), symbol_table
+
+
+def assemble_many(sources: typing.Iterable[Source], optimize: bool = False) \
+        -> typing.List[typing.Tuple[array.array, SymbolTable]]:
+    """Assembles many programs in a single call.
+
+    The symbol tables of all the programs start from the same prebuilt table
+    of predefined symbols, and a single optimizer is shared by all of them.
+
+    Args:
+        sources (typing.Iterable[Source]): the programs, see source_lines.
+        optimize (bool): optimize the programs with the peephole optimizer.
+
+    Returns:
+        typing.List[typing.Tuple[array.array, SymbolTable]]: the result of
+        assemble for every program, in order.
+    """
+    optimizer = PeepholeOptimizer() if optimize else None
+    predefined = SymbolTable()
+    results = []
+    for source in sources:
+        instructions = Parser.parse_lines(source_lines(source))
+        if optimizer is not None:
+            instructions = optimizer.optimize(instructions)
+        symbol_table = predefined.copy()
+        results.append(
+            (assemble_instructions(instructions, symbol_table), symbol_table))
+    return results
+
+
+def to_hack_text(words: array.array) -> str:
+    """
+    Args:
+        words (array.array): machine words.
+
+    Returns:
+        str: the words in the text .hack format.
+    """
+    output_file = io.StringIO()
+    write_words(words, output_file, HackFile.TEXT_FORMAT)
+    return output_file.getvalue()
+
+
+def to_hack_binary(words: array.array) -> bytes:
+    """
+    Args:
+        words (array.array): machine words.
+
+    Returns:
+        bytes: the words in the binary .hack format.
+    """
+    output_file = io.BytesIO()
+    write_words(words, output_file, HackFile.BINARY_FORMAT)
+    return output_file.getvalue()
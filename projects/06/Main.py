@@ -5,121 +5,806 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
-import re
+import argparse
+import array
+import concurrent.futures
+import contextlib
+import io
 import os
 import sys
+import time
 import typing
-from SymbolTable import SymbolTable
-from Parser import Parser
+from SymbolTable import SymbolTable, SymbolError
+from Parser import Parser, Instruction
 from Code import Code
+import HackFile
+from BuildCache import BuildCache, DEFAULT_MAX_SIZE
+from Optimizer import PeepholeOptimizer, DeadCodeEliminator, \
+    OptimizerPipeline, DEAD_CODE_MODES
+from SourceMap import SourceMap
+from Preprocessor import Preprocessor
+from Diagnostics import AssemblerError, Diagnostics, DiagnosticsError, \
+    check_symbol
+from Statistics import AssemblyStatistics, timed_phase, write_statistics
+
+# identifies the output of the assembler in the build cache, so it should
+# change whenever the output for a given source changes:
+ASSEMBLER_VERSION = "1.0"
+
+# the number of words that the streaming assembler writes at a time:
+STREAMING_CHUNK_SIZE = 4096
 
 
 def decimal_to_binary_16bit(decimal_number):
-    # Convert decimal to binary and remove the '0b' prefix
-    binary_representation = bin(decimal_number)[2:]
+    # Convert decimal to a binary string, padded with zeros to 16 bits
+    return format(decimal_number, "016b")
 
-    # Pad with zeros to make it a 16-bit binary representation
-    binary_representation = binary_representation.zfill(16)
 
-    return binary_representation
+def write_words(words: array.array,
+                output_file: typing.Union[typing.TextIO, typing.BinaryIO],
+                output_format: str = HackFile.TEXT_FORMAT) -> None:
+    """Writes machine words in the given .hack format.
 
+    Args:
+        words (array.array): the machine words.
+        output_file (typing.Union[typing.TextIO, typing.BinaryIO]): writes
+            all output to this file, which is a binary file for the binary
+            format.
+        output_format (str): "text" writes one 16-bit binary string per
+            line, "binary" writes packed little-endian 16-bit words.
+    """
+    if output_format == HackFile.BINARY_FORMAT:
+        HackFile.write_binary(words, output_file)
+    else:
+        output_file.write("".join(
+            decimal_to_binary_16bit(word) + "\n" for word in words))
 
-def remove_spaces_and_comments(line):
-    # Remove spaces
-    line_without_spaces = line.replace(" ", "")
 
-    # Remove comments (everything after '//')
-    line_without_comments = re.sub(r'//.*', '', line_without_spaces)
+def add_label(symbol_table: SymbolTable, instruction: Instruction,
+              address: int,
+              diagnostics: typing.Optional[Diagnostics] = None) -> None:
+    """Adds the label of an L_COMMAND to the symbol table.
 
-    return line_without_comments
+    Args:
+        symbol_table (SymbolTable): the symbol table.
+        instruction (Instruction): the L_COMMAND.
+        address (int): the ROM address of the label.
+        diagnostics (typing.Optional[Diagnostics]): if given, an invalid or
+            duplicate label is recorded in it instead of being raised.
+    """
+    try:
+        check_symbol(instruction.symbol, instruction.line_number, "label")
+        try:
+            symbol_table.add_label(instruction.symbol, address)
+        except SymbolError as error:
+            raise AssemblerError(instruction.line_number, str(error),
+                                 instruction.symbol) from None
+    except AssemblerError as error:
+        if diagnostics is None:
+            raise
+        diagnostics.add(error)
 
 
-def assemble_file(
-        input_file: typing.TextIO, output_file: typing.TextIO) -> None:
-    """Assembles a single file.
+def add_variable(symbol_table: SymbolTable, instruction: Instruction,
+                 diagnostics: typing.Optional[Diagnostics] = None) -> int:
+    """Allocates the symbol of an A_COMMAND as a new variable.
 
     Args:
-        input_file (typing.TextIO): the file to assemble.
-        output_file (typing.TextIO): writes all output to this file.
+        symbol_table (SymbolTable): the symbol table.
+        instruction (Instruction): the A_COMMAND.
+        diagnostics (typing.Optional[Diagnostics]): if given, an invalid
+            variable, or one that does not fit in RAM, is recorded in it
+            instead of being raised.
+
+    Returns:
+        int: the RAM address of the variable, 0 for a recorded error.
     """
-    # Your code goes here!
-    # A good place to start is to initialize a new Parser object:
-    # parser = Parser(input_file)
-    # Note that you can write to output_file like so:
-    # output_file.write("Hello world! \n")
-
-    # create parser object:
-    parser = Parser(input_file)
-    code = Code()
-    symbol_table = SymbolTable()
+    try:
+        check_symbol(instruction.symbol, instruction.line_number, "variable")
+        try:
+            return symbol_table.add_variable(instruction.symbol)
+        except SymbolError as error:
+            raise AssemblerError(instruction.line_number, str(error),
+                                 instruction.symbol) from None
+    except AssemblerError as error:
+        if diagnostics is None:
+            raise
+        diagnostics.add(error)
+        return 0
+
+
+def encode_c_command(instruction: Instruction,
+                     diagnostics: typing.Optional[Diagnostics] = None) \
+        -> int:
+    """Encodes a C_COMMAND, reporting bad mnemonics with their location.
+
+    Args:
+        instruction (Instruction): the C_COMMAND.
+        diagnostics (typing.Optional[Diagnostics]): if given, a bad command
+            is recorded in it instead of being raised.
+
+    Returns:
+        int: the machine word, 0 for a recorded error.
+    """
+    try:
+        return Code.encode(instruction.dest, instruction.comp,
+                           instruction.jump)
+    except KeyError:
+        error = Code.encode_error(instruction.dest, instruction.comp,
+                                  instruction.jump, instruction.line_number)
+    if diagnostics is None:
+        raise error
+    diagnostics.add(error)
+    return 0
+
+
+def define_labels(instructions: typing.Iterable[Instruction],
+                  symbol_table: SymbolTable,
+                  source_map: typing.Optional[SourceMap] = None,
+                  diagnostics: typing.Optional[Diagnostics] = None) -> None:
+    """The first pass: adds the address of every label to the symbol table.
+
+    Args:
+        instructions (typing.Iterable[Instruction]): the parsed commands.
+        symbol_table (SymbolTable): the symbol table to fill.
+        source_map (typing.Optional[SourceMap]): if given, records the
+            source of every command in the same pass.
+        diagnostics (typing.Optional[Diagnostics]): if given, label errors
+            are recorded in it instead of being raised.
+    """
+    if source_map is not None:
+        # the source map counts the addresses:
+        source_lines = source_map.lines
+        for instruction in instructions:
+            if instruction.kind == Parser.L_COMMAND:
+                add_label(symbol_table, instruction, len(source_lines),
+                          diagnostics)
+                source_map.mark_label(instruction.symbol, len(source_lines))
+            else:
+                source_lines.append(instruction.line_number)
+        return
 
-    # first pass:
     label_row_num = 0
-    while parser.has_more_commands():
-        if parser.command_type() == "L_COMMAND":
+    for instruction in instructions:
+        if instruction.kind == Parser.L_COMMAND:
             # add the symbol to the table:
-            symbol_table.table[parser.symbol()] = label_row_num
-        elif parser.command_type() == "A_COMMAND" or parser.command_type() == "C_COMMAND":
+            add_label(symbol_table, instruction, label_row_num, diagnostics)
+        else:
             label_row_num += 1
 
-        # go to next instruction:
-        parser.advance()
 
-    # second pass:
-    # go to start of input file:
-    parser.current_command_index = 0
-    parser.current_command = parser.input_lines[0]
-    binary_value = ""
-    shift = False
-    while parser.has_more_commands():
+def resolve_symbols(instructions: typing.Iterable[Instruction],
+                    symbol_table: SymbolTable,
+                    diagnostics: typing.Optional[Diagnostics] = None) -> None:
+    """Adds all the labels, and then all the variables in the order of their
+    first appearance, to the symbol table, so that encode_instructions does
+    not need to allocate anything.
+
+    Args:
+        instructions (typing.Iterable[Instruction]): the parsed commands.
+        symbol_table (SymbolTable): the symbol table to fill.
+        diagnostics (typing.Optional[Diagnostics]): if given, symbol errors
+            are recorded in it instead of being raised.
+    """
+    define_labels(instructions, symbol_table, diagnostics=diagnostics)
+    table = symbol_table.table
+    for instruction in instructions:
+        if instruction.kind == Parser.A_COMMAND and \
+                instruction.value is None and instruction.symbol not in table:
+            add_variable(symbol_table, instruction, diagnostics)
 
-        if parser.command_type() == "Comment":
-            parser.advance()
-            continue
-        # get next instruction and parse it
-        if parser.command_type() == "A_COMMAND":
-            # adds the symbol to the table if needed:
 
-            if not symbol_table.contains(parser.symbol()) and not parser.symbol().isnumeric():
-                symbol_table.table[parser.symbol()] = symbol_table.symbol_index
-                symbol_table.symbol_index += 1
+def encode_instructions(instructions: typing.Iterable[Instruction],
+                        symbol_table: SymbolTable,
+                        diagnostics: typing.Optional[Diagnostics] = None) \
+        -> typing.Iterator[int]:
+    """The second pass: translates the commands to machine words, adding
+    variables to the symbol table as they appear.
 
-            # convert to binary:
-            if parser.symbol().isnumeric():
-                binary_value = decimal_to_binary_16bit(int(parser.symbol()))
+    Args:
+        instructions (typing.Iterable[Instruction]): the parsed commands.
+        symbol_table (SymbolTable): a symbol table with all the labels.
+        diagnostics (typing.Optional[Diagnostics]): if given, errors are
+            recorded in it and the bad commands are encoded as 0, instead of
+            raising an AssemblerError.
+
+    Yields:
+        int: the machine word of every A_COMMAND and C_COMMAND.
+    """
+    encode = Code.encode
+    table = symbol_table.table
+    for instruction in instructions:
+        if instruction.kind == Parser.A_COMMAND:
+            if instruction.value is not None:
+                yield instruction.value
             else:
-                binary_value = decimal_to_binary_16bit(symbol_table.table[parser.symbol()])
+                address = table.get(instruction.symbol)
+                if address is None:
+                    # a new variable:
+                    address = add_variable(
+                        symbol_table, instruction, diagnostics)
+                yield address
 
-        elif parser.command_type() == "C_COMMAND":
-            # parse dest, comp and jump to its strings:
-            dest = parser.dest()
-            comp = parser.comp()
-            jump = parser.jump()
+        elif instruction.kind == Parser.C_COMMAND:
+            try:
+                word = encode(
+                    instruction.dest, instruction.comp, instruction.jump)
+            except KeyError:
+                word = encode_c_command(instruction, diagnostics)
+            yield word
+
+
+def assemble_instructions(
+        instructions: typing.List[Instruction],
+        symbol_table: typing.Optional[SymbolTable] = None,
+        source_map: typing.Optional[SourceMap] = None,
+        diagnostics: typing.Optional[Diagnostics] = None,
+        statistics: typing.Optional[AssemblyStatistics] = None) \
+        -> array.array:
+    """Assembles parsed commands into machine words, using two passes.
+
+    Args:
+        instructions (typing.List[Instruction]): the parsed commands.
+        symbol_table (typing.Optional[SymbolTable]): the symbol table to
+            fill, a new one is used if it is not given.
+        source_map (typing.Optional[SourceMap]): if given, records the
+            source of every word while the labels are defined.
+        diagnostics (typing.Optional[Diagnostics]): if given, errors are
+            recorded in it instead of being raised.
+        statistics (typing.Optional[AssemblyStatistics]): if given, the
+            time of each pass is recorded in it.
+
+    Returns:
+        array.array: the machine words, as an array of type 'H'.
+    """
+    if symbol_table is None:
+        symbol_table = SymbolTable()
+    with timed_phase(statistics, "first pass"):
+        define_labels(instructions, symbol_table, source_map, diagnostics)
+    with timed_phase(statistics, "second pass"):
+        return array.array("H", encode_instructions(
+            instructions, symbol_table, diagnostics))
 
-            if comp in {"A<<", "D<<", "M<<", "A>>", "D>>", "M>>"}:
-                shift = True
-            # translate to binary value:
 
-            dest = code.dest(dest)
-            comp = code.comp(comp)
-            jump = code.jump(jump)
+def assemble_lines_single_pass(
+        lines: typing.Iterable[str],
+        symbol_table: typing.Optional[SymbolTable] = None,
+        source_map: typing.Optional[SourceMap] = None,
+        diagnostics: typing.Optional[Diagnostics] = None) -> array.array:
+    """Assembles assembly lines into machine words, parsing and encoding
+    them in a single scan, without building a list of parsed commands.
 
-            # combining to 16 bit binary string:
+    A-commands are encoded straight from their text, and every distinct
+    C-command is parsed and encoded once, and then looked up by its text.
+    An A-command that refers to a symbol which is not known yet is emitted
+    as a placeholder, and is backpatched once the matching label is
+    defined. Symbols that are still unresolved at the end are variables,
+    and are allocated in the order of their first appearance, so the words
+    are identical to assemble_instructions. See Benchmark.py for the speed
+    of both.
+
+    Args:
+        lines (typing.Iterable[str]): the lines of the program.
+        symbol_table (typing.Optional[SymbolTable]): the symbol table to
+            fill, a new one is used if it is not given.
+        source_map (typing.Optional[SourceMap]): if given, records the
+            source of every word while it is encoded.
+        diagnostics (typing.Optional[Diagnostics]): if given, errors are
+            recorded in it instead of being raised.
+
+    Returns:
+        array.array: the machine words, as an array of type 'H'.
+    """
+    if symbol_table is None:
+        symbol_table = SymbolTable()
+    table = symbol_table.table
+    source_lines = source_map.lines if source_map is not None else None
+
+    words = array.array("H")
+    # maps an unresolved symbol to the indices of the words using it:
+    forward_references = {}
+    # the line that first used every unresolved symbol, for errors:
+    first_references = {}
+    # the word of every C-command that was encoded, by its text:
+    c_words = {}
+
+    for line_number, line in enumerate(lines, 1):
+        comment_start = line.find(Parser.COMMENT)
+        if comment_start != -1:
+            line = line[:comment_start]
+        command = "".join(line.split())
+        if not command:
+            continue
+        try:
+            if command[0] == Parser.A_COMMAND_PREFIX:
+                symbol = command[1:]
+                if symbol.isdigit():
+                    word = int(symbol)
+                    if word > Parser.MAX_CONSTANT:
+                        # raises the error of the parser:
+                        Parser.parse_line(command, line_number)
+                elif symbol in table:
+                    word = table[symbol]
+                elif symbol:
+                    if symbol not in forward_references:
+                        forward_references[symbol] = []
+                        first_references[symbol] = line_number
+                    forward_references[symbol].append(len(words))
+                    word = 0
+                else:
+                    Parser.parse_line(command, line_number)
+
+            elif command[0] == Parser.L_COMMAND_PREFIX:
+                instruction = Parser.parse_line(command, line_number)
+                label = instruction.symbol
+                add_label(symbol_table, instruction, len(words), diagnostics)
+                if source_map is not None:
+                    source_map.mark_label(label, len(words))
+                # backpatch all the words that were waiting for the label,
+                # which is not in the table if it was recorded as an error:
+                address = table.get(label, 0)
+                for index in forward_references.pop(label, ()):
+                    words[index] = address
+                continue
 
-            if shift:
-                shift = False
-                binary_value = "101" + comp + dest + jump
             else:
-                binary_value = "111" + comp + dest + jump
+                word = c_words.get(command)
+                if word is None:
+                    instruction = Parser.parse_line(command, line_number)
+                    try:
+                        word = Code.encode(instruction.dest, instruction.comp,
+                                           instruction.jump)
+                        c_words[command] = word
+                    except KeyError:
+                        word = encode_c_command(instruction, diagnostics)
+        except AssemblerError as error:
+            if diagnostics is None:
+                raise
+            diagnostics.add(error)
+            continue
+        words.append(word)
+        if source_lines is not None:
+            source_lines.append(line_number)
+
+    # symbols that were never defined as labels are variables:
+    for symbol, indices in forward_references.items():
+        address = add_variable(symbol_table, Instruction(
+            Parser.A_COMMAND, symbol=symbol,
+            line_number=first_references[symbol]), diagnostics)
+        for index in indices:
+            words[index] = address
+
+    return words
+
 
+def assemble_file_streaming(
+        input_file: typing.TextIO,
+        output_file: typing.Union[typing.TextIO, typing.BinaryIO],
+        output_format: str = HackFile.TEXT_FORMAT,
+        source_map: typing.Optional[SourceMap] = None,
+        diagnostics: typing.Optional[Diagnostics] = None,
+        statistics: typing.Optional[AssemblyStatistics] = None) \
+        -> SymbolTable:
+    """Assembles a single file without holding all of it in memory.
 
+    The first pass reads the file line by line and records only the label
+    addresses. The second pass rewinds the file, reads it again line by line
+    and writes the output in chunks of STREAMING_CHUNK_SIZE words, so the
+    peak memory does not depend on the size of the file.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble, which must be
+            seekable.
+        output_file (typing.Union[typing.TextIO, typing.BinaryIO]): writes
+            all output to this file.
+        output_format (str): the format of the .hack file, see write_words.
+        source_map (typing.Optional[SourceMap]): if given, records the
+            source of every word during the first pass.
+        diagnostics (typing.Optional[Diagnostics]): if given, errors are
+            recorded in it instead of being raised.
+        statistics (typing.Optional[AssemblyStatistics]): if given, the
+            counters and the time of each pass are recorded in it. The
+            passes include parsing and writing, which are interleaved.
+
+    Returns:
+        SymbolTable: the symbol table of the program.
+    """
+    if not input_file.seekable():
+        raise ValueError("streaming needs a seekable input file")
+    start_position = input_file.tell()
+    symbol_table = SymbolTable()
+
+    # first pass:
+    with timed_phase(statistics, "first pass"):
+        lines = input_file if statistics is None \
+            else statistics.count_lines(input_file)
+        define_labels(Parser.iterate_lines(lines, diagnostics),
+                      symbol_table, source_map, diagnostics)
+
+    # second pass, where syntax errors were already recorded:
+    with timed_phase(statistics, "second pass"):
+        input_file.seek(start_position)
+        words = array.array("H")
+        second_pass_diagnostics = None if diagnostics is None \
+            else Diagnostics(diagnostics.path)
+        for word in encode_instructions(
+                Parser.iterate_lines(input_file, second_pass_diagnostics),
+                symbol_table, diagnostics):
+            words.append(word)
+            if len(words) == STREAMING_CHUNK_SIZE:
+                if statistics is not None:
+                    statistics.count_words(words)
+                write_words(words, output_file, output_format)
+                del words[:]
+        if statistics is not None:
+            statistics.count_words(words)
+        write_words(words, output_file, output_format)
+    return symbol_table
+
+
+def assemble_file(
+        input_file: typing.TextIO,
+        output_file: typing.Union[typing.TextIO, typing.BinaryIO],
+        single_pass: bool = False,
+        output_format: str = HackFile.TEXT_FORMAT,
+        streaming: bool = False,
+        optimizer: typing.Optional[typing.Union[
+            PeepholeOptimizer, DeadCodeEliminator, OptimizerPipeline]] = None,
+        source_map_file: typing.Optional[typing.TextIO] = None,
+        listing_file: typing.Optional[typing.TextIO] = None,
+        diagnostics: typing.Optional[Diagnostics] = None,
+        statistics: typing.Optional[AssemblyStatistics] = None,
+        origins: typing.Optional[typing.List[typing.Tuple[str, int]]] = None) \
+        -> SymbolTable:
+    """Assembles a single file.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        output_file (typing.Union[typing.TextIO, typing.BinaryIO]): writes
+            all output to this file.
+        single_pass (bool): assemble with a single scan over the lines, see
+            assemble_lines_single_pass. A program that is optimized or
+            listed needs all of its parsed commands, so it is assembled
+            with two passes, which give the same words.
+        output_format (str): the format of the .hack file, see write_words.
+        streaming (bool): assemble without reading all of the file into
+            memory, see assemble_file_streaming.
+        optimizer (typing.Optional[typing.Union[PeepholeOptimizer,
+            DeadCodeEliminator, OptimizerPipeline]]): if given, the program
+            is optimized by it before it is assembled, and its counters tell
+            how many ROM words were saved.
+        source_map_file (typing.Optional[typing.TextIO]): if given, the
+            source map of the program is written to it as JSON, see
+            SourceMap.
+        listing_file (typing.Optional[typing.TextIO]): if given, a
+            human-readable listing of the program is written to it.
+        diagnostics (typing.Optional[Diagnostics]): if given, all the errors
+            of the program are recorded in it, instead of raising an
+            AssemblerError at the first one. The output is only meaningful
+            if no errors were recorded.
+        statistics (typing.Optional[AssemblyStatistics]): if given, the
+            counters and the time of every phase are recorded in it.
+        origins (typing.Optional[typing.List[typing.Tuple[str, int]]]): if
+            the file was preprocessed, the file and line that every line
+            came from, as given by the Preprocessor, for the source map and
+            the listing.
+
+    Returns:
+        SymbolTable: the symbol table of the program.
+    """
+    source_map = None
+    if source_map_file is not None or listing_file is not None:
+        source_map = SourceMap()
+    if streaming:
+        if single_pass:
+            raise ValueError("streaming assembly needs two passes")
+        if optimizer is not None:
+            raise ValueError("optimization needs the whole program in memory")
+        if listing_file is not None:
+            raise ValueError("a listing needs the whole program in memory")
+        symbol_table = assemble_file_streaming(
+            input_file, output_file, output_format, source_map, diagnostics,
+            statistics)
+        if source_map_file is not None:
+            if origins is not None:
+                source_map.resolve_origins(origins)
+            source_map.write(source_map_file)
+        return symbol_table
+
+    symbol_table = SymbolTable()
+    if single_pass and optimizer is None and listing_file is None:
+        with timed_phase(statistics, "single pass"):
+            lines = input_file.read().splitlines()
+            if statistics is not None:
+                lines = statistics.count_lines(lines)
+            words = assemble_lines_single_pass(
+                lines, symbol_table, source_map, diagnostics)
+        with timed_phase(statistics, "write"):
+            write_words(words, output_file, output_format)
+            if source_map_file is not None:
+                if origins is not None:
+                    source_map.resolve_origins(origins)
+                source_map.write(source_map_file)
+        if statistics is not None:
+            statistics.count_words(words)
+        return symbol_table
+
+    # create parser object, which parses all the commands:
+    with timed_phase(statistics, "parse"):
+        if statistics is None:
+            instructions = Parser(input_file, diagnostics).instructions
         else:
-            parser.advance()
-            continue
+            instructions = Parser.parse_lines(statistics.count_lines(
+                input_file.read().splitlines()), diagnostics)
+    if optimizer is not None:
+        with timed_phase(statistics, "optimize"):
+            instructions = optimizer.optimize(instructions)
+    # the optimizers and the listing need the parsed commands, so they are
+    # assembled with two passes, which give the same words:
+    words = assemble_instructions(
+        instructions, symbol_table, source_map, diagnostics, statistics)
+    with timed_phase(statistics, "write"):
+        write_words(words, output_file, output_format)
+        if source_map is not None and origins is not None:
+            source_map.resolve_origins(origins)
+        if source_map_file is not None:
+            source_map.write(source_map_file)
+        if listing_file is not None:
+            source_map.write_listing(instructions, words, listing_file)
+    if statistics is not None:
+        statistics.count_words(words)
+    return symbol_table
+
+
+def assemble_file_single_pass(
+        input_file: typing.TextIO,
+        output_file: typing.Union[typing.TextIO, typing.BinaryIO],
+        output_format: str = HackFile.TEXT_FORMAT) -> SymbolTable:
+    """Assembles a single file with a single scan over its lines, see
+    assemble_lines_single_pass.
 
-        # writing the binary command to output file:
-        output_file.write(binary_value + "\n")
-        parser.advance()
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        output_file (typing.Union[typing.TextIO, typing.BinaryIO]): writes
+            all output to this file.
+        output_format (str): the format of the .hack file, see write_words.
+
+    Returns:
+        SymbolTable: the symbol table of the program.
+    """
+    return assemble_file(input_file, output_file, single_pass=True,
+                         output_format=output_format)
+
+
+def assemble_path(input_path: str, single_pass: bool = False,
+                  output_format: str = HackFile.TEXT_FORMAT,
+                  streaming: bool = False,
+                  cache: typing.Optional[BuildCache] = None,
+                  symbol_map: bool = False, optimize: bool = False,
+                  dead_code: typing.Optional[str] = None,
+                  incremental: bool = False, verify: bool = False,
+                  source_map: bool = False, listing: bool = False,
+                  preprocessor: typing.Optional[Preprocessor] = None,
+                  statistics: typing.Optional[AssemblyStatistics] = None) \
+        -> float:
+    """Assembles an .asm file into the .hack file next to it.
+
+    Args:
+        input_path (str): path of the .asm file.
+        single_pass (bool): see assemble_file.
+        output_format (str): see assemble_file.
+        streaming (bool): see assemble_file.
+        cache (typing.Optional[BuildCache]): if given, the output is reused
+            from the cache when the source was already assembled, and is
+            added to the cache otherwise. The cache is not used for reading
+            when a symbol map, source map or listing is requested, as it
+            only keeps .hack files.
+        symbol_map (bool): also write the symbol map of the program as JSON
+            to a .sym.json file next to the .hack file.
+        optimize (bool): optimize the program with the peephole optimizer,
+            and report the saved ROM words on stderr.
+        dead_code (typing.Optional[str]): if given, remove unreachable code
+            first, in this mode of DeadCodeEliminator, and report the saved
+            ROM words on stderr.
+        incremental (bool): re-assemble only what changed since the last
+            incremental run, whose state is kept in a .incremental file next
+            to the .hack file, see Incremental.IncrementalAssembler.
+        verify (bool): with incremental, check that the result is identical
+            to a full rebuild.
+        source_map (bool): also write the source map of the program to a
+            .map.json file next to the .hack file, see SourceMap.
+        listing (bool): also write a listing of the program to a .lst file
+            next to the .hack file.
+        preprocessor (typing.Optional[Preprocessor]): if given, expands the
+            includes and macros of the file before it is assembled. Sharing
+            a preprocessor between files shares its cache of expansions.
+        statistics (typing.Optional[AssemblyStatistics]): if given, the
+            counters and the time of every phase are recorded in it, and
+            its listener is told when the file is done. For a cached file,
+            only the preprocessing and the cache lookup are timed.
+
+    Returns:
+        float: the time it took to assemble the file, in seconds.
+
+    Raises:
+        DiagnosticsError: if the file has errors, after all of them were
+            reported on stderr. No output files are left behind.
+    """
+    start = time.perf_counter()
+    filename, extension = os.path.splitext(input_path)
+    output_path = filename + ".hack"
+    source = None
+    lines = origins = None
+    if preprocessor is not None:
+        with timed_phase(statistics, "preprocess"):
+            lines, origins = preprocessor.expand_path(input_path)
+            source = "".join(line + "\n" for line in lines)
+
+    def open_source(mode: str) -> typing.IO:
+        if source is None:
+            return open(input_path, mode)
+        if mode == 'rb':
+            return io.BytesIO(source.encode())
+        return io.StringIO(source)
+
+    if cache is not None:
+        with timed_phase(statistics, "cache"):
+            with open_source('rb') as input_file:
+                # single_pass and streaming are not a part of the key, as
+                # all modes give the same output:
+                key = BuildCache.key(
+                    input_file, ASSEMBLER_VERSION, output_format,
+                    f"optimize={optimize}", f"dead_code={dead_code}")
+            extra_outputs = symbol_map or source_map or listing
+            cached = not extra_outputs and cache.fetch(key, output_path)
+        if cached:
+            elapsed = time.perf_counter() - start
+            if statistics is not None:
+                statistics.cached = True
+                statistics.finish(elapsed)
+            return elapsed
+
+    optimizers = []
+    if dead_code is not None:
+        optimizers.append(DeadCodeEliminator(dead_code))
+    if optimize:
+        optimizers.append(PeepholeOptimizer())
+    optimizer = OptimizerPipeline(optimizers) if optimizers else None
+    output_mode = 'wb' if output_format == HackFile.BINARY_FORMAT else 'w'
+    if incremental:
+        # imported here, as Incremental builds on the functions of this module:
+        from Incremental import IncrementalAssembler
+        state_path = filename + ".incremental"
+        assembler = IncrementalAssembler.load(state_path)
+        diagnostics = Diagnostics(input_path, lines, origins)
+        with timed_phase(statistics, "incremental"):
+            with open_source('r') as input_file:
+                source_lines = input_file.read().splitlines()
+                if statistics is not None:
+                    source_lines = list(statistics.count_lines(source_lines))
+                words = assembler.assemble(source_lines, verify, diagnostics)
+        if diagnostics:
+            diagnostics.report()
+            # like the other modes, do not leave the output of a previous
+            # run behind:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(output_path)
+            raise DiagnosticsError(diagnostics)
+        with timed_phase(statistics, "write"):
+            with open(output_path, output_mode) as output_file:
+                write_words(words, output_file, output_format)
+            assembler.save(state_path)
+        if statistics is not None:
+            statistics.count_words(words)
+        symbol_table = assembler.symbol_table
+        print(f"{input_path}: re-parsed {assembler.reparsed_lines} lines, "
+              f"re-encoded {assembler.reencoded_words} of {len(words)} words"
+              f"{' (verified)' if verify else ''}", file=sys.stderr)
+    else:
+        diagnostics = Diagnostics(input_path, lines, origins)
+        output_paths = [output_path]
+        with contextlib.ExitStack() as stack:
+            input_file = stack.enter_context(open_source('r'))
+            output_file = stack.enter_context(open(output_path, output_mode))
+            source_map_file = listing_file = None
+            if source_map:
+                output_paths.append(filename + ".map.json")
+                source_map_file = stack.enter_context(
+                    open(output_paths[-1], 'w'))
+            if listing:
+                output_paths.append(filename + ".lst")
+                listing_file = stack.enter_context(
+                    open(output_paths[-1], 'w'))
+            symbol_table = assemble_file(
+                input_file, output_file, single_pass, output_format,
+                streaming, optimizer, source_map_file, listing_file,
+                diagnostics, statistics, origins)
+        if diagnostics:
+            diagnostics.report()
+            for path in output_paths:
+                os.remove(path)
+            raise DiagnosticsError(diagnostics)
+    if optimizer is not None and optimizer.skipped:
+        print(f"{input_path}: not optimized, as it may jump to hard-coded "
+              f"ROM addresses", file=sys.stderr)
+    elif optimizer is not None:
+        rules = ", ".join(f"{rule}: {count}"
+                          for rule, count in optimizer.counts.items())
+        print(f"{input_path}: the optimizer saved {optimizer.saved_words} "
+              f"ROM words ({rules})", file=sys.stderr)
+    if symbol_map:
+        with open(filename + ".sym.json", 'w') as symbol_map_file:
+            symbol_table.write_symbol_map(symbol_map_file)
+    if cache is not None:
+        cache.store(key, output_path)
+    elapsed = time.perf_counter() - start
+    if statistics is not None:
+        statistics.count_symbols(len(symbol_table.labels),
+                                 len(symbol_table.variables))
+        statistics.finish(elapsed)
+    return elapsed
+
+
+def _assemble_path_or_error(input_path: str,
+                            collect_statistics: bool = False, **options) \
+        -> typing.Tuple[float, typing.Optional[str], typing.Optional[bool],
+                        typing.Optional[AssemblyStatistics]]:
+    """Runs assemble_path in a worker process, catching any error so that
+    the failure is timed like a success.
+
+    Returns:
+        typing.Tuple[float, typing.Optional[str], typing.Optional[bool],
+        typing.Optional[AssemblyStatistics]]: the time it took, an error
+        message if it failed (None otherwise), whether the output came from
+        the cache (None without a cache), and the statistics of the file if
+        collect_statistics is set.
+    """
+    start = time.perf_counter()
+    cache = options.get("cache")
+    hits = cache.hits if cache is not None else 0
+    statistics = AssemblyStatistics(input_path) \
+        if collect_statistics else None
+    try:
+        elapsed = assemble_path(input_path, statistics=statistics, **options)
+        error = None
+    except Exception as exception:
+        elapsed = time.perf_counter() - start
+        error = f"{type(exception).__name__}: {exception}"
+    cache_hit = cache.hits > hits if cache is not None else None
+    return elapsed, error, cache_hit, statistics
+
+
+def assemble_paths_parallel(
+        input_paths: typing.List[str], jobs: int,
+        collect_statistics: bool = False, **options) \
+        -> typing.Iterator[typing.Tuple[
+            str, float, typing.Optional[str], typing.Optional[bool],
+            typing.Optional[AssemblyStatistics]]]:
+    """Assembles .asm files with a pool of processes, see assemble_path.
+
+    Args:
+        input_paths (typing.List[str]): paths of the .asm files.
+        jobs (int): the number of processes.
+        collect_statistics (bool): collect the statistics of every file in
+            its worker process.
+        **options: passed to assemble_path.
+
+    Yields:
+        typing.Tuple[str, float, typing.Optional[str], typing.Optional[bool],
+        typing.Optional[AssemblyStatistics]]: the path, the time it took to
+        assemble it, an error message if it failed (None otherwise), whether
+        it was a cache hit (None without a cache) and its statistics (None
+        without collect_statistics), in the order in which the files are
+        done.
+    """
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) \
+            as executor:
+        futures = {
+            executor.submit(_assemble_path_or_error, input_path,
+                            collect_statistics, **options): input_path
+            for input_path in input_paths}
+        for future in concurrent.futures.as_completed(futures):
+            yield (futures[future],) + future.result()
 
 
 if "__main__" == __name__:
@@ -128,20 +813,177 @@ if "__main__" == __name__:
     # Both are closed automatically when the code finishes running.
     # If the output file does not exist, it is created automatically in the
     # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: Assembler <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
+    argument_parser = argparse.ArgumentParser(
+        prog="Assembler", description="Assembles Hack assembly files.")
+    argument_parser.add_argument(
+        "input_path", nargs="?",
+        help="an .asm file or a directory of .asm files")
+    argument_parser.add_argument(
+        "--serve", action="store_true",
+        help="run a resident assembler on a Unix domain socket instead, "
+             "see Client.py")
+    argument_parser.add_argument(
+        "--socket", metavar="PATH",
+        help="the socket of --serve (default: a per-user temporary file)")
+    argument_parser.add_argument(
+        "--single-pass", action="store_true",
+        help="assemble in a single scan over the lines, backpatching "
+             "forward labels")
+    argument_parser.add_argument(
+        "--stream", action="store_true",
+        help="assemble without reading whole files into memory")
+    argument_parser.add_argument(
+        "--format", choices=HackFile.FORMATS, default=HackFile.TEXT_FORMAT,
+        help="write .hack files as text lines (default) or as packed "
+             "little-endian 16-bit words")
+    argument_parser.add_argument(
+        "--jobs", type=int, metavar="N",
+        help="assemble the files with N processes, reporting per-file "
+             "timings and failures")
+    argument_parser.add_argument(
+        "--dead-code", choices=DEAD_CODE_MODES, metavar="MODE",
+        help="remove code that is unreachable from address 0; "
+             "'aggressive' keeps the labels that reachable code uses, "
+             "'conservative' keeps every label whose address is used")
+    argument_parser.add_argument(
+        "--optimize", action="store_true",
+        help="remove redundant instructions with a peephole optimizer")
+    argument_parser.add_argument(
+        "--incremental", action="store_true",
+        help="re-assemble only the lines that changed since the last "
+             "--incremental run, keeping state in .incremental files")
+    argument_parser.add_argument(
+        "--verify", action="store_true",
+        help="with --incremental, check the result against a full rebuild")
+    argument_parser.add_argument(
+        "--source-map", action="store_true",
+        help="also write a .map.json file that maps every ROM address to "
+             "its source line, label and VM function")
+    argument_parser.add_argument(
+        "--listing", action="store_true",
+        help="also write a human-readable .lst listing of the program")
+    argument_parser.add_argument(
+        "--preprocess", action="store_true",
+        help="expand #include directives and macros first, see "
+             "Preprocessor.py")
+    argument_parser.add_argument(
+        "--symbol-map", action="store_true",
+        help="also write the labels and variables to a .sym.json file")
+    argument_parser.add_argument(
+        "--cache", metavar="DIRECTORY",
+        help="reuse the .hack output of unchanged sources from this cache "
+             "directory, and report hit/miss statistics")
+    argument_parser.add_argument(
+        "--cache-size", type=int, metavar="MB",
+        default=DEFAULT_MAX_SIZE // (1024 * 1024),
+        help="evict the least recently used cache entries above this size")
+    argument_parser.add_argument(
+        "--stats", action="store_true",
+        help="write the counters and phase timings of every file to stdout "
+             "as JSON")
+    arguments = argument_parser.parse_args()
+    if arguments.serve:
+        # imported here, as the server builds on the functions of this module:
+        import Server
+        from Client import default_socket_path
+        try:
+            Server.serve(arguments.socket or default_socket_path())
+        except OSError as error:
+            sys.exit(f"{type(error).__name__}: {error}")
+        sys.exit(0)
+    if arguments.input_path is None:
+        argument_parser.error("the following arguments are required: "
+                              "input_path")
+    if arguments.single_pass and arguments.stream:
+        argument_parser.error("--single-pass and --stream are exclusive")
+    optimizing = arguments.optimize or arguments.dead_code is not None
+    if optimizing and arguments.stream:
+        argument_parser.error(
+            "--optimize and --dead-code cannot be combined with --stream")
+    if arguments.incremental and (arguments.stream or optimizing):
+        argument_parser.error(
+            "--incremental cannot be combined with --stream, --optimize or "
+            "--dead-code")
+    if arguments.incremental and (arguments.source_map or arguments.listing):
+        argument_parser.error(
+            "--incremental cannot be combined with --source-map or --listing")
+    if arguments.listing and arguments.stream:
+        argument_parser.error("--listing and --stream are exclusive")
+    if arguments.verify and not arguments.incremental:
+        argument_parser.error("--verify needs --incremental")
+    if arguments.jobs is not None and arguments.jobs < 1:
+        argument_parser.error("--jobs must be at least 1")
+    argument_path = os.path.abspath(arguments.input_path)
     if os.path.isdir(argument_path):
         files_to_assemble = [
             os.path.join(argument_path, filename)
             for filename in os.listdir(argument_path)]
     else:
         files_to_assemble = [argument_path]
-    for input_path in files_to_assemble:
-        filename, extension = os.path.splitext(input_path)
-        if extension.lower() != ".asm":
-            continue
-        output_path = filename + ".hack"
-        with open(input_path, 'r') as input_file, \
-                open(output_path, 'w') as output_file:
-            assemble_file(input_file, output_file)
+    files_to_assemble = [
+        input_path for input_path in files_to_assemble
+        if os.path.splitext(input_path)[1].lower() == ".asm"]
+    cache = None
+    if arguments.cache is not None:
+        cache = BuildCache(os.path.abspath(arguments.cache),
+                           arguments.cache_size * 1024 * 1024)
+    options = {"single_pass": arguments.single_pass,
+               "output_format": arguments.format,
+               "streaming": arguments.stream, "cache": cache,
+               "symbol_map": arguments.symbol_map,
+               "optimize": arguments.optimize,
+               "dead_code": arguments.dead_code,
+               "incremental": arguments.incremental,
+               "verify": arguments.verify,
+               "source_map": arguments.source_map,
+               "listing": arguments.listing,
+               "preprocessor":
+                   Preprocessor() if arguments.preprocess else None}
+    failures = 0
+    all_statistics = []
+    if arguments.jobs is None:
+        for input_path in files_to_assemble:
+            file_statistics = None
+            if arguments.stats:
+                file_statistics = AssemblyStatistics(input_path)
+                all_statistics.append(file_statistics)
+            try:
+                assemble_path(input_path, statistics=file_statistics,
+                              **options)
+            except DiagnosticsError:
+                # the errors were already reported:
+                failures += 1
+            except (ValueError, OSError) as error:
+                failures += 1
+                print(f"{input_path}: {type(error).__name__}: {error}",
+                      file=sys.stderr)
+    else:
+        for input_path, elapsed, error, cache_hit, file_statistics in \
+                assemble_paths_parallel(files_to_assemble, arguments.jobs,
+                                        arguments.stats,
+                                        **options):
+            if cache_hit is not None:
+                cache.record(cache_hit)
+            if file_statistics is not None:
+                all_statistics.append(file_statistics)
+            if error is None:
+                print(f"{input_path}: {elapsed:.3f}s"
+                      f"{' (cached)' if cache_hit else ''}", file=sys.stderr)
+            else:
+                failures += 1
+                print(f"{input_path}: failed after {elapsed:.3f}s: {error}",
+                      file=sys.stderr)
+        print(f"assembled {len(files_to_assemble) - failures} of "
+              f"{len(files_to_assemble)} files", file=sys.stderr)
+    if cache is not None:
+        # evictions done by worker processes are not counted here:
+        cache.evict()
+        statistics = cache.statistics()
+        print(f"cache: {statistics['hits']} hits, "
+              f"{statistics['misses']} misses, "
+              f"{statistics['evictions']} evictions, "
+              f"{statistics['size']} bytes", file=sys.stderr)
+    if arguments.stats:
+        write_statistics(all_statistics, sys.stdout)
+    if failures:
+        sys.exit(1)
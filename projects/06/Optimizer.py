@@ -0,0 +1,379 @@
+"""
+Optimizers for parsed Hack assembly: a peephole optimizer, and dead code
+elimination based on whole-program reachability.
+
+The optimizer works on the Instruction list of a Parser, before symbols are
+resolved, so label addresses are simply recomputed for the shorter program.
+It never looks across a label, as a label can be reached from anywhere, and
+so it needs jumps to only go to labels, as removing commands moves all the
+code after them. Programs that may jump to hard-coded ROM addresses (like
+the bundled Pong.asm, which was translated with numeric return addresses)
+are detected by jumps_to_rom_addresses, and are left unchanged. A number
+that is copied out of A may be such an address, unless the program stores
+its return addresses as labels, like the output of the VM translator, whose
+calls push labels, and whose push constant copies numbers as data.
+
+The rules, which are applied until none of them matches:
+- "no-op": X=X for a single register X, without a jump (for example M=M).
+- "inverse": X=X+1 immediately followed by X=X-1 (or the other way around),
+  without jumps, both are removed.
+- "dead-load": @X immediately followed by another A-command, as A is
+  overwritten before it is used.
+- "reload": @X when A is already known to hold X, because no command since
+  the last @X changed A (for example @SP, M=M+1, @SP).
+
+DeadCodeEliminator splits the program into blocks that start at labels, and
+keeps only the blocks that are reachable from address 0: by falling through
+from a reachable block, or because reachable code uses the label, either as
+the target of a jump (@LABEL, 0;JMP) or by loading its address (@LABEL,
+D=A, as pushing a return address does). A keeps its value across a label
+that is reached by falling through, so @LABEL, (X), 0;JMP uses LABEL too.
+Commands after an unconditional jump are unreachable until the next label.
+Indirect jumps (A=M, 0;JMP) can only go to addresses that were loaded
+somewhere, which are labels, as programs that may use numbers as code
+addresses are left unchanged, like by the peephole optimizer. So indirect
+jumps need no edges of their own. In conservative mode, every label that
+any command uses is kept, even if the use itself is unreachable.
+"""
+import typing
+from Parser import Parser, Instruction
+
+INVERSE_COMPS = {"A+1": "A-1", "A-1": "A+1", "D+1": "D-1", "D-1": "D+1",
+                 "M+1": "M-1", "M-1": "M+1"}
+RULES = ("no-op", "inverse", "dead-load", "reload")
+DEAD_CODE_RULES = ("unreachable", "after-jump")
+DEAD_CODE_MODES = ("aggressive", "conservative")
+
+
+def jumps_to_rom_addresses(instructions: typing.List[Instruction]) -> bool:
+    """Checks if a program may jump to an address that it loaded as a
+    number, which removing commands would break.
+
+    That is the case for a direct jump to a number (@133, 0;JMP), and for a
+    program with an indirect jump (A=M or A=D, and then a jump) that copies
+    numbers out of A (@11, D=A) but never a label, as the numbers may be
+    return addresses that are stored in RAM and jumped to later. A program
+    that copies labels out of A (@RETURN, D=A), like the output of the VM
+    translator, is taken to store its return addresses as labels, so the
+    numbers that it copies (push constant) are data. A number that is only
+    used as a RAM address (@5, M=D) is not copied.
+
+    Args:
+        instructions (typing.List[Instruction]): the parsed commands.
+
+    Returns:
+        bool: True if the program may jump to a hard-coded ROM address.
+    """
+    labels = {instruction.symbol for instruction in instructions
+              if instruction.kind == Parser.L_COMMAND}
+    # where the value of A comes from: an A-command with a label, another
+    # symbol or a number, or a C-command:
+    source_of_a = "symbol"
+    indirect_jump = copied_number = copied_label = False
+    for instruction in instructions:
+        if instruction.kind == Parser.A_COMMAND:
+            if instruction.value is not None:
+                source_of_a = "number"
+            elif instruction.symbol in labels:
+                source_of_a = "label"
+            else:
+                source_of_a = "symbol"
+        elif instruction.kind == Parser.L_COMMAND:
+            # a jump to the label loads A with the label, and falling through
+            # keeps A as it was:
+            continue
+        else:
+            if "A" in instruction.comp:
+                if source_of_a == "number":
+                    copied_number = True
+                elif source_of_a == "label":
+                    copied_label = True
+            if instruction.jump is not None:
+                if source_of_a == "number":
+                    return True
+                if source_of_a == "computed":
+                    indirect_jump = True
+            if instruction.dest is not None and "A" in instruction.dest:
+                source_of_a = "computed"
+    return indirect_jump and copied_number and not copied_label
+
+
+def _is_no_op(instruction: Instruction) -> bool:
+    return instruction.jump is None and instruction.dest is not None and \
+        instruction.dest == instruction.comp and \
+        instruction.dest in ("A", "D", "M")
+
+
+def _is_increment(instruction: Instruction) -> bool:
+    # X=X+1 or X=X-1, without a jump:
+    return instruction.jump is None and instruction.comp in INVERSE_COMPS \
+        and instruction.comp[0] == instruction.dest
+
+
+def _are_inverse(first: Instruction, second: Instruction) -> bool:
+    return first.kind == second.kind == Parser.C_COMMAND and \
+        _is_increment(first) and _is_increment(second) and \
+        INVERSE_COMPS[first.comp] == second.comp
+
+
+class PeepholeOptimizer:
+    """Removes provably dead or redundant instructions, and counts how many
+    instructions every rule removed. skipped counts the programs that were
+    left unchanged, as they may jump to hard-coded ROM addresses.
+    """
+
+    def __init__(self) -> None:
+        """Creates an optimizer with zeroed counters."""
+        self.counts = dict.fromkeys(RULES, 0)
+        self.skipped = 0
+
+    @property
+    def saved_words(self) -> int:
+        """
+        Returns:
+            int: the number of ROM words saved by all optimize() calls.
+        """
+        return sum(self.counts.values())
+
+    def optimize(self, instructions: typing.List[Instruction]) \
+            -> typing.List[Instruction]:
+        """Optimizes a program.
+
+        Args:
+            instructions (typing.List[Instruction]): the parsed commands.
+
+        Returns:
+            typing.List[Instruction]: the optimized commands.
+        """
+        if jumps_to_rom_addresses(instructions):
+            self.skipped += 1
+            return instructions
+        while True:
+            saved_words = self.saved_words
+            instructions = self._optimize_once(instructions)
+            if self.saved_words == saved_words:
+                return instructions
+
+    def _optimize_once(self, instructions: typing.List[Instruction]) \
+            -> typing.List[Instruction]:
+        output = []
+        # the symbol that A is known to hold, None if it is unknown:
+        known_a = None
+        for instruction in instructions:
+            if instruction.kind == Parser.L_COMMAND:
+                output.append(instruction)
+                known_a = None
+
+            elif instruction.kind == Parser.A_COMMAND:
+                if instruction.symbol == known_a:
+                    self.counts["reload"] += 1
+                    continue
+                if output and output[-1].kind == Parser.A_COMMAND:
+                    output.pop()
+                    self.counts["dead-load"] += 1
+                output.append(instruction)
+                known_a = instruction.symbol
+
+            else:
+                if _is_no_op(instruction):
+                    self.counts["no-op"] += 1
+                    continue
+                if output and _are_inverse(output[-1], instruction):
+                    output.pop()
+                    self.counts["inverse"] += 2
+                    continue
+                output.append(instruction)
+                if instruction.dest is not None and "A" in instruction.dest:
+                    known_a = None
+        return output
+
+
+class DeadCodeEliminator:
+    """Removes the commands that can not be reached from address 0, and
+    counts them: "unreachable" for the commands of unreachable blocks, and
+    "after-jump" for commands after an unconditional jump in a reachable
+    block. removed_labels lists the labels of the removed blocks, and
+    skipped counts the programs that were left unchanged, as they may jump
+    to hard-coded ROM addresses.
+    """
+
+    def __init__(self, mode: str = "aggressive") -> None:
+        """Creates an eliminator with zeroed counters.
+
+        Args:
+            mode (str): "aggressive" keeps the labels that reachable code
+                uses, "conservative" keeps every label that is used.
+        """
+        if mode not in DEAD_CODE_MODES:
+            raise ValueError(f"unknown dead code mode {mode!r}")
+        self.mode = mode
+        self.counts = dict.fromkeys(DEAD_CODE_RULES, 0)
+        self.removed_labels = []
+        self.skipped = 0
+
+    @property
+    def saved_words(self) -> int:
+        """
+        Returns:
+            int: the number of ROM words saved by all optimize() calls.
+        """
+        return sum(self.counts.values())
+
+    def optimize(self, instructions: typing.List[Instruction]) \
+            -> typing.List[Instruction]:
+        """Removes the unreachable commands of a program.
+
+        Args:
+            instructions (typing.List[Instruction]): the parsed commands.
+
+        Returns:
+            typing.List[Instruction]: the reachable commands.
+        """
+        if jumps_to_rom_addresses(instructions):
+            self.skipped += 1
+            return instructions
+
+        # a block is a label (None for the first block) and the index of its
+        # first command:
+        block_starts = [(None, 0)]
+        for index, instruction in enumerate(instructions):
+            if instruction.kind == Parser.L_COMMAND:
+                block_starts.append((instruction.symbol, index + 1))
+        block_ends = [start - 1 for _, start in block_starts[1:]] + \
+            [len(instructions)]
+        label_blocks = {}
+        for block, (label, _) in enumerate(block_starts):
+            label_blocks.setdefault(label, block)
+
+        # the label that A is known to hold when a block is entered by
+        # falling through into it, None if it is unknown:
+        entry_labels = [None]
+        known_a = None
+        for instruction in instructions:
+            if instruction.kind == Parser.L_COMMAND:
+                entry_labels.append(known_a)
+            elif instruction.kind == Parser.A_COMMAND:
+                known_a = label_blocks.get(instruction.symbol)
+            elif instruction.jump == "JMP" or (
+                    instruction.dest is not None and "A" in instruction.dest):
+                known_a = None
+
+        worklist = [0]
+        if self.mode == "conservative":
+            worklist.extend(
+                label_blocks[instruction.symbol]
+                for instruction in instructions
+                if instruction.kind == Parser.A_COMMAND and
+                instruction.symbol in label_blocks)
+
+        # the end of the reachable part of every reachable block:
+        live_ends = {}
+        while worklist:
+            block = worklist.pop()
+            if block in live_ends:
+                continue
+            live_end, successors = self._scan_block(
+                instructions, block_starts[block][1], block_ends[block],
+                label_blocks, entry_labels[block])
+            live_ends[block] = live_end
+            worklist.extend(successors)
+            if live_end == block_ends[block] and \
+                    block + 1 < len(block_starts):
+                # falls through to the next label:
+                worklist.append(block + 1)
+
+        output = []
+        for block, (label, start) in enumerate(block_starts):
+            end = block_ends[block]
+            if block not in live_ends:
+                self.counts["unreachable"] += sum(
+                    1 for instruction in instructions[start:end]
+                    if instruction.kind != Parser.L_COMMAND)
+                self.removed_labels.append(label)
+                continue
+            if label is not None:
+                output.append(instructions[start - 1])
+            output.extend(instructions[start:live_ends[block]])
+            self.counts["after-jump"] += end - live_ends[block]
+        return output
+
+    @staticmethod
+    def _scan_block(instructions: typing.List[Instruction], start: int,
+                    end: int, label_blocks: typing.Dict[str, int],
+                    known_a: typing.Optional[int]) \
+            -> typing.Tuple[int, typing.List[int]]:
+        # returns the end of the reachable commands of the block, and the
+        # blocks of the labels that they use. known_a is the block of the
+        # label that A holds when the block is entered, None if it is
+        # unknown; a jump to the block itself needs no edge:
+        successors = []
+        for index in range(start, end):
+            instruction = instructions[index]
+            if instruction.kind == Parser.A_COMMAND:
+                known_a = label_blocks.get(instruction.symbol)
+                continue
+            # any C-command uses the label in A, as a jump target, an
+            # address or a value:
+            if known_a is not None:
+                successors.append(known_a)
+            if instruction.jump == "JMP":
+                return index + 1, successors
+            if instruction.dest is not None and "A" in instruction.dest:
+                known_a = None
+        return end, successors
+
+
+class OptimizerPipeline:
+    """Runs optimizers one after the other, with the interface of a single
+    one: the counts of all of their rules, and their total saved words.
+    """
+
+    def __init__(self, optimizers: typing.List[typing.Any]) -> None:
+        """
+        Args:
+            optimizers (typing.List[typing.Any]): the optimizers, in order,
+                for example a DeadCodeEliminator and a PeepholeOptimizer.
+        """
+        self.optimizers = optimizers
+
+    @property
+    def counts(self) -> typing.Dict[str, int]:
+        """
+        Returns:
+            typing.Dict[str, int]: the number of words that every rule of
+            every optimizer removed.
+        """
+        counts = {}
+        for optimizer in self.optimizers:
+            counts.update(optimizer.counts)
+        return counts
+
+    @property
+    def saved_words(self) -> int:
+        """
+        Returns:
+            int: the number of ROM words saved by all the optimizers.
+        """
+        return sum(optimizer.saved_words for optimizer in self.optimizers)
+
+    @property
+    def skipped(self) -> int:
+        """
+        Returns:
+            int: the number of programs that an optimizer left unchanged.
+        """
+        return max(optimizer.skipped for optimizer in self.optimizers)
+
+    def optimize(self, instructions: typing.List[Instruction]) \
+            -> typing.List[Instruction]:
+        """Optimizes a program with every optimizer.
+
+        Args:
+            instructions (typing.List[Instruction]): the parsed commands.
+
+        Returns:
+            typing.List[Instruction]: the optimized commands.
+        """
+        for optimizer in self.optimizers:
+            instructions = optimizer.optimize(instructions)
+        return instructions
@@ -6,7 +6,49 @@ as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
 import typing
-import re
+from Diagnostics import AssemblerError, Diagnostics
+
+
+class Instruction:
+    """A single pre-parsed command of an assembly program.
+
+    A_COMMAND: symbol is the text after "@", value is its number if the
+               symbol is a decimal constant, and None otherwise.
+    C_COMMAND: dest, comp and jump are the mnemonics, None if missing.
+    L_COMMAND: symbol is the name of the label.
+    """
+
+    __slots__ = ("kind", "symbol", "value", "dest", "comp", "jump",
+                 "line_number")
+
+    def __init__(self, kind: str, symbol: typing.Optional[str] = None,
+                 value: typing.Optional[int] = None,
+                 dest: typing.Optional[str] = None,
+                 comp: typing.Optional[str] = None,
+                 jump: typing.Optional[str] = None,
+                 line_number: int = 0) -> None:
+        self.kind = kind
+        self.symbol = symbol
+        self.value = value
+        self.dest = dest
+        self.comp = comp
+        self.jump = jump
+        self.line_number = line_number
+
+    def __repr__(self) -> str:
+        return f"Instruction({self.kind}, {self}, line {self.line_number})"
+
+    def __str__(self) -> str:
+        if self.kind == Parser.A_COMMAND:
+            return "@" + self.symbol
+        if self.kind == Parser.L_COMMAND:
+            return "(" + self.symbol + ")"
+        command = self.comp
+        if self.dest is not None:
+            command = self.dest + "=" + command
+        if self.jump is not None:
+            command = command + ";" + self.jump
+        return command
 
 
 class Parser:
@@ -14,63 +56,144 @@ class Parser:
     by reading each command line-by-line, parses the current command,
     and provides convenient access to the commands components (fields
     and symbols). In addition, removes all white space and comments.
+
+    All the commands are parsed once, when the parser is created, into a
+    list of Instruction objects which is available as parser.instructions.
     """
 
     # represent an empty line:
     EMPTY_LINE = ''
-    COMMENT = '/'
+    COMMENT = '//'
     A_COMMAND_PREFIX = "@"
     L_COMMAND_PREFIX = "("
+    L_COMMAND_SUFFIX = ")"
+    # A-commands load 15-bit constants, as the MSB marks C-commands:
+    MAX_CONSTANT = 0x7FFF
 
-    def __init__(self, input_file: typing.TextIO) -> None:
+    # the command types:
+    A_COMMAND = "A_COMMAND"
+    C_COMMAND = "C_COMMAND"
+    L_COMMAND = "L_COMMAND"
+
+    def __init__(self, input_file: typing.TextIO,
+                 diagnostics: typing.Optional[Diagnostics] = None) -> None:
         """Opens the input file and gets ready to parse it.
 
         Args:
             input_file (typing.TextIO): input file.
+            diagnostics (typing.Optional[Diagnostics]): if given, syntax
+                errors are recorded in it instead of being raised.
         """
-        # Your code goes here!
-        # A good place to start is to read all the lines of the input:
-
-        # read all lines in input_file:
-        self.input_lines = input_file.read().splitlines()
-        self.input_lines = self.remove_comments_and_empty_lines(self.input_lines)
+        # parse all lines in input_file:
+        self.instructions = self.parse_lines(
+            input_file.read().splitlines(), diagnostics)
 
         # this is an index that represent the index of the current command:
         self.current_command_index = 0
 
         # represent the current command needed to be converted:
-        self.current_command = self.input_lines[0]
+        self.current_command = self.instructions[0] \
+            if self.instructions else None
 
-        # a flag that tells if jump needed or not:
-        self.is_jump = False
-        self.is_dest = False
+    @classmethod
+    def parse_lines(cls, lines: typing.Iterable[str],
+                    diagnostics: typing.Optional[Diagnostics] = None) \
+            -> typing.List[Instruction]:
+        """Parses assembly lines, skipping comments and empty lines.
 
+        Args:
+            lines (typing.Iterable[str]): the lines of the program.
+            diagnostics (typing.Optional[Diagnostics]): see iterate_lines.
 
-    def remove_comments_and_empty_lines(self, lines):
-        lines_without_comments_and_empty = []
-
-        for line in lines:
-            # Remove the comment part of the line
-            if '//' in line:
-                line = line[:line.index('//')]
+        Returns:
+            typing.List[Instruction]: the parsed commands.
+        """
+        return list(cls.iterate_lines(lines, diagnostics))
 
-            # Remove leading and trailing whitespaces
-            line = line.strip()
+    @classmethod
+    def iterate_lines(cls, lines: typing.Iterable[str],
+                      diagnostics: typing.Optional[Diagnostics] = None) \
+            -> typing.Iterator[Instruction]:
+        """Lazily parses assembly lines, skipping comments and empty lines,
+        so that a file object can be parsed without reading all of it.
 
-            # Only add non-empty lines to the result
-            if line:
-                lines_without_comments_and_empty.append(line)
+        Args:
+            lines (typing.Iterable[str]): the lines of the program.
+            diagnostics (typing.Optional[Diagnostics]): if given, lines with
+                syntax errors are recorded in it and skipped, instead of
+                raising an AssemblerError.
 
-        return lines_without_comments_and_empty
+        Yields:
+            Instruction: the parsed commands.
+        """
+        for line_number, line in enumerate(lines, 1):
+            try:
+                instruction = cls.parse_line(line, line_number)
+            except AssemblerError as error:
+                if diagnostics is None:
+                    raise
+                diagnostics.add(error)
+                continue
+            if instruction is not None:
+                yield instruction
+
+    @classmethod
+    def parse_line(cls, line: str, line_number: int = 0) \
+            -> typing.Optional[Instruction]:
+        """Parses a single line of assembly.
 
-    def remove_spaces_and_comments(self, line):
-        # Remove spaces
-        line_without_spaces = line.replace(" ", "")
+        Args:
+            line (str): the line to parse.
+            line_number (int): the number of the line in the input.
 
-        # Remove comments (everything after '//')
-        line_without_comments = re.sub(r'//.*', '', line_without_spaces)
+        Returns:
+            typing.Optional[Instruction]: the command in the line, or None
+            if the line has no command.
 
-        return line_without_comments
+        Raises:
+            AssemblerError: for a malformed label, or a constant that does
+            not fit in an A-command. Bad mnemonics are found by the encoder.
+        """
+        # Remove the comment part of the line
+        comment_start = line.find(cls.COMMENT)
+        if comment_start != -1:
+            line = line[:comment_start]
+
+        # Remove all white space
+        command = "".join(line.split())
+        if command == cls.EMPTY_LINE:
+            return None
+
+        if command[0] == cls.A_COMMAND_PREFIX:
+            symbol = command[1:]
+            value = None
+            if symbol.isdigit():
+                value = int(symbol)
+                if value > cls.MAX_CONSTANT:
+                    raise AssemblerError(
+                        line_number, f"constant {symbol} is larger than "
+                                     f"{cls.MAX_CONSTANT}", symbol)
+            elif not symbol:
+                raise AssemblerError(line_number, "missing symbol after @",
+                                     command)
+            return Instruction(cls.A_COMMAND, symbol=symbol, value=value,
+                               line_number=line_number)
+
+        if command[0] == cls.L_COMMAND_PREFIX:
+            if command[-1] != cls.L_COMMAND_SUFFIX or len(command) == 2:
+                raise AssemblerError(
+                    line_number, f"malformed label {command}", command)
+            return Instruction(cls.L_COMMAND, symbol=command[1:-1],
+                               line_number=line_number)
+
+        # dest=comp;jump, where dest and jump are optional:
+        dest, equals, comp_and_jump = command.partition("=")
+        if not equals:
+            dest, comp_and_jump = None, command
+        comp, semicolon, jump = comp_and_jump.partition(";")
+        return Instruction(cls.C_COMMAND, dest=dest, comp=comp,
+                           jump=jump if semicolon else None,
+                           line_number=line_number)
 
     def has_more_commands(self) -> bool:
         """Are there more commands in the input?
@@ -79,7 +202,7 @@ class Parser:
             bool: True if there are more commands, False otherwise.
         """
 
-        return self.current_command_index < len(self.input_lines)
+        return self.current_command_index < len(self.instructions)
 
     def advance(self) -> None:
         """Reads the next command from the input and makes it the current command.
@@ -87,11 +210,8 @@ class Parser:
         """
         self.current_command_index += 1
         if self.has_more_commands():
-
-            self.current_command = self.input_lines[self.current_command_index]
-
-
-        return
+            self.current_command = \
+                self.instructions[self.current_command_index]
 
     def command_type(self) -> str:
         """
@@ -101,21 +221,7 @@ class Parser:
             "C_COMMAND" for dest=comp;jump
             "L_COMMAND" (actually, pseudo-command) for (Xxx) where Xxx is a symbol
         """
-        self.current_command = self.remove_spaces_and_comments(self.current_command)
-        if self.current_command == self.EMPTY_LINE:
-            return "Comment"
-
-        elif self.current_command[0] == self.A_COMMAND_PREFIX:
-            return "A_COMMAND"
-
-        elif self.current_command[0] == self.L_COMMAND_PREFIX:
-            return "L_COMMAND"
-
-        elif self.current_command[0] == "/":
-            return "Comment"
-
-        else:
-            return "C_COMMAND"
+        return self.current_command.kind
 
     def symbol(self) -> str:
         """
@@ -124,27 +230,7 @@ class Parser:
             (Xxx). Should be called only when command_type() is "A_COMMAND" or 
             "L_COMMAND".
         """
-        if self.command_type() == "A_COMMAND":
-            return self.current_command[1:]
-        elif self.command_type() == "L_COMMAND":
-            return self.current_command[1: -1]
-
-    def split_c_command(self) -> typing.List[str]:
-        """
-        This method is a helper method that splits the C_COMMAND
-        into dest, comp, jump.
-        """
-        if "=" in self.current_command:
-            parsed_commend = self.current_command.split("=")
-            self.is_jump = False
-            self.is_dest = True
-
-
-        elif ";" in self.current_command:
-            parsed_commend = self.current_command.split(";")
-            self.is_jump = True
-            self.is_dest = False
-        return parsed_commend
+        return self.current_command.symbol
 
     def dest(self) -> str:
         """
@@ -152,11 +238,7 @@ class Parser:
             str: the dest mnemonic in the current C-command. Should be called 
             only when commandType() is "C_COMMAND".
         """
-
-        self.current_command = self.remove_spaces_and_comments(self.current_command)
-        command_part_list = self.split_c_command()
-        if self.command_type() == "C_COMMAND" and self.is_dest:
-            return command_part_list[0]
+        return self.current_command.dest
 
     def comp(self) -> str:
         """
@@ -164,12 +246,7 @@ class Parser:
             str: the comp mnemonic in the current C-command. Should be called 
             only when commandType() is "C_COMMAND".
         """
-        self.current_command = self.remove_spaces_and_comments(self.current_command)
-        command_part_list = self.split_c_command()
-        if self.command_type() == "C_COMMAND" and not self.is_jump:
-            return command_part_list[1]
-        elif not self.is_dest and self.is_jump:
-            return command_part_list[0]
+        return self.current_command.comp
 
     def jump(self) -> str:
         """
@@ -177,7 +254,4 @@ class Parser:
             str: the jump mnemonic in the current C-command. Should be called 
             only when commandType() is "C_COMMAND".
         """
-        self.current_command = self.remove_spaces_and_comments(self.current_command)
-        command_part_list = self.split_c_command()
-        if self.command_type() == "C_COMMAND" and self.is_jump:
-            return command_part_list[1]
+        return self.current_command.jump
@@ -0,0 +1,254 @@
+"""
+A preprocessor for hand-written Hack assembly, with includes and macros.
+
+The preprocessor runs in front of the Parser, and its output is plain Hack
+assembly. The directives are:
+- #include "path": inserts another file, relative to the including file.
+  Every file is inserted at most once per program, so libraries can
+  include each other freely.
+- #macro NAME(param, ...) ... #end: defines a macro. Inside its body, every
+  symbol that is a parameter is replaced by the argument, and %% is replaced
+  by a suffix that is unique to the expansion, for local labels.
+- NAME(arg, ...) on a line of its own: expands a macro. The body may use
+  other macros.
+For example:
+    #macro ADD_TO(target, value)
+    @value
+    D=A
+    @target
+    M=D+M
+    #end
+    ADD_TO(R0, 5)
+
+Macros that are defined in an included file can be used after the #include.
+The expansion of every file is cached by the hash of its contents and of
+the files that it includes, so a library that many programs include is
+expanded once per Preprocessor.
+"""
+import hashlib
+import os
+import re
+import typing
+from Diagnostics import SYMBOL
+
+INCLUDE_DIRECTIVE = re.compile(r'#include\s+"([^"]+)"\s*(//.*)?$')
+MACRO_DIRECTIVE = re.compile(
+    r"#macro\s+([A-Za-z_][\w]*)\s*\(([^)]*)\)\s*(//.*)?$")
+END_DIRECTIVE = re.compile(r"#end\s*(//.*)?$")
+MACRO_CALL = re.compile(r"([A-Za-z_][\w]*)\s*\(([^)]*)\)\s*(//.*)?$")
+UNIQUE_MARKER = "%%"
+MAX_MACRO_DEPTH = 64
+
+# the file and the line number that a line of the output came from:
+Origin = typing.Tuple[str, int]
+
+
+class PreprocessorError(ValueError):
+    """An error in a directive or a macro call, with its location."""
+
+    def __init__(self, path: str, line_number: int, message: str) -> None:
+        super().__init__(f"{path}:{line_number}: {message}")
+
+
+class Macro:
+    """A macro definition."""
+
+    __slots__ = ("name", "parameters", "body", "path", "line_number")
+
+    def __init__(self, name: str, parameters: typing.List[str],
+                 body: typing.List[str], path: str,
+                 line_number: int) -> None:
+        self.name = name
+        self.parameters = parameters
+        self.body = body
+        self.path = path
+        self.line_number = line_number
+
+
+class Expansion:
+    """The expansion of a single file: its lines after macro expansion, the
+    files that it includes, and the macros that it makes available.
+
+    items holds (line, line number) pairs and, in place of every #include,
+    the Expansion of the included file, so that includes are inserted once
+    per program when the expansions are flattened.
+    """
+
+    __slots__ = ("path", "key", "items", "macros")
+
+    def __init__(self, path: str, key: bytes) -> None:
+        self.path = path
+        self.key = key
+        self.items = []
+        self.macros = {}
+
+
+def _split_arguments(arguments: str) -> typing.List[str]:
+    return [argument.strip() for argument in arguments.split(",")] \
+        if arguments.strip() else []
+
+
+class Preprocessor:
+    """Expands includes and macros, caching the expansion of every file."""
+
+    def __init__(self) -> None:
+        """Creates a preprocessor with an empty cache."""
+        # maps the key of a file to its expansion:
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def expand_path(self, path: str) \
+            -> typing.Tuple[typing.List[str], typing.List[Origin]]:
+        """Preprocesses a file and all the files it includes.
+
+        Args:
+            path (str): path of the file.
+
+        Returns:
+            typing.Tuple[typing.List[str], typing.List[Origin]]: the lines of
+            the program, ready for the Parser, and the file and line number
+            that every line came from.
+        """
+        lines = []
+        origins = []
+        self._flatten(self._expand_file(os.path.abspath(path), ()),
+                      set(), lines, origins)
+        return lines, origins
+
+    def _flatten(self, expansion: Expansion, included: typing.Set[str],
+                 lines: typing.List[str],
+                 origins: typing.List[Origin]) -> None:
+        included.add(expansion.path)
+        for item in expansion.items:
+            if isinstance(item, Expansion):
+                if item.path not in included:
+                    self._flatten(item, included, lines, origins)
+            else:
+                line, line_number = item
+                lines.append(line)
+                origins.append((expansion.path, line_number))
+
+    def _expand_file(self, path: str,
+                     including: typing.Tuple[str, ...]) -> Expansion:
+        with open(path, 'r') as input_file:
+            source = input_file.read()
+        lines = source.splitlines()
+
+        # the key covers the path, as includes are relative to it, and the
+        # included files, so that a change in any of them invalidates the
+        # expansion:
+        included = {}
+        digest = hashlib.sha256(path.encode() + b"\0" + source.encode())
+        for line_number, line in enumerate(lines, 1):
+            match = INCLUDE_DIRECTIVE.match(line.strip())
+            if match is None:
+                continue
+            included_path = self._included_path(path, match.group(1))
+            if included_path == path or included_path in including:
+                raise PreprocessorError(
+                    path, line_number,
+                    f"{match.group(1)} is included recursively")
+            if not os.path.isfile(included_path):
+                raise PreprocessorError(
+                    path, line_number, f"cannot include {match.group(1)}")
+            expansion = self._expand_file(included_path, including + (path,))
+            included[included_path] = expansion
+            digest.update(expansion.key)
+        key = digest.digest()
+
+        expansion = self.cache.get(key)
+        if expansion is not None:
+            self.hits += 1
+            return expansion
+        self.misses += 1
+        expansion = Expansion(path, key)
+        self._expand_lines(expansion, lines, included)
+        self.cache[key] = expansion
+        return expansion
+
+    @staticmethod
+    def _included_path(path: str, include: str) -> str:
+        return os.path.normpath(os.path.join(os.path.dirname(path), include))
+
+    def _expand_lines(self, expansion: Expansion, lines: typing.List[str],
+                      included: typing.Dict[str, Expansion]) -> None:
+        path = expansion.path
+        macros = expansion.macros
+        # local labels of macros get this prefix, which is unique to the
+        # file, and a counter:
+        label_prefix = expansion.key.hex()[:8]
+        expansions = 0
+        macro = None
+        for line_number, line in enumerate(lines, 1):
+            stripped = line.strip()
+            if macro is not None:
+                if END_DIRECTIVE.match(stripped):
+                    macros[macro.name] = macro
+                    macro = None
+                else:
+                    macro.body.append(line)
+                continue
+            if not stripped.startswith("#"):
+                match = MACRO_CALL.match(stripped)
+                if match is None or match.group(1) not in macros:
+                    expansion.items.append((line, line_number))
+                    continue
+                expansions = self._expand_call(
+                    macros, match.group(1), _split_arguments(match.group(2)),
+                    f"_{label_prefix}_", expansions, expansion.items, path,
+                    line_number, 0)
+                continue
+
+            match = INCLUDE_DIRECTIVE.match(stripped)
+            if match is not None:
+                included_expansion = included[
+                    self._included_path(path, match.group(1))]
+                expansion.items.append(included_expansion)
+                macros.update(included_expansion.macros)
+                continue
+            match = MACRO_DIRECTIVE.match(stripped)
+            if match is not None:
+                macro = Macro(match.group(1),
+                              _split_arguments(match.group(2)), [], path,
+                              line_number)
+                continue
+            raise PreprocessorError(path, line_number,
+                                    f"unknown directive {stripped}")
+        if macro is not None:
+            raise PreprocessorError(path, macro.line_number,
+                                    f"macro {macro.name} has no #end")
+
+    def _expand_call(self, macros: typing.Dict[str, Macro], name: str,
+                     arguments: typing.List[str], label_prefix: str,
+                     expansions: int,
+                     items: typing.List[typing.Tuple[str, int]], path: str,
+                     line_number: int, depth: int) -> int:
+        macro = macros[name]
+        if len(arguments) != len(macro.parameters):
+            raise PreprocessorError(
+                path, line_number,
+                f"macro {name} takes {len(macro.parameters)} arguments, "
+                f"got {len(arguments)}")
+        if depth == MAX_MACRO_DEPTH:
+            raise PreprocessorError(
+                path, line_number, f"macro {name} is nested too deeply")
+        substitutions = dict(zip(macro.parameters, arguments))
+        unique = f"{label_prefix}{expansions}"
+        expansions += 1
+
+        def substitute(symbol: typing.Match) -> str:
+            return substitutions.get(symbol.group(0), symbol.group(0))
+
+        for line in macro.body:
+            code = line.partition("//")[0]
+            code = SYMBOL.sub(substitute, code).replace(UNIQUE_MARKER, unique)
+            match = MACRO_CALL.match(code.strip())
+            if match is not None and match.group(1) in macros:
+                expansions = self._expand_call(
+                    macros, match.group(1), _split_arguments(match.group(2)),
+                    label_prefix, expansions, items, path, line_number,
+                    depth + 1)
+            else:
+                items.append((code, line_number))
+        return expansions
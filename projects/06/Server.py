@@ -0,0 +1,190 @@
+"""
+A resident assembler, serving requests over a Unix domain socket.
+
+Starting the interpreter and importing the assembler takes far longer than
+assembling a typical file, so editors and build scripts can keep a server
+running (python3 Main.py --serve) and send it requests with Client.py.
+The encoding tables stay loaded, and the output of recently assembled
+sources is kept in an LRU cache keyed by their content.
+
+The protocol is one JSON object per line in each direction, and a
+connection may send any number of requests. A request is one of:
+    {"command": "assemble", "source": <assembly text>}
+    {"command": "assemble", "path": <absolute path of an .asm file>}
+    {"command": "stats"}
+    {"command": "shutdown"}
+An assemble request may also have "format" ("text" or "binary") and
+"optimize" (a bool). Every response has "ok", and either "error" or the
+result: "hack" holds the .hack payload (base64 for the binary format),
+"cached" tells whether it came from the cache.
+"""
+import base64
+import collections
+import errno
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+import typing
+import HackFile
+import Library
+
+DEFAULT_CACHE_ENTRIES = 256
+
+
+class AssemblerServer(socketserver.ThreadingMixIn,
+                      socketserver.UnixStreamServer):
+    """Serves assemble requests, caching the results of recent sources."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str,
+                 cache_entries: int = DEFAULT_CACHE_ENTRIES) -> None:
+        """Binds the server to a socket, replacing a stale socket file.
+
+        Args:
+            socket_path (str): path of the Unix domain socket.
+            cache_entries (int): the number of results to keep.
+
+        Raises:
+            OSError: if another server answers on the socket, or the path
+                exists and is not a socket.
+        """
+        if os.path.exists(socket_path):
+            _remove_stale_socket(socket_path)
+        super().__init__(socket_path, _RequestHandler)
+        self.socket_path = socket_path
+        self.cache_entries = cache_entries
+        self.cache = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.hits = 0
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def assemble(self, source: bytes, output_format: str,
+                 optimize: bool) -> typing.Tuple[str, bool]:
+        """Assembles a source, or returns its cached output.
+
+        Args:
+            source (bytes): the program.
+            output_format (str): the format of the .hack payload.
+            optimize (bool): optimize the program.
+
+        Returns:
+            typing.Tuple[str, bool]: the .hack payload (base64 for the
+            binary format) and whether it came from the cache.
+        """
+        key = hashlib.sha256(
+            f"{output_format}\0{optimize}\0".encode() + source).digest()
+        with self.lock:
+            self.requests += 1
+            payload = self.cache.get(key)
+            if payload is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return payload, True
+
+        words, _ = Library.assemble(source, optimize)
+        if output_format == HackFile.BINARY_FORMAT:
+            payload = base64.b64encode(
+                Library.to_hack_binary(words)).decode("ascii")
+        else:
+            payload = Library.to_hack_text(words)
+
+        with self.lock:
+            self.cache[key] = payload
+            while len(self.cache) > self.cache_entries:
+                self.cache.popitem(last=False)
+        return payload, False
+
+    def statistics(self) -> typing.Dict[str, int]:
+        """
+        Returns:
+            typing.Dict[str, int]: the number of assemble requests, cache
+            hits and cached results.
+        """
+        with self.lock:
+            return {"requests": self.requests, "hits": self.hits,
+                    "entries": len(self.cache)}
+
+
+def _remove_stale_socket(socket_path: str) -> None:
+    # a server that did not shut down cleanly leaves its socket file behind,
+    # but the socket of a server that still answers must be kept:
+    if not stat.S_ISSOCK(os.stat(socket_path).st_mode):
+        raise FileExistsError(errno.EEXIST, "not a socket", socket_path)
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except ConnectionRefusedError:
+        os.unlink(socket_path)
+    else:
+        raise OSError(errno.EADDRINUSE,
+                      "another assembler server is running", socket_path)
+    finally:
+        probe.close()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                response = self.respond(json.loads(line))
+            except Exception as exception:
+                response = {"ok": False,
+                            "error": f"{type(exception).__name__}: "
+                                     f"{exception}"}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+            if response.get("shutdown"):
+                # shutdown() waits for serve_forever, so it cannot be called
+                # from the thread that serves this request:
+                threading.Thread(target=self.server.shutdown).start()
+                return
+
+    def respond(self, request: typing.Dict[str, typing.Any]) \
+            -> typing.Dict[str, typing.Any]:
+        command = request.get("command", "assemble")
+        if command == "stats":
+            return {"ok": True, **self.server.statistics()}
+        if command == "shutdown":
+            return {"ok": True, "shutdown": True}
+        if command != "assemble":
+            raise ValueError(f"unknown command {command!r}")
+
+        output_format = request.get("format", HackFile.TEXT_FORMAT)
+        if output_format not in HackFile.FORMATS:
+            raise ValueError(f"unknown format {output_format!r}")
+        if "source" in request:
+            source = request["source"].encode("ascii")
+        elif "path" in request:
+            with open(request["path"], 'rb') as input_file:
+                source = input_file.read()
+        else:
+            raise ValueError("an assemble request needs a source or a path")
+        payload, cached = self.server.assemble(
+            source, output_format, bool(request.get("optimize", False)))
+        return {"ok": True, "hack": payload, "cached": cached}
+
+
+def serve(socket_path: str,
+          cache_entries: int = DEFAULT_CACHE_ENTRIES) -> None:
+    """Runs a server until it gets a shutdown request or is interrupted.
+
+    Args:
+        socket_path (str): path of the Unix domain socket.
+        cache_entries (int): the number of results to keep.
+    """
+    with AssemblerServer(socket_path, cache_entries) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,219 @@
+"""
+Maps ROM addresses back to the assembly source, for profilers and debuggers.
+
+A source map is recorded by the assembler in the pass that defines the
+labels, or by passing the commands through SourceMap.track. It holds, for
+every ROM address, the source line that produced the word, and the labels
+and VM function that it belongs to. For a preprocessed program, the lines
+are then replaced by the file and line that they came from, see
+resolve_origins.
+Labels and functions are stored as sorted (start address, name) ranges,
+since consecutive words share them, so the map stays compact. Labels that
+immediately follow each other start at the same address, so a label range
+has the list of all of them.
+
+The JSON format of a source map is:
+    {"version": 1, "lines": [<source line of address 0>, ...],
+     "labels": [[<start address>, [<label>, ...]], ...],
+     "functions": [[<start address>, <function>], ...]}
+and for a preprocessed program also:
+     "files": [<index in paths of the file of address 0>, ...],
+     "paths": [<path of a file>, ...]
+"""
+import array
+import bisect
+import json
+import os
+import re
+import typing
+from Parser import Parser, Instruction
+
+SOURCE_MAP_VERSION = 1
+
+# labels of VM functions look like Class.function, while labels inside
+# functions and labels generated by the translator contain a $ or &, or no
+# dot at all:
+FUNCTION_LABEL = re.compile(r"[A-Za-z_][\w]*\.[\w.]+")
+
+
+class SourceMap:
+    """A map from ROM addresses to source lines, labels and functions."""
+
+    def __init__(self) -> None:
+        """Creates an empty source map."""
+        self.lines = array.array("L")
+        self.labels = []
+        self.functions = []
+        # for a preprocessed program, the file of every address as an index
+        # into paths, and the origins that resolve_origins was given:
+        self.files = None
+        self.paths = []
+        self.origins = None
+
+    def track(self, instructions: typing.Iterable[Instruction]) \
+            -> typing.Iterator[Instruction]:
+        """Records the commands while they are passed on to the encoder.
+
+        Args:
+            instructions (typing.Iterable[Instruction]): the parsed commands,
+                in program order.
+
+        Yields:
+            Instruction: the same commands.
+        """
+        lines = self.lines
+        for instruction in instructions:
+            if instruction.kind == Parser.L_COMMAND:
+                self.mark_label(instruction.symbol, len(lines))
+            else:
+                lines.append(instruction.line_number)
+            yield instruction
+
+    def mark_label(self, label: str, address: int) -> None:
+        """Records that a label starts at an address.
+
+        Args:
+            label (str): the label.
+            address (int): the ROM address of the label.
+        """
+        # a label that is immediately followed by another one has no words,
+        # so both start at the same address:
+        if self.labels and self.labels[-1][0] == address:
+            self.labels[-1][1].append(label)
+        else:
+            self.labels.append((address, [label]))
+        if FUNCTION_LABEL.fullmatch(label):
+            if self.functions and self.functions[-1][0] == address:
+                self.functions[-1] = (address, label)
+            else:
+                self.functions.append((address, label))
+
+    def resolve_origins(self, origins: typing.List[typing.Tuple[str, int]]) \
+            -> None:
+        """Replaces the lines of a preprocessed program, once all of them
+        were recorded, with the file and line that they came from.
+
+        Args:
+            origins (typing.List[typing.Tuple[str, int]]): the file and line
+                that every line of the program came from, as given by the
+                Preprocessor.
+        """
+        path_indices = {}
+        lines = self.lines
+        self.files = array.array("H")
+        for address, line_number in enumerate(lines):
+            path, lines[address] = origins[line_number - 1]
+            self.files.append(
+                path_indices.setdefault(path, len(path_indices)))
+        self.paths = list(path_indices)
+        self.origins = origins
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    @staticmethod
+    def _range_name(ranges: typing.List[typing.Tuple[int, typing.Any]],
+                    address: int) -> typing.Any:
+        # (address + 1,) sorts before every range that starts after the
+        # address, and after all the others, without comparing the names
+        # (bisect has no key before Python 3.10):
+        index = bisect.bisect_left(ranges, (address + 1,)) - 1
+        return ranges[index][1] if index >= 0 else None
+
+    def lookup(self, address: int) \
+            -> typing.Tuple[typing.Optional[str], int, typing.List[str],
+                            typing.Optional[str]]:
+        """
+        Args:
+            address (int): a ROM address.
+
+        Returns:
+            typing.Tuple[typing.Optional[str], int, typing.List[str],
+            typing.Optional[str]]: the file of the word at the address (None
+            if the program was not preprocessed, as it is then the file that
+            was assembled), its source line in that file, the labels that it
+            belongs to (empty if it is before the first one), and the
+            function that it belongs to (None if it is before the first
+            one).
+        """
+        path = None if self.files is None else self.paths[self.files[address]]
+        return path, self.lines[address], \
+            list(self._range_name(self.labels, address) or ()), \
+            self._range_name(self.functions, address)
+
+    def write(self, output_file: typing.TextIO) -> None:
+        """Writes the source map as JSON.
+
+        Args:
+            output_file (typing.TextIO): writes the map to this file.
+        """
+        # json.dumps uses the C encoder, while json.dump encodes in chunks
+        # and is several times slower for long maps:
+        data = {"version": SOURCE_MAP_VERSION, "lines": self.lines.tolist(),
+                "labels": self.labels, "functions": self.functions}
+        if self.files is not None:
+            data["files"] = self.files.tolist()
+            data["paths"] = self.paths
+        output_file.write(json.dumps(data, separators=(",", ":")) + "\n")
+
+    @staticmethod
+    def read(input_file: typing.TextIO) -> "SourceMap":
+        """Reads a source map that was written by write().
+
+        Args:
+            input_file (typing.TextIO): the JSON file.
+
+        Returns:
+            SourceMap: the source map.
+        """
+        data = json.load(input_file)
+        if data.get("version") != SOURCE_MAP_VERSION:
+            raise ValueError(
+                f"unsupported source map version {data.get('version')}")
+        source_map = SourceMap()
+        source_map.lines = array.array("L", data["lines"])
+        source_map.labels = [(address, labels)
+                             for address, labels in data["labels"]]
+        source_map.functions = [tuple(function)
+                                for function in data["functions"]]
+        if "files" in data:
+            source_map.files = array.array("H", data["files"])
+            source_map.paths = data["paths"]
+        return source_map
+
+    def write_listing(self, instructions: typing.Iterable[Instruction],
+                      words: typing.Sequence[int],
+                      output_file: typing.TextIO) -> None:
+        """Writes a human-readable listing, with a row per ROM word that
+        shows its address, its machine word, its source line and its
+        command, and a row per label. For a preprocessed program, the source
+        lines are shown with the name of their file.
+
+        Args:
+            instructions (typing.Iterable[Instruction]): the commands that
+                were encoded, in program order.
+            words (typing.Sequence[int]): the machine words.
+            output_file (typing.TextIO): writes the listing to this file.
+        """
+        def source_line(path: typing.Optional[str], line_number: int) -> str:
+            if path is None:
+                return f"{line_number:>6}"
+            return f"{os.path.basename(path)}:{line_number}"
+
+        rows = []
+        address = 0
+        for instruction in instructions:
+            if instruction.kind == Parser.L_COMMAND:
+                path, line_number = None, instruction.line_number
+                if self.origins is not None:
+                    path, line_number = self.origins[line_number - 1]
+                rows.append(f"{'':>5}  {'':16}  "
+                            f"{source_line(path, line_number)}  {instruction}")
+            else:
+                path = None if self.files is None \
+                    else self.paths[self.files[address]]
+                rows.append(f"{address:>5}  {words[address]:016b}  "
+                            f"{source_line(path, self.lines[address])}      "
+                            f"{instruction}")
+                address += 1
+        output_file.write("".join(row + "\n" for row in rows))
@@ -0,0 +1,185 @@
+"""
+Counters and per-phase timings of the assembler.
+
+When the assembler is given an AssemblyStatistics, it counts the lines that
+it read, the comments that it stripped, the A- and C-commands that it
+encoded and the labels and variables that it allocated, and it measures the
+wall-clock time of every phase (preprocess, parse, optimize, first pass,
+second pass, write). Without one, none of this is done, so assembling
+costs the same as before.
+
+Programs follow the assembler with a StatisticsListener, which is told about
+every phase as it ends and about every file once it is done. Main.py's
+--stats flag writes the statistics of all the files as JSON.
+"""
+import array
+import contextlib
+import json
+import time
+import typing
+from Code import C_COMMAND_BIT
+
+
+class StatisticsListener:
+    """Receives the statistics of the assembler while it runs. The methods
+    do nothing, so a subclass overrides only the ones it needs.
+    """
+
+    def phase_finished(self, statistics: "AssemblyStatistics", phase: str,
+                       seconds: float) -> None:
+        """Called whenever a phase of a file ends.
+
+        Args:
+            statistics (AssemblyStatistics): the statistics of the file.
+            phase (str): the name of the phase.
+            seconds (float): the time the phase took.
+        """
+
+    def file_finished(self, statistics: "AssemblyStatistics") -> None:
+        """Called once a file is assembled, with its final statistics.
+
+        Args:
+            statistics (AssemblyStatistics): the statistics of the file.
+        """
+
+
+class AssemblyStatistics:
+    """The counters and phase timings of assembling a single file."""
+
+    def __init__(self, path: str = "",
+                 listener: typing.Optional[StatisticsListener] = None) \
+            -> None:
+        """Creates zeroed statistics.
+
+        Args:
+            path (str): the file that is assembled.
+            listener (typing.Optional[StatisticsListener]): if given, it is
+                told about every phase and about the end of the file.
+        """
+        self.path = path
+        self.listener = listener
+        self.lines = 0
+        self.comments = 0
+        self.a_commands = 0
+        self.c_commands = 0
+        self.labels = 0
+        self.variables = 0
+        self.cached = False
+        # maps every phase to its time in seconds, in the order they ran:
+        self.timings = {}
+        self.total = 0.0
+
+    def __getstate__(self) -> typing.Dict[str, typing.Any]:
+        # the listener stays in the process that created it, so statistics
+        # can be returned by the worker processes of --jobs:
+        state = dict(self.__dict__)
+        state["listener"] = None
+        return state
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> typing.Iterator[None]:
+        """Times a phase, adding to its time if it runs more than once.
+
+        Args:
+            name (str): the name of the phase.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+            if self.listener is not None:
+                self.listener.phase_finished(self, name, seconds)
+
+    def count_lines(self, lines: typing.Iterable[str]) \
+            -> typing.Iterator[str]:
+        """Counts lines, and the lines with comments, as they are read.
+
+        Args:
+            lines (typing.Iterable[str]): the lines of the program.
+
+        Yields:
+            str: the same lines.
+        """
+        for line in lines:
+            self.lines += 1
+            if "//" in line:
+                self.comments += 1
+            yield line
+
+    def count_words(self, words: array.array) -> None:
+        """Counts the A- and C-commands among machine words.
+
+        Args:
+            words (array.array): machine words, of a program or a part of it.
+        """
+        c_commands = sum(map(C_COMMAND_BIT.__le__, words))
+        self.c_commands += c_commands
+        self.a_commands += len(words) - c_commands
+
+    def count_symbols(self, labels: int, variables: int) -> None:
+        """Records the number of labels and variables of the program.
+
+        Args:
+            labels (int): the number of labels.
+            variables (int): the number of allocated variables.
+        """
+        self.labels = labels
+        self.variables = variables
+
+    def finish(self, total: float) -> None:
+        """Records the total time, and tells the listener that the file is
+        done.
+
+        Args:
+            total (float): the time it took to assemble the file, in seconds.
+        """
+        self.total = total
+        if self.listener is not None:
+            self.listener.file_finished(self)
+
+    def as_dict(self) -> typing.Dict[str, typing.Any]:
+        """
+        Returns:
+            typing.Dict[str, typing.Any]: the statistics, in a form that can
+            be serialized as JSON.
+        """
+        return {"path": self.path, "cached": self.cached,
+                "counters": {"lines": self.lines, "comments": self.comments,
+                             "a_commands": self.a_commands,
+                             "c_commands": self.c_commands,
+                             "labels": self.labels,
+                             "variables": self.variables},
+                "timings": dict(self.timings), "total": self.total}
+
+
+def timed_phase(statistics: typing.Optional[AssemblyStatistics],
+                name: str) -> typing.ContextManager:
+    """
+    Args:
+        statistics (typing.Optional[AssemblyStatistics]): the statistics to
+            record the phase in, if any.
+        name (str): the name of the phase.
+
+    Returns:
+        typing.ContextManager: times the phase, or does nothing without
+        statistics.
+    """
+    if statistics is None:
+        return contextlib.nullcontext()
+    return statistics.phase(name)
+
+
+def write_statistics(statistics: typing.Iterable[AssemblyStatistics],
+                     output_file: typing.TextIO) -> None:
+    """Writes the statistics of several files as a JSON list.
+
+    Args:
+        statistics (typing.Iterable[AssemblyStatistics]): the statistics.
+        output_file (typing.TextIO): writes the JSON to this file.
+    """
+    output_file.write(json.dumps(
+        [file_statistics.as_dict() for file_statistics in statistics],
+        indent=1))
+    output_file.write("\n")
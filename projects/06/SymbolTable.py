@@ -5,12 +5,38 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import json
+import sys
+import typing
+
+# the predefined symbols and their addresses, see section 6.2.3 of the book:
+PREDEFINED_SYMBOLS = {
+    "R0": 0, "R1": 1, "R2": 2, "R3": 3, "R4": 4, "R5": 5, "R6": 6, "R7": 7,
+    "R8": 8, "R9": 9, "R10": 10, "R11": 11, "R12": 12, "R13": 13, "R14": 14,
+    "R15": 15, "SCREEN": 16384, "KBD": 24576, "SP": 0, "LCL": 1, "ARG": 2,
+    "THIS": 3, "THAT": 4}
+
+# variables are allocated from VARIABLES_START up to (not including) SCREEN:
+VARIABLES_START = 16
+VARIABLES_END = PREDEFINED_SYMBOLS["SCREEN"]
+# labels are ROM addresses, which an A-instruction holds in 15 bits:
+ROM_SIZE = 32768
+
+
+class SymbolError(ValueError):
+    """Raised for a duplicate label, a label beyond the ROM, or when
+    variables run out of RAM."""
 
 
 class SymbolTable:
     """
     A symbol table that keeps a correspondence between symbolic labels and 
     numeric addresses.
+
+    Labels and variables are kept in separate namespaces (labels and
+    variables), and table maps every known symbol, including the predefined
+    ones, to its address. Symbol names are interned, as every symbol is
+    looked up many times.
     """
 
     def __init__(self) -> None:
@@ -18,13 +44,11 @@ class SymbolTable:
         and their pre-allocated RAM addresses, according to section 6.2.3 of the
         book.
         """
-        self.table = {"R0": 0, "R1": 1, "R2": 2, "R3": 3, "R4": 4, "R5": 5,
-                      "R6": 6, "R7": 7, "R8": 8, "R9": 9, "R10": 10, "R11": 11,
-                      "R12": 12, "R13": 13, "R14": 14, "R15": 15, "SCREEN": 16384,
-                      "KBD": 24576, "SP": 0, "LCL": 1, "ARG": 2, "THIS": 3, "THAT": 4
-                      }
+        self.table = dict(PREDEFINED_SYMBOLS)
+        self.labels = {}
+        self.variables = {}
 
-        self.symbol_index = 16
+        self.symbol_index = VARIABLES_START
 
     def add_entry(self, symbol: str, address: int) -> None:
         """Adds the pair (symbol, address) to the table.
@@ -33,7 +57,55 @@ class SymbolTable:
             symbol (str): the symbol to add.
             address (int): the address corresponding to the symbol.
         """
-        self.table[symbol] = address
+        self.table[sys.intern(symbol)] = address
+
+    def add_label(self, label: str, address: int) -> None:
+        """Adds a label, which must not be defined already.
+
+        Args:
+            label (str): the label to add.
+            address (int): the ROM address of the label.
+
+        Raises:
+            SymbolError: if the label is already defined, is a predefined
+            symbol, or is beyond the ROM.
+        """
+        if label in self.labels:
+            raise SymbolError(
+                f"duplicate label ({label}), already defined at ROM address "
+                f"{self.labels[label]}")
+        if label in PREDEFINED_SYMBOLS:
+            raise SymbolError(f"label ({label}) is a predefined symbol")
+        if address >= ROM_SIZE:
+            raise SymbolError(
+                f"program too large for ROM: label ({label}) is at address "
+                f"{address}, the ROM has {ROM_SIZE} words")
+        label = sys.intern(label)
+        self.labels[label] = address
+        self.table[label] = address
+
+    def add_variable(self, variable: str) -> int:
+        """Allocates the next free RAM address to a new variable.
+
+        Args:
+            variable (str): the variable to add.
+
+        Returns:
+            int: the RAM address of the variable.
+
+        Raises:
+            SymbolError: if there are no free addresses below SCREEN.
+        """
+        address = self.symbol_index
+        if address >= VARIABLES_END:
+            raise SymbolError(
+                f"no RAM left for variable {variable}, "
+                f"{VARIABLES_END - VARIABLES_START} variables are allocated")
+        variable = sys.intern(variable)
+        self.variables[variable] = address
+        self.table[variable] = address
+        self.symbol_index += 1
+        return address
 
     def contains(self, symbol: str) -> bool:
         """Does the symbol table contain the given symbol?
@@ -44,9 +116,7 @@ class SymbolTable:
         Returns:
             bool: True if the symbol is contained, False otherwise.
         """
-
-        symbol_lst = self.table.keys()
-        return symbol in symbol_lst
+        return symbol in self.table
 
     def get_address(self, symbol: str) -> int:
         """Returns the address associated with the symbol.
@@ -57,5 +127,39 @@ class SymbolTable:
         Returns:
             int: the address associated with the symbol.
         """
-        if self.contains(symbol):
-            return self.table[symbol]
+        return self.table.get(symbol)
+
+    def copy(self) -> "SymbolTable":
+        """Copies the symbol table without calling __init__, which is cheaper
+        than building a new one when many programs start from the same
+        symbols.
+
+        Returns:
+            SymbolTable: an independent copy of the symbol table.
+        """
+        symbol_table = SymbolTable.__new__(SymbolTable)
+        symbol_table.table = self.table.copy()
+        symbol_table.labels = self.labels.copy()
+        symbol_table.variables = self.variables.copy()
+        symbol_table.symbol_index = self.symbol_index
+        return symbol_table
+
+    def export_symbol_map(self) -> typing.Dict[str, typing.Dict[str, int]]:
+        """
+        Returns:
+            typing.Dict[str, typing.Dict[str, int]]: the labels (ROM
+            addresses), variables (RAM addresses) and predefined symbols,
+            in a form that can be serialized as JSON.
+        """
+        return {"labels": dict(self.labels),
+                "variables": dict(self.variables),
+                "predefined": dict(PREDEFINED_SYMBOLS)}
+
+    def write_symbol_map(self, output_file: typing.TextIO) -> None:
+        """Writes the symbol map (see export_symbol_map) as JSON.
+
+        Args:
+            output_file (typing.TextIO): writes the symbol map to this file.
+        """
+        json.dump(self.export_symbol_map(), output_file, indent=1)
+        output_file.write("\n")
@@ -0,0 +1,498 @@
+"""
+Tests the assembler in every mode on the bundled programs, comparing the
+output to the bundled .hack files.
+
+Usage: python3 -m unittest test_assembler (in this directory)
+
+Every test runs Main.py in a new process on copies of the programs in a
+temporary directory, as the assembler writes its output next to its input.
+"""
+import array
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+import unittest
+import HackFile
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+ASSEMBLER = os.path.join(TEST_DIRECTORY, "Main.py")
+# every bundled program, with the .hack file that it assembles to:
+PROGRAMS = {
+    "add/Add.asm": "add/Add.hack",
+    "max/Max.asm": "max/Max.hack",
+    "max/MaxL.asm": "max/Max.hack",
+    "rect/Rect.asm": "rect/Rect.hack",
+    "rect/RectL.asm": "rect/Rect.hack",
+    "pong/Pong.asm": "pong/Pong.hack",
+    "pong/PongL.asm": "pong/Pong.hack",
+    "shift/Shift.asm": "shift/Shift.hack",
+}
+
+
+def read_golden(path: str) -> typing.List[int]:
+    """
+    Args:
+        path (str): path of a bundled .hack file, relative to this directory.
+
+    Returns:
+        typing.List[int]: its machine words.
+    """
+    with open(os.path.join(TEST_DIRECTORY, path), 'r') as golden_file:
+        return [int(line, 2) for line in golden_file.read().split()]
+
+
+class AssemblerTestCase(unittest.TestCase):
+    """Runs the assembler on copies of the bundled programs."""
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def copy(self, path: str) -> str:
+        """Copies a bundled program into the temporary directory.
+
+        Args:
+            path (str): path of the .asm file, relative to this directory.
+
+        Returns:
+            str: path of the copy.
+        """
+        copy_path = os.path.join(self.directory, path)
+        os.makedirs(os.path.dirname(copy_path), exist_ok=True)
+        shutil.copyfile(os.path.join(TEST_DIRECTORY, path), copy_path)
+        return copy_path
+
+    def write(self, name: str, source: str) -> str:
+        """Writes a program into the temporary directory.
+
+        Args:
+            name (str): the name of the .asm file.
+            source (str): the program.
+
+        Returns:
+            str: path of the file.
+        """
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as source_file:
+            source_file.write(source)
+        return path
+
+    def assemble(self, path: str, *options: str, status: int = 0) \
+            -> subprocess.CompletedProcess:
+        """Runs the assembler.
+
+        Args:
+            path (str): the input of the assembler.
+            options (str): its command line options.
+            status (int): the expected exit status.
+
+        Returns:
+            subprocess.CompletedProcess: the result, with text stdout and
+            stderr.
+        """
+        result = subprocess.run(
+            [sys.executable, ASSEMBLER, *options, path],
+            capture_output=True, text=True, cwd=self.directory)
+        self.assertEqual(result.returncode, status, result.stderr)
+        self.assertNotIn("Traceback", result.stderr)
+        return result
+
+    def read_output(self, path: str, output_format: str = "text") \
+            -> typing.List[int]:
+        """
+        Args:
+            path (str): path of an .asm file that was assembled.
+            output_format (str): the format it was assembled in.
+
+        Returns:
+            typing.List[int]: the machine words of its .hack file.
+        """
+        output_path = os.path.splitext(path)[0] + ".hack"
+        if output_format == "text":
+            with open(output_path, 'r') as output_file:
+                return [int(line, 2) for line in output_file.read().split()]
+        words = array.array("H")
+        with open(output_path, 'rb') as output_file:
+            words.frombytes(output_file.read())
+        if sys.byteorder != "little":
+            words.byteswap()
+        return words.tolist()
+
+
+class GoldenOutputTest(AssemblerTestCase):
+    """Every mode gives the bundled .hack files."""
+
+    def check_mode(self, *options: str, output_format: str = "text",
+                   runs: int = 1) -> None:
+        """Assembles every bundled program and compares the output.
+
+        Args:
+            options (str): the command line options of the mode.
+            output_format (str): the format of the output.
+            runs (int): the number of times to assemble each program, for
+                the modes that keep state between runs.
+        """
+        for path, golden_path in PROGRAMS.items():
+            with self.subTest(path=path):
+                copy_path = self.copy(path)
+                for _ in range(runs):
+                    self.assemble(copy_path, *options)
+                    self.assertEqual(
+                        self.read_output(copy_path, output_format),
+                        read_golden(golden_path))
+
+    def test_two_pass(self) -> None:
+        self.check_mode()
+
+    def test_single_pass(self) -> None:
+        self.check_mode("--single-pass")
+
+    def test_stream(self) -> None:
+        self.check_mode("--stream")
+
+    def test_binary_format(self) -> None:
+        self.check_mode("--format", "binary", output_format="binary")
+
+    def test_stream_binary_format(self) -> None:
+        self.check_mode("--stream", "--format", "binary",
+                        output_format="binary")
+
+    def test_incremental(self) -> None:
+        # the second run reuses the state of the first:
+        self.check_mode("--incremental", "--verify", runs=2)
+
+    def test_preprocess(self) -> None:
+        self.check_mode("--preprocess")
+
+    def test_cache(self) -> None:
+        # a miss and then a hit:
+        self.check_mode("--cache", os.path.join(self.directory, "cache"),
+                        runs=2)
+
+    def test_jobs(self) -> None:
+        for path in PROGRAMS:
+            self.copy(path)
+        self.assemble(os.path.join(self.directory, "pong"), "--jobs", "2")
+        for path in ("pong/Pong.asm", "pong/PongL.asm"):
+            self.assertEqual(
+                self.read_output(os.path.join(self.directory, path)),
+                read_golden(PROGRAMS[path]))
+
+
+class OptimizerTest(AssemblerTestCase):
+    """The optimizers remove what their rules match, and leave programs that
+    may jump to hard-coded ROM addresses unchanged.
+    """
+
+    MODES = (("--optimize",), ("--dead-code", "aggressive"),
+             ("--dead-code", "conservative"))
+
+    def check_unchanged(self, source: str) -> None:
+        """Checks that every optimizer leaves a program unchanged.
+
+        Args:
+            source (str): the program.
+        """
+        path = self.write("Program.asm", source)
+        self.assemble(path)
+        expected = self.read_output(path)
+        for options in self.MODES:
+            with self.subTest(options=options):
+                result = self.assemble(path, *options)
+                self.assertIn("not optimized", result.stderr)
+                self.assertEqual(self.read_output(path), expected)
+
+    def check_optimized(self, source: str, expected: str,
+                        options: typing.Sequence[str],
+                        counts: str) -> None:
+        """Checks that an optimizer turns a program into another one.
+
+        Args:
+            source (str): the program.
+            expected (str): the optimized program.
+            options (typing.Sequence[str]): the options of the optimizer.
+            counts (str): the expected words that every rule saved, as
+                reported on stderr.
+        """
+        path = self.write("Expected.asm", expected)
+        self.assemble(path)
+        expected_words = self.read_output(path)
+        path = self.write("Program.asm", source)
+        result = self.assemble(path, *options)
+        self.assertIn(counts, result.stderr)
+        self.assertEqual(self.read_output(path), expected_words)
+
+    def test_peephole_rules(self) -> None:
+        end = "(END)\n@END\n0;JMP\n"
+        cases = {
+            "inverse": ("@SP\nM=M+1\nD=1\nM=M-1\nD=D-1\nD=D+1\n" + end,
+                        "@SP\nM=M+1\nD=1\nM=M-1\n" + end,
+                        "no-op: 0, inverse: 2, dead-load: 0, reload: 0"),
+            "dead-load": ("@5\n@R1\nM=0\n@SP\n@LCL\n@ARG\nM=1\n" + end,
+                          "@R1\nM=0\n@ARG\nM=1\n" + end,
+                          "no-op: 0, inverse: 0, dead-load: 3, reload: 0"),
+            "reload": ("@SP\nM=M+1\n@SP\nA=M\n@SP\nM=0\n(X)\n@SP\n"
+                       "M=0\n" + end,
+                       "@SP\nM=M+1\nA=M\n@SP\nM=0\n(X)\n@SP\nM=0\n" + end,
+                       "no-op: 0, inverse: 0, dead-load: 0, reload: 1"),
+        }
+        for rule, (source, expected, counts) in cases.items():
+            with self.subTest(rule=rule):
+                self.check_optimized(source, expected, ("--optimize",),
+                                     counts)
+
+    def test_translated_program(self) -> None:
+        # the translator pushes its return addresses as labels, so its
+        # output is optimized, even though it has indirect jumps (return)
+        # and copies numbers (push constant):
+        directory = os.path.join(self.directory, "Program")
+        os.mkdir(directory)
+        with open(os.path.join(directory, "Sys.vm"), 'w') as vm_file:
+            vm_file.write("function Sys.init 0\npush constant 7\n"
+                          "call Sys.double 1\npop static 0\nlabel END\n"
+                          "goto END\nfunction Sys.double 0\n"
+                          "push argument 0\npush argument 0\nsub\n"
+                          "return\nfunction Sys.unused 0\npush constant 1\n"
+                          "return\n")
+        subprocess.run([sys.executable, "Main.py", directory], check=True,
+                       cwd=os.path.join(TEST_DIRECTORY, os.pardir, "08"))
+        path = os.path.join(directory, "Program.asm")
+        self.assemble(path)
+        words = len(self.read_output(path))
+        for options in self.MODES:
+            with self.subTest(options=options):
+                result = self.assemble(path, *options)
+                self.assertNotIn("not optimized", result.stderr)
+                self.assertLess(len(self.read_output(path)), words)
+
+    def test_return_address_through_d(self) -> None:
+        # the return address 11 is stored in R15 and jumped to indirectly,
+        # so removing the M=M before it, or the commands after the jump,
+        # would break the program:
+        self.check_unchanged("@11\nD=A\n@R15\nM=D\nM=M\n@R15\nA=M\n0;JMP\n"
+                             "@R0\nM=-1\nM=M\n@R1\nM=1\n(END)\n@END\n0;JMP\n")
+
+    def test_jump_to_number(self) -> None:
+        self.check_unchanged("M=M\n@4\n0;JMP\nM=M\n@R1\nM=1\n")
+
+    def test_jump_after_label(self) -> None:
+        # A still holds LOOP after falling through into (X), so the block of
+        # LOOP is reachable, and only the D=0 after the jump is removed:
+        loop = "(LOOP)\n@R1\nM=1\n@LOOP\n0;JMP\n"
+        path = self.write("Expected.asm", "@LOOP\n(X)\n0;JMP\n" + loop)
+        self.assemble(path)
+        expected = self.read_output(path)
+        path = self.write("Program.asm", "@LOOP\n(X)\n0;JMP\nD=0\n" + loop)
+        result = self.assemble(path, "--dead-code", "aggressive")
+        self.assertIn("unreachable: 0, after-jump: 1", result.stderr)
+        self.assertEqual(self.read_output(path), expected)
+
+    def test_numbers_as_addresses(self) -> None:
+        # numbers that are only RAM addresses do not prevent optimizing:
+        path = self.write("Program.asm",
+                          "@5\nM=M\nD=M\n@SP\nA=M\n0;JMP\n")
+        result = self.assemble(path, "--optimize")
+        self.assertNotIn("not optimized", result.stderr)
+        self.assertEqual(len(self.read_output(path)), 5)
+
+
+class DiagnosticsTest(AssemblerTestCase):
+    """Errors are reported as diagnostics in every mode."""
+
+    MODES = ((), ("--single-pass",), ("--stream",), ("--incremental",))
+
+    def check_error(self, source: str, message: str,
+                    modes: typing.Iterable[typing.Tuple[str, ...]] = MODES) \
+            -> None:
+        """Assembles a bad program in every mode, and checks that it fails
+        with the message and without output.
+
+        Args:
+            source (str): the program.
+            message (str): a part of the expected error message.
+            modes (typing.Iterable[typing.Tuple[str, ...]]): the command
+                line options of every mode.
+        """
+        path = self.write("Bad.asm", source)
+        for options in modes:
+            with self.subTest(options=options):
+                result = self.assemble(path, *options, status=1)
+                self.assertIn(message, result.stderr)
+                self.assertFalse(os.path.exists(
+                    os.path.splitext(path)[0] + ".hack"))
+
+    def test_label_beyond_rom(self) -> None:
+        # the label at 32768 would encode as a C-instruction, and the one
+        # at 65536 does not fit in a word:
+        self.check_error("@FAR\n0;JMP\n" + "D=M\n" * 32766 + "(END)\n"
+                         "@END\n0;JMP\n" + "D=M\n" * 32766 + "(FAR)\n",
+                         "program too large for ROM")
+
+    def test_unknown_mnemonic(self) -> None:
+        self.check_error("@1\nD=A\nD=Q\n", "Bad.asm:3:3: error: unknown comp")
+
+    def test_duplicate_label(self) -> None:
+        self.check_error("(LOOP)\n@LOOP\n(LOOP)\n0;JMP\n",
+                         "Bad.asm:3:2: error: duplicate label (LOOP)")
+
+    def test_incremental_after_an_error(self) -> None:
+        path = self.write("Program.asm", "@1\nD=A\n(END)\n@END\n0;JMP\n")
+        self.assemble(path, "--incremental", "--verify")
+        self.write("Program.asm", "@1\nD=Q\n(END)\n@END\n0;JMP\n")
+        self.assemble(path, "--incremental", status=1)
+        self.assertFalse(os.path.exists(
+            os.path.splitext(path)[0] + ".hack"))
+        # the next run starts from the last good one, not the bad one:
+        self.write("Program.asm", "@1\nD=A\n@2\n(END)\n@END\n0;JMP\n")
+        self.assemble(path, "--incremental", "--verify")
+
+
+class SourceMapTest(AssemblerTestCase):
+    """The source maps and listings."""
+
+    def read_source_map(self, path: str) -> typing.Dict[str, typing.Any]:
+        """
+        Args:
+            path (str): path of an .asm file that was assembled with
+                --source-map.
+
+        Returns:
+            typing.Dict[str, typing.Any]: its source map, as JSON.
+        """
+        with open(os.path.splitext(path)[0] + ".map.json", 'r') as map_file:
+            return json.load(map_file)
+
+    def test_labels_at_the_same_address(self) -> None:
+        path = self.write("Program.asm", "(START)\n(LOOP)\n@LOOP\n0;JMP\n"
+                                         "(Main.main)\n(Main.main$IF)\n0\n")
+        for options in ((), ("--single-pass",), ("--stream",)):
+            with self.subTest(options=options):
+                self.assemble(path, "--source-map", *options)
+                self.assertEqual(self.read_source_map(path)["labels"],
+                                 [[0, ["START", "LOOP"]],
+                                  [2, ["Main.main", "Main.main$IF"]]])
+
+    def test_preprocessed_origins(self) -> None:
+        self.write("Library.asm", "(LIBRARY)\n@LIBRARY\n0;JMP\n")
+        path = self.write("Program.asm", '#include "Library.asm"\n'
+                                         "(START)\n@START\n0;JMP\n")
+        library_path = os.path.join(self.directory, "Library.asm")
+        for options in ((), ("--single-pass",), ("--stream",)):
+            with self.subTest(options=options):
+                self.assemble(path, "--preprocess", "--source-map", *options)
+                source_map = self.read_source_map(path)
+                self.assertEqual(source_map["paths"], [library_path, path])
+                self.assertEqual(source_map["files"], [0, 0, 1, 1])
+                self.assertEqual(source_map["lines"], [2, 3, 3, 4])
+        self.assemble(path, "--preprocess", "--listing")
+        with open(os.path.join(self.directory, "Program.lst"), 'r') \
+                as listing_file:
+            listing = listing_file.read()
+        self.assertIn("Library.asm:3", listing)
+        self.assertIn("Program.asm:2  (START)", listing)
+
+
+class PreprocessorTest(AssemblerTestCase):
+    """The includes and macros of --preprocess."""
+
+    def test_macro_symbols(self) -> None:
+        # a parameter is only replaced where it is a whole symbol, and
+        # symbols may contain the & of the VM translator:
+        path = self.write("Program.asm",
+                          "#macro JUMP(target)\n@target&1\n0;JMP\n"
+                          "@target\n0;JMP\n#end\n(LOOP&1)\n(LOOP)\n"
+                          "JUMP(LOOP)\n")
+        expected_path = self.write("Expected.asm",
+                                   "(LOOP&1)\n(LOOP)\n@target&1\n0;JMP\n"
+                                   "@LOOP\n0;JMP\n")
+        self.assemble(path, "--preprocess")
+        self.assemble(expected_path)
+        self.assertEqual(self.read_output(path),
+                         self.read_output(expected_path))
+
+
+class ServerTest(AssemblerTestCase):
+    """Starting the resident assembler."""
+
+    def answers(self, socket_path: str) -> bool:
+        """Waits for a server to answer on a socket.
+
+        Args:
+            socket_path (str): path of the socket.
+
+        Returns:
+            bool: whether a server answered in time.
+        """
+        for _ in range(100):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(socket_path)
+                return True
+            except OSError:
+                time.sleep(0.05)
+            finally:
+                probe.close()
+        return False
+
+    def start_server(self, socket_path: str) -> None:
+        """Starts a server, which is shut down at the end of the test.
+
+        Args:
+            socket_path (str): path of its socket.
+        """
+        server = subprocess.Popen(
+            [sys.executable, ASSEMBLER, "--serve", "--socket", socket_path])
+        self.addCleanup(server.wait)
+        self.addCleanup(subprocess.run, [
+            sys.executable, os.path.join(TEST_DIRECTORY, "Client.py"),
+            "--socket", socket_path, "--shutdown"], capture_output=True)
+        self.assertTrue(self.answers(socket_path))
+
+    def test_stale_socket(self) -> None:
+        socket_path = os.path.join(self.directory, "server.sock")
+        # a socket file that nothing listens on, as left by a crash:
+        stale_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale_socket.bind(socket_path)
+        stale_socket.close()
+        self.start_server(socket_path)
+
+    def test_running_server(self) -> None:
+        socket_path = os.path.join(self.directory, "server.sock")
+        self.start_server(socket_path)
+        result = subprocess.run(
+            [sys.executable, ASSEMBLER, "--serve", "--socket", socket_path],
+            capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 1)
+        self.assertIn("another assembler server is running", result.stderr)
+        # the socket of the first server was kept:
+        self.assertTrue(self.answers(socket_path))
+
+
+class RomImageTest(AssemblerTestCase):
+    """The memory-mapped binary .hack files."""
+
+    def test_views_outlive_the_image(self) -> None:
+        path = self.copy("pong/Pong.asm")
+        self.assemble(path, "--format", "binary")
+        golden = read_golden("pong/Pong.hack")
+        with HackFile.RomImage(os.path.splitext(path)[0] + ".hack") as rom:
+            self.assertEqual(list(rom), golden)
+            words = rom.words[1:]
+            try:
+                numpy_words = rom.as_numpy()
+            except ImportError:
+                numpy_words = None
+        # the views still read the file after it was closed:
+        self.assertEqual(words.tolist(), golden[1:])
+        if numpy_words is not None:
+            self.assertEqual(numpy_words.tolist(), golden)
+
+
+if "__main__" == __name__:
+    unittest.main()
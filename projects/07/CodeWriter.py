@@ -7,35 +7,517 @@ Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
 import typing
 
+# The assembly of every command is rendered from a template with a single
+# format call, and appended to a buffer that is written to the output in
+# blocks of about FLUSH_SIZE characters, instead of writing every line.
+FLUSH_SIZE = 1 << 16
+STACK_ADDRESS = 256
+
+BOOTSTRAP = f"""\
+// bootstrap code
+@{STACK_ADDRESS}
+D=A
+M=M+1
+M=M-1
+@SP
+M=D
+M=M
+"""
+
+# pops y into D, then x into M and computes D=y-x:
+_COMPARISON = """\
+// {command}
+@SP
+M=M-1
+A=M
+D=M
+@SP
+M=M-1
+A=M
+D=D-M
+@{true_label}{{jump}}
+D;{condition}
+@FALSE{{jump}}
+0;JMP
+({true_label}{{jump}})
+@SP
+A=M
+M=-1
+@END{{jump}}
+0;JMP
+(FALSE{{jump}})
+@SP
+A=M
+M=0
+(END{{jump}})
+@SP
+M=M+1
+"""
+
+_BINARY_AND_OR = """\
+// {command}
+@SP
+M=M-1
+A=M
+D=M
+@SP
+M=M-1
+A=M
+M=D{operator}M
+@SP
+M=M+1
+"""
+
+_BINARY_ADD_SUB = """\
+// {command}
+@SP
+AM=M-1
+D=M
+A=A-1
+M=M{operator}D
+"""
+
+# the templates of the arithmetic commands, formatted with the jump counter:
+ARITHMETIC_TEMPLATES = {
+    "add": _BINARY_ADD_SUB.format(command="add", operator="+"),
+    "sub": _BINARY_ADD_SUB.format(command="sub", operator="-"),
+    "and": _BINARY_AND_OR.format(command="and", operator="&"),
+    "or": _BINARY_AND_OR.format(command="or", operator="|"),
+    "not": """\
+// not
+@SP
+AM=M-1
+M=!M
+@SP
+M=M+1
+""",
+    "neg": """\
+// neg
+@SP
+AM=M-1
+M=-M
+@SP
+M=M+1
+""",
+    "eq": _COMPARISON.format(command="eq", true_label="EQUAL",
+                             condition="JEQ"),
+    "lt": _COMPARISON.format(command="lt", true_label="IS_LESS",
+                             condition="JGT"),
+    "gt": _COMPARISON.format(command="gt", true_label="IS_GREATER",
+                             condition="JLT"),
+}
+
+# the templates of push and pop, formatted with the index, the static
+# variable and the pointer address:
+PUSH_POP_TEMPLATES = {
+    ("C_PUSH", "local"): """\
+// push local {index}
+@LCL
+M=M-1
+M=M+1
+D=M
+@{index}
+A=D+A
+D=M
+@SP
+A=M
+M=D
+@SP
+M=M-1
+M=M+1
+M=M+1
+""",
+    ("C_POP", "local"): """\
+// pop local {index}
+@LCL
+D=M
+@{index}
+D=D+A
+@R15
+M=M-1
+M=M+1
+M=D
+@SP
+AM=M-1
+D=M
+@R15
+M=M-1
+M=M+1
+A=M
+M=D
+""",
+    ("C_PUSH", "argument"): """\
+// push argument {index}
+@ARG
+D=M
+@{index}
+A=D+A
+D=M
+@SP
+A=M
+M=D
+@SP
+M=M+1
+""",
+    ("C_POP", "argument"): """\
+// pop argument {index}
+@ARG
+D=M
+@{index}
+D=D+A
+@R15
+M=D
+@SP
+AM=M-1
+D=M
+@R15
+A=M
+M=D
+""",
+    ("C_PUSH", "constant"): """\
+// push constant {index}
+@{index}
+D=A
+@SP
+A=M
+M=D
+@SP
+M=M+1
+""",
+    ("C_PUSH", "static"): """\
+// push static {static}
+@{static}
+D=M
+@SP
+A=M
+M=D
+@SP
+M=M+1
+""",
+    ("C_POP", "static"): """\
+// pop static {static}
+@SP
+M=M-1
+A=M
+D=M
+@{static}
+M=D
+""",
+    ("C_PUSH", "this"): """\
+// push this {index}
+@THIS
+D=M
+@{index}
+M=M-1
+M=M+1
+D=D+A
+A=D
+D=M
+@SP
+A=M
+M=D
+@SP
+M=M+1
+""",
+    ("C_POP", "this"): """\
+// pop this {index}
+@THIS
+D=M
+@{index}
+D=D+A
+@R15
+M=M-1
+M=M+1
+M=D
+@SP
+AM=M-1
+D=M
+@R15
+A=M
+M=D
+""",
+    ("C_PUSH", "that"): """\
+// push that {index}
+@THAT
+D=M
+@{index}
+D=D+A
+A=D
+D=M
+@SP
+A=M
+M=D
+@SP
+M=M+1
+""",
+    ("C_POP", "that"): """\
+// pop that {index}
+@THAT
+D=M
+@{index}
+D=D+A
+@R15
+M=D
+@SP
+AM=M-1
+D=M
+@R15
+M=M-1
+M=M+1
+A=M
+M=D
+""",
+    ("C_PUSH", "pointer"): """\
+// push pointer {index}
+@{index}
+D=A
+@3
+M=M-1
+M=M+1
+A=D+A
+D=M
+@SP
+M=M-1
+M=M+1
+A=M
+M=D
+@SP
+M=M-1
+M=M+1
+M=M+1
+""",
+    ("C_POP", "pointer"): """\
+// pop pointer {index}
+@SP
+M=M-1
+M=M+1
+M=M-1
+A=M
+D=M
+@{pointer}
+M=D
+""",
+    ("C_PUSH", "temp"): """\
+// push temp {index}
+@5
+M=M-1
+M=M+1
+D=A
+@{index}
+A=D+A
+D=M
+@SP
+M=M-1
+M=M+1
+A=M
+M=D
+@SP
+M=M-1
+M=M+1
+M=M+1
+""",
+    ("C_POP", "temp"): """\
+// pop temp {index}
+@5
+D=A
+@{index}
+D=D+A
+@R15
+M=M-1
+M=M+1
+M=D
+@SP
+AM=M-1
+D=M
+@R15
+M=M-1
+M=M+1
+A=M
+M=D
+""",
+}
+
+LABEL = """\
+// label command:
+({file_name}&{label})
+"""
+
+GOTO = """\
+// goto command:
+@{file_name}&{label}
+0;JMP
+"""
+
+IF_GOTO = """\
+// if-goto command:
+@SP
+AM=M-1
+D=M
+@{file_name}&{label}
+M=M+1
+M=M-1
+D;JNE
+"""
+
+FUNCTION = """\
+// function command:
+({function_name})
+"""
+
+# pushes a 0 for every local variable of a function:
+PUSH_ZERO = """\
+@SP
+A=M
+M=0
+@SP
+M=M+1
+"""
+
+# pushes the return address, LCL, ARG, THIS and THAT, repositions ARG and
+# LCL, jumps to the function and injects the return address label:
+CALL = """\
+// call command:
+@{return_label}
+D=A
+@SP
+A=M
+M=D
+@SP
+M=M+1
+@LCL
+D=M
+@SP
+A=M
+M=D
+@SP
+M=M+1
+@ARG
+D=M
+@SP
+A=M
+M=D
+@SP
+M=M+1
+@THIS
+D=M
+@SP
+A=M
+M=D
+@SP
+M=M+1
+@THAT
+D=M
+@SP
+A=M
+M=D
+@SP
+M=M+1
+@SP
+D=M
+@5
+D=D-A
+@{n_args}
+D=D-A
+@ARG
+M=D
+@SP
+D=M
+@LCL
+M=D
+@{function_name}
+0;JMP
+// label command:
+({return_label})
+"""
+
+# sets a segment pointer to *(frame-number_to_subtract), frame is in R13:
+INITIALIZE_SEGMENT = """\
+@{number_to_subtract}
+D=A
+@R13
+D=M-D
+A=D
+D=M
+@{segment}
+M=D
+M=M+1
+M=M-1
+"""
+
+# frame = LCL, return_address = *(frame-5), *ARG = pop(), SP = ARG + 1,
+# then THAT, THIS, ARG and LCL are restored and return_address is jumped to:
+RETURN = """\
+// return command:
+@LCL
+D=M
+@R13
+M=D
+@5
+A=D-A
+D=M
+@R14
+M=D
+@SP
+AM=M-1
+D=M
+@ARG
+A=M
+M=D
+@ARG
+D=M+1
+@SP
+M=D
+""" + "".join(
+    INITIALIZE_SEGMENT.format(segment=segment, number_to_subtract=number)
+    for segment, number in (("THAT", 1), ("THIS", 2), ("ARG", 3),
+                            ("LCL", 4))) + """\
+@R14
+A=M
+0;JMP
+"""
+
+# the debugging no-op that Main writes after every command:
+END_COMMAND = "M=M\n"
+
 
 class CodeWriter:
     """Translates VM commands into Hack assembly code."""
 
-    def __init__(self, output_stream: typing.TextIO) -> None:
+    def __init__(self, output_stream: typing.TextIO,
+                 flush_size: int = FLUSH_SIZE) -> None:
         """Initializes the CodeWriter.
 
         Args:
             output_stream (typing.TextIO): output stream.
+            flush_size (int): the number of buffered characters that are
+                written to the output stream at once. 0 writes every command
+                as soon as it is translated.
         """
-        # Your code goes here!
-        # Note that you can write to output_stream like so:
-        # output_stream.write("Hello world! \n")
-        # pass
         self._output_file = output_stream
+        self._flush_size = flush_size
+        self._buffer = []
+        self._buffered_size = 0
         self._file_name = None
         self.jump = 10
         self.return_address_count = 0
 
+    def _write(self, text: str) -> None:
+        self._buffer.append(text)
+        self._buffered_size += len(text)
+        if self._buffered_size >= self._flush_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the buffered assembly to the output stream. Must be called
+        once all the commands were written.
+        """
+        if self._buffer:
+            self._output_file.write("".join(self._buffer))
+            self._buffer.clear()
+            self._buffered_size = 0
+
     def bootstrap(self):
-        stack_address = 256
-        self._output_file.write("// bootstrap code\n")
-        self._output_file.write(f"@{stack_address}\n")
-        self._output_file.write("D=A\n")
-        self._output_file.write("M=M+1\n")
-        self._output_file.write("M=M-1\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("M=D\n")
-        self._output_file.write("M=M\n")
+        self._write(BOOTSTRAP)
         self.write_call("Sys.init", 0)
 
     def set_file_name(self, filename: str) -> None:
@@ -45,17 +527,8 @@ class CodeWriter:
         Args:
             filename (str): The name of the VM file.
         """
-        # Your code goes here!
-        # This function is useful when translating code that handles the
-        # static segment. For example, in order to prevent collisions between two
-        # .vm files which push/pop to the static segment, one can use the current
-        # file's name in the assembly variable's name and thus differentiate between
-        # static variables belonging to different files.
-        # To avoid problems with Linux/Windows/MacOS differences with regards
-        # to filenames and paths, you are advised to parse the filename in
-        # the function "translate_file" in Main.py using python's os library,
-        # For example, using code similar to:
-        # input_filename, input_extension = os.path.splitext(os.path.basename(input_file.name))
+        # the file name is a part of the static variables and the labels, to
+        # prevent collisions between the .vm files of a program:
         self._file_name = filename
 
     def write_arithmetic(self, command: str) -> None:
@@ -68,109 +541,9 @@ class CodeWriter:
             command (str): an arithmetic command.
         """
         self.jump += 1
-        arithmetic1 = {"add": "+", "sub": "-", "or": "|", "and": "&", "not": "!"}
-        arithmetic2 = {"neg": "-"}
-        arithmetic3 = {"eq": "==", "lt": "<", "gt": ">"}
-
-        if command in arithmetic1:
-            if command in ["and", "or"]:
-                self._output_file.write(f"// {command}\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write(f"M=D{arithmetic1[command]}M\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M+1\n")
-
-            elif command == "not":
-                self._output_file.write(f"// {command}\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("AM=M-1\n")
-                self._output_file.write(f"M={arithmetic1[command]}M\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M+1\n")
-
-            else:
-                self._output_file.write(f"// {command}\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("AM=M-1\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("A=A-1\n")
-                self._output_file.write(f"M=M{arithmetic1[command]}D\n")
-
-        elif command in arithmetic2:
-            self._output_file.write(f"// {command}\n")
-            self._output_file.write("@SP\n")
-            self._output_file.write("AM=M-1\n")
-            self._output_file.write("M=-M\n")
-            self._output_file.write("@SP\n")
-            self._output_file.write("M=M+1\n")
-
-        elif command in arithmetic3:
-            self._output_file.write(f"// {command}\n")
-            self._output_file.write("@SP\n")
-            self._output_file.write("M=M-1\n")
-            self._output_file.write("A=M\n")
-            self._output_file.write("D=M\n")
-            self._output_file.write("@SP\n")
-            self._output_file.write("M=M-1\n")
-            self._output_file.write("A=M\n")
-            self._output_file.write("D=D-M\n")
-            if command == "eq":
-                self._output_file.write(f"@EQUAL{self.jump}\n"
-                                        f"D;JEQ\n"
-                                        f"@FALSE{self.jump}\n"
-                                        f"0;JMP\n"
-                                        f"(EQUAL{self.jump})\n"
-                                        f"@SP\n"
-                                        f"A=M\n"
-                                        f"M=-1\n")
-                self._output_file.write(f"@END{self.jump}\n"
-                                        f"0;JMP\n")
-                self._output_file.write(f"(FALSE{self.jump})\n"
-                                        f"@SP\n"
-                                        f"A=M\n"
-                                        f"M=0\n")
-                self._output_file.write(f"(END{self.jump})\n")
-            if command == "lt":
-                self._output_file.write(f"@IS_LESS{self.jump}\n"
-                                        f"D;JGT\n"
-                                        f"@FALSE{self.jump}\n"
-                                        f"0;JMP\n"
-                                        f"(IS_LESS{self.jump})\n"
-                                        f"@SP\n"
-                                        f"A=M\n"
-                                        f"M=-1\n")
-                self._output_file.write(f"@END{self.jump}\n"
-                                        f"0;JMP\n")
-                self._output_file.write(f"(FALSE{self.jump})\n"
-                                        f"@SP\n"
-                                        f"A=M\n"
-                                        f"M=0\n")
-                self._output_file.write(f"(END{self.jump})\n")
-
-            if command == "gt":
-                self._output_file.write(f"@IS_GREATER{self.jump}\n"
-                                        f"D;JLT\n"
-                                        f"@FALSE{self.jump}\n"
-                                        f"0;JMP\n"
-                                        f"(IS_GREATER{self.jump})\n"
-                                        f"@SP\n"
-                                        f"A=M\n"
-                                        f"M=-1\n")
-                self._output_file.write(f"@END{self.jump}\n"
-                                        f"0;JMP\n")
-                self._output_file.write(f"(FALSE{self.jump})\n"
-                                        f"@SP\n"
-                                        f"A=M\n"
-                                        f"M=0\n")
-                self._output_file.write(f"(END{self.jump})\n")
-            self._output_file.write("@SP\n"
-                                    "M=M+1\n")
+        template = ARITHMETIC_TEMPLATES.get(command)
+        if template is not None:
+            self._write(template.format(jump=self.jump))
 
     def write_push_pop(self, command: str, segment: str, index: int) -> None:
         """Writes assembly code that is the translation of the given
@@ -181,245 +554,15 @@ class CodeWriter:
             segment (str): the memory segment to operate on.
             index (int): the index in the memory segment.
         """
-        # Your code goes here!
-        # Note: each reference to "static i" appearing in the file Xxx.vm should
-        # be translated to the assembly symbol "Xxx.i". In the subsequent
+        # Note: each reference to "static i" appearing in the file Xxx.vm
+        # is translated to the assembly symbol "Xxx&i". In the subsequent
         # assembly process, the Hack assembler will allocate these symbolic
         # variables to the RAM, starting at address 16.
-
-        if segment == "local":
-            segment = "LCL"
-
-            if command == "C_PUSH":
-                self._output_file.write(f"// push local {index}\n")
-                self._output_file.write("@LCL\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("A=D+A\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("M=M+1\n")
-            elif command == "C_POP":
-                self._output_file.write(f"// pop local {index}\n")
-                self._output_file.write(f"@{segment}\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("D=D+A\n")
-                self._output_file.write("@R15\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("AM=M-1\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@R15\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-        if segment == "argument":
-            segment = "ARG"
-            if command == "C_PUSH":
-                self._output_file.write(f"// push argument {index}\n")
-                self._output_file.write(f"@{segment}\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("A=D+A\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M+1\n")
-            if command == "C_POP":
-                self._output_file.write(f"// pop argument {index}\n")
-                self._output_file.write(f"@{segment}\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("D=D+A\n")
-                self._output_file.write("@R15\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("AM=M-1\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@R15\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-        if segment == "constant":
-            if command == "C_PUSH":
-                self._output_file.write(f"// push constant {index}\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("D=A\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M+1\n")
-
-        if segment == "static":
-            static_address = self._file_name + "&" + str(index)
-
-            if command == "C_PUSH":
-                self._output_file.write(f"// push static {static_address}\n")
-                self._output_file.write(f"@{static_address}\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M+1\n")
-
-            if command == "C_POP":
-                self._output_file.write(f"// pop static {static_address}\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write(f"@{static_address}\n")
-                self._output_file.write("M=D\n")
-
-        if segment == "this":
-            segment = "THIS"
-            if command == "C_PUSH":
-                self._output_file.write(f"// push this {index}\n")
-                self._output_file.write(f"@{segment}\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("D=D+A\n")
-                self._output_file.write("A=D\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M+1\n")
-
-            if command == "C_POP":
-                self._output_file.write(f"// pop this {index}\n")
-                self._output_file.write(f"@{segment}\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("D=D+A\n")
-                self._output_file.write("@R15\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("AM=M-1\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@R15\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-
-        if segment == "that":
-            segment = "THAT"
-            if command == "C_PUSH":
-                self._output_file.write(f"// push that {index}\n")
-                self._output_file.write(f"@{segment}\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("D=D+A\n")
-                self._output_file.write("A=D\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M+1\n")
-            if command == "C_POP":
-                self._output_file.write(f"// pop that {index}\n")
-                self._output_file.write(f"@{segment}\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("D=D+A\n")
-                self._output_file.write("@R15\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("AM=M-1\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@R15\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-
-        if segment == "pointer":
-            if command == "C_PUSH":
-                self._output_file.write(f"// push pointer {index}\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("D=A\n")
-                self._output_file.write(f"@{3}\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("A=D+A\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("M=M+1\n")
-
-            if command == "C_POP":
-                self._output_file.write(f"// pop pointer {index}\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write(f"@{index + 3}\n")
-                self._output_file.write("M=D\n")
-        if segment == "temp":
-            if command == "C_PUSH":
-                self._output_file.write(f"// push temp {index}\n")
-                self._output_file.write(f"@{5}\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("D=A\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("A=D+A\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("M=M+1\n")
-
-            if command == "C_POP":
-                self._output_file.write(f"// pop temp {index}\n")
-                self._output_file.write(f"@{5}\n")
-                self._output_file.write("D=A\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("D=D+A\n")
-                self._output_file.write("@R15\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("AM=M-1\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@R15\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
+        template = PUSH_POP_TEMPLATES.get((command, segment))
+        if template is not None:
+            self._write(template.format(
+                index=index, static=f"{self._file_name}&{index}",
+                pointer=index + 3))
 
     def write_label(self, label: str) -> None:
         """Writes assembly code that affects the label command.
@@ -432,10 +575,8 @@ class CodeWriter:
         Args:
             label (str): the label to write.
         """
-        # This is irrelevant for project 7,
-        # you will implement this in project 8!
-        self._output_file.write("// label command:\n")
-        self._output_file.write(f"({self._file_name}&{label})\n") # make the label unique per file.
+        # the label is made unique per file:
+        self._write(LABEL.format(file_name=self._file_name, label=label))
 
     def write_goto(self, label: str) -> None:
         """Writes assembly code that affects the goto command.
@@ -443,11 +584,7 @@ class CodeWriter:
         Args:
             label (str): the label to go to.
         """
-        # This is irrelevant for project 7,
-        # you will implement this in project 8!
-        self._output_file.write("// goto command:\n")
-        self._output_file.write(f"@{self._file_name}&{label}\n")
-        self._output_file.write("0;JMP\n")
+        self._write(GOTO.format(file_name=self._file_name, label=label))
 
     def write_if(self, label: str) -> None:
         """Writes assembly code that affects the if-goto command.
@@ -455,16 +592,7 @@ class CodeWriter:
         Args:
             label (str): the label to go to.
         """
-        # This is irrelevant for project 7,
-        # you will implement this in project 8!
-        self._output_file.write("// if-goto command:\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("AM=M-1\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write(f"@{self._file_name}&{label}\n")
-        self._output_file.write("M=M+1\n")
-        self._output_file.write("M=M-1\n")
-        self._output_file.write("D;JNE\n")
+        self._write(IF_GOTO.format(file_name=self._file_name, label=label))
 
     def write_function(self, function_name: str, n_vars: int) -> None:
         """Writes assembly code that affects the function command.
@@ -478,21 +606,12 @@ class CodeWriter:
             function_name (str): the name of the function.
             n_vars (int): the number of local variables of the function.
         """
-        # This is irrelevant for project 7,
-        # you will implement this in project 8!
         # The pseudo-code of "function function_name n_vars" is:
         # (function_name)       // injects a function entry label into the code
         # repeat n_vars times:  // n_vars = number of local variables
         #   push constant 0     // initializes the local variables to 0
-
-        self._output_file.write("// function command:\n")
-        self._output_file.write("(" + function_name + ")\n")
-        for var in range(n_vars):
-            self._output_file.write("@SP\n")
-            self._output_file.write("A=M\n")
-            self._output_file.write("M=0\n")
-            self._output_file.write("@SP\n")
-            self._output_file.write("M=M+1\n")
+        self._write(FUNCTION.format(function_name=function_name) +
+                    PUSH_ZERO * n_vars)
 
     def write_call(self, function_name: str, n_args: int) -> None:
         """Writes assembly code that affects the call command.
@@ -510,8 +629,6 @@ class CodeWriter:
             function_name (str): the name of the function to call.
             n_args (int): the number of arguments of the function.
         """
-        # This is irrelevant for project 7,
-        # you will implement this in project 8!
         # The pseudo-code of "call function_name n_args" is:
         # push return_address   // generates a label and pushes it to the stack
         # push LCL              // saves LCL of the caller
@@ -522,84 +639,14 @@ class CodeWriter:
         # LCL = SP              // repositions LCL
         # goto function_name    // transfers control to the callee
         # (return_address)      // injects the return address label into the code
-
-        # generate special label with $ sign:
-        return_label = f"{self._file_name}&{function_name}{self.return_address_count}"
-
-        # push return_label to the global stack:
-        self._output_file.write("// call command:\n")
-        self._output_file.write(f"@{return_label}\n")
-        self._output_file.write("D=A\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("A=M\n")
-        self._output_file.write("M=D\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("M=M+1\n")
-
-        # push LCL:
-        self._output_file.write(f"@LCL\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("A=M\n")
-        self._output_file.write("M=D\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("M=M+1\n")
-
-        # push ARG:
-        self._output_file.write(f"@ARG\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("A=M\n")
-        self._output_file.write("M=D\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("M=M+1\n")
-
-        # push THIS:
-        self._output_file.write(f"@THIS\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("A=M\n")
-        self._output_file.write("M=D\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("M=M+1\n")
-
-        # push THAT:
-        self._output_file.write("@THAT\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("A=M\n")
-        self._output_file.write("M=D\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("M=M+1\n")
-
-        # initialize the new val of ARG:
-        self._output_file.write("@SP\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write(f"@5\n")
-        self._output_file.write("D=D-A\n")
-        self._output_file.write(f"@{n_args}\n")
-        self._output_file.write("D=D-A\n")
-        self._output_file.write("@ARG\n")
-        self._output_file.write("M=D\n")
-
-        # LCL = SP:
-        self._output_file.write("@SP\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write("@LCL\n")
-        self._output_file.write("M=D\n")
-
-        # goto function:
-        self._output_file.write(f"@{function_name}\n")
-        self._output_file.write("0;JMP\n")
-
-        # generate return_label:
-        self.write_label(f"{function_name}{self.return_address_count}")
+        return_label = f"{self._file_name}&{function_name}" \
+                       f"{self.return_address_count}"
+        self._write(CALL.format(return_label=return_label, n_args=n_args,
+                                function_name=function_name))
         self.return_address_count += 1
 
     def write_return(self) -> None:
         """Writes assembly code that affects the return command."""
-        # This is irrelevant for project 7,
-        # you will implement this in project 8!
         # The pseudo-code of "return" is:
         # frame = LCL                   // frame is a temporary variable
         # return_address = *(frame-5)   // puts the return address in a temp var
@@ -610,60 +657,14 @@ class CodeWriter:
         # ARG = *(frame-3)              // restores ARG for the caller
         # LCL = *(frame-4)              // restores LCL for the caller
         # goto return_address           // go to the return address
-
-        # frame = LCL:
-        self._output_file.write("// return command:\n")
-        self._output_file.write("@LCL\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write("@R13\n")
-        self._output_file.write("M=D\n")
-
-        # return_address = *(frame-5):
-        self._output_file.write("@5\n")
-        self._output_file.write("A=D-A\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write("@R14\n")
-        self._output_file.write("M=D\n")
-
-        # *ARG = pop():
-        self._output_file.write("@SP\n")
-        self._output_file.write("AM=M-1\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write("@ARG\n")
-        self._output_file.write("A=M\n")
-        self._output_file.write("M=D\n")
-
-        # SP = ARG + 1:
-        self._output_file.write("@ARG\n")
-        self._output_file.write("D=M+1\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("M=D\n")
-
-        # THAT = *(frame-1):
-        self.initialize_segment("THAT", 1)
-
-        # THIS = *(frame-2):
-        self.initialize_segment("THIS", 2)
-
-        # ARG = *(frame-3):
-        self.initialize_segment("ARG", 3)
-
-        # LCL = *(frame-4):
-        self.initialize_segment("LCL", 4)
-
-        # goto return_address:
-        self._output_file.write("@R14\n")
-        self._output_file.write("A=M\n")
-        self._output_file.write("0;JMP\n")
+        self._write(RETURN)
 
     def initialize_segment(self, segment, number_to_subtract):
-        self._output_file.write(f"@{number_to_subtract}\n")
-        self._output_file.write(f"D=A\n")
-        self._output_file.write("@R13\n")
-        self._output_file.write("D=M-D\n")
-        self._output_file.write("A=D\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write(f"@{segment}\n")
-        self._output_file.write("M=D\n")
-        self._output_file.write("M=M+1\n")
-        self._output_file.write("M=M-1\n")
+        self._write(INITIALIZE_SEGMENT.format(
+            segment=segment, number_to_subtract=number_to_subtract))
+
+    def end_command(self) -> None:
+        """Writes the no-op that marks the end of every command, which helps
+        to find the commands when debugging the assembly.
+        """
+        self._write(END_COMMAND)
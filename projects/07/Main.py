@@ -9,23 +9,25 @@ import os
 import sys
 import typing
 from Parser import Parser
-from CodeWriter import CodeWriter
+from CodeWriter import CodeWriter, FLUSH_SIZE
 
 
 def translate_file(
-        input_file: typing.TextIO, output_file: typing.TextIO) -> None:
+        input_file: typing.TextIO, output_file: typing.TextIO,
+        flush_size: int = FLUSH_SIZE) -> None:
     """Translates a single file.
 
     Args:
         input_file (typing.TextIO): the file to translate.
         output_file (typing.TextIO): writes all output to this file.
+        flush_size (int): see CodeWriter.
     """
     # Your code goes here!
     # It might be good to start with something like:
 
     # initialize the parser and the codeWriter objects:
     parser = Parser(input_file)
-    code_writer = CodeWriter(output_file)
+    code_writer = CodeWriter(output_file, flush_size)
     filename, extention = os.path.splitext(os.path.basename(input_file.name))
     code_writer.set_file_name(filename)
 
@@ -66,10 +68,13 @@ def translate_file(
         elif parser.command_type() == "C_RETURN":
             code_writer.write_return()
 
-        code_writer._output_file.write("M=M\n")  # for debugging purposes
+        code_writer.end_command()  # for debugging purposes
         # load the next command
         parser.advance()
 
+    # the code writer buffers its output:
+    code_writer.flush()
+
 
 if "__main__" == __name__:
     # Parses the input path and calls translate_file on each input file.
@@ -0,0 +1,171 @@
+"""
+Benchmarks the output path of the VM translator.
+
+Usage: python3 Benchmark.py [--commands N] [--repeats R]
+                            [<VM file or directory> ...]
+
+Every input (by default, the tests in FunctionCalls/ and a generated
+program of 1,000,000 VM commands) is translated into a temporary file,
+once writing every command as soon as it is rendered (flush size 0) and
+once with the default buffer of CodeWriter. The report has the number of
+write calls, the best time of a few repeats, and the number of assembly
+lines, which is how many writes a translator that writes line by line
+makes.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import typing
+from CodeWriter import FLUSH_SIZE
+from Main import translate_file
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INPUTS = [
+    os.path.join(BENCHMARK_DIRECTORY, "FunctionCalls", test)
+    for test in ("SimpleFunction", "FibonacciElement", "NestedCall",
+                 "StaticsTest")]
+DEFAULT_COMMANDS = 1000000
+REPEATS = 3
+
+SEGMENTS = ("local", "argument", "this", "that", "temp", "static")
+ARITHMETIC_COMMANDS = ("add", "sub", "neg", "eq", "gt", "lt", "and", "or",
+                       "not")
+
+
+class CountingWriter:
+    """A text stream that counts the write calls to another stream."""
+
+    def __init__(self, output_file: typing.TextIO) -> None:
+        self.output_file = output_file
+        self.writes = 0
+        self.lines = 0
+
+    def write(self, text: str) -> int:
+        self.writes += 1
+        self.lines += text.count("\n")
+        return self.output_file.write(text)
+
+
+def generate_program(commands: int, output_file: typing.TextIO,
+                     seed: int = 0) -> None:
+    """Writes a synthetic VM program, with functions of about 100 commands
+    that push, pop, compute, branch and call each other.
+
+    Args:
+        commands (int): the number of commands to generate.
+        output_file (typing.TextIO): writes the program to this file.
+        seed (int): the seed of the random generator.
+    """
+    generator = random.Random(seed)
+    lines = []
+    functions = 0
+    for command in range(commands):
+        if command % 100 == 0:
+            functions += 1
+            lines.append(f"function Main.f{functions} 2")
+            continue
+        if command % 100 == 1:
+            lines.append(f"label LOOP{functions}")
+            continue
+        choice = generator.random()
+        if choice < 0.3:
+            lines.append(f"push constant {generator.randrange(32768)}")
+        elif choice < 0.5:
+            lines.append(f"push {generator.choice(SEGMENTS)} "
+                         f"{generator.randrange(2)}")
+        elif choice < 0.65:
+            lines.append(f"pop {generator.choice(SEGMENTS)} "
+                         f"{generator.randrange(2)}")
+        elif choice < 0.9:
+            lines.append(generator.choice(ARITHMETIC_COMMANDS))
+        elif choice < 0.95:
+            lines.append(f"{generator.choice(('goto', 'if-goto'))} "
+                         f"LOOP{functions}")
+        elif choice < 0.98:
+            lines.append(f"call Main.f{generator.randrange(functions) + 1} "
+                         f"{generator.randrange(3)}")
+        else:
+            lines.append("return")
+    output_file.write("\n".join(lines) + "\n")
+
+
+def translate_path(input_path: str, output_file: typing.TextIO,
+                   flush_size: int) -> None:
+    """Translates a .vm file, or all the .vm files of a directory, like
+    Main.py does.
+
+    Args:
+        input_path (str): the file or directory.
+        output_file (typing.TextIO): writes all output to this file.
+        flush_size (int): see CodeWriter.
+    """
+    if os.path.isdir(input_path):
+        input_paths = [os.path.join(input_path, filename)
+                       for filename in sorted(os.listdir(input_path))]
+    else:
+        input_paths = [input_path]
+    for path in input_paths:
+        if os.path.splitext(path)[1].lower() == ".vm":
+            with open(path, 'r') as input_file:
+                translate_file(input_file, output_file, flush_size)
+
+
+def benchmark_path(name: str, input_path: str, repeats: int) -> None:
+    """Benchmarks the translation of a file or directory and prints a
+    report.
+
+    Args:
+        name (str): the name of the input in the report.
+        input_path (str): the .vm file or directory.
+        repeats (int): the number of timed runs, the best one is kept.
+    """
+    print(f"{name}:")
+    results = {}
+    for flush_size in (0, FLUSH_SIZE):
+        best_time = float("inf")
+        for _ in range(repeats):
+            with tempfile.TemporaryFile('w') as output_file:
+                writer = CountingWriter(output_file)
+                start = time.perf_counter()
+                translate_path(input_path, writer, flush_size)
+                output_file.flush()
+                best_time = min(best_time, time.perf_counter() - start)
+        results[flush_size] = best_time
+        print(f"  flush size {flush_size:<6} {writer.writes:9} writes "
+              f"({writer.lines} lines) {best_time * 1000:10.2f} ms")
+    print(f"  buffered speedup x{results[0] / results[FLUSH_SIZE]:.2f}")
+
+
+def main() -> None:
+    argument_parser = argparse.ArgumentParser(
+        description="Benchmarks the output path of the VM translator.")
+    argument_parser.add_argument(
+        "inputs", nargs="*",
+        help=".vm files or directories (default: FunctionCalls and a "
+             "generated program)")
+    argument_parser.add_argument(
+        "--commands", type=int, default=DEFAULT_COMMANDS, metavar="N",
+        help="the number of commands of the generated program")
+    argument_parser.add_argument(
+        "--repeats", type=int, default=REPEATS,
+        help="the number of timed runs per benchmark")
+    arguments = argument_parser.parse_args()
+
+    for path in arguments.inputs or DEFAULT_INPUTS:
+        path = os.path.abspath(path)
+        benchmark_path(os.path.relpath(path, BENCHMARK_DIRECTORY), path,
+                       arguments.repeats)
+    if arguments.inputs or not arguments.commands:
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "Main.vm")
+        with open(path, 'w') as program_file:
+            generate_program(arguments.commands, program_file)
+        benchmark_path(f"synthetic-{arguments.commands}", path,
+                       arguments.repeats)
+
+
+if "__main__" == __name__:
+    main()
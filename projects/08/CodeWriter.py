@@ -6,37 +6,997 @@ as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
 import typing
+from Parser import Command
+
+# The assembly of every command is rendered from a template with a single
+# format call, and appended to a buffer that is written to the output in
+# blocks of about FLUSH_SIZE characters, instead of writing every line.
+FLUSH_SIZE = 1 << 16
+STACK_ADDRESS = 256
+
+BOOTSTRAP = f"""\
+// bootstrap code
+@{STACK_ADDRESS}
+D=A
+M=M+1
+M=M-1
+@SP
+M=D
+M=M
+"""
+
+# pops y into D, then x into M and computes D=y-x:
+_COMPARISON = """\
+// {command}
+@SP
+M=M-1
+A=M
+D=M
+@SP
+M=M-1
+A=M
+D=D-M
+@{true_label}{{jump}}
+D;{condition}
+@FALSE{{jump}}
+0;JMP
+({true_label}{{jump}})
+@SP
+A=M
+M=-1
+@END{{jump}}
+0;JMP
+(FALSE{{jump}})
+@SP
+A=M
+M=0
+(END{{jump}})
+@SP
+M=M+1
+"""
+
+_BINARY_AND_OR = """\
+// {command}
+@SP
+M=M-1
+A=M
+D=M
+@SP
+M=M-1
+A=M
+M=D{operator}M
+@SP
+M=M+1
+"""
+
+_BINARY_ADD_SUB = """\
+// {command}
+@SP
+AM=M-1
+D=M
+A=A-1
+M=M{operator}D
+"""
+
+# the templates of the arithmetic commands, formatted with the jump counter:
+ARITHMETIC_TEMPLATES = {
+    "add": _BINARY_ADD_SUB.format(command="add", operator="+"),
+    "sub": _BINARY_ADD_SUB.format(command="sub", operator="-"),
+    "and": _BINARY_AND_OR.format(command="and", operator="&"),
+    "or": _BINARY_AND_OR.format(command="or", operator="|"),
+    "not": """\
+// not
+@SP
+AM=M-1
+M=!M
+@SP
+M=M+1
+""",
+    "neg": """\
+// neg
+@SP
+AM=M-1
+M=-M
+@SP
+M=M+1
+""",
+    "eq": _COMPARISON.format(command="eq", true_label="EQUAL",
+                             condition="JEQ"),
+    "lt": _COMPARISON.format(command="lt", true_label="IS_LESS",
+                             condition="JGT"),
+    "gt": _COMPARISON.format(command="gt", true_label="IS_GREATER",
+                             condition="JLT"),
+}
+
+# the templates of push and pop, formatted with the index, the static
+# variable and the pointer address:
+PUSH_POP_TEMPLATES = {
+    ("C_PUSH", "local"): """\
+// push local {index}
+@LCL
+M=M-1
+M=M+1
+D=M
+@{index}
+A=D+A
+D=M
+@SP
+A=M
+M=D
+@SP
+M=M-1
+M=M+1
+M=M+1
+""",
+    ("C_POP", "local"): """\
+// pop local {index}
+@LCL
+D=M
+@{index}
+D=D+A
+@R15
+M=M-1
+M=M+1
+M=D
+@SP
+AM=M-1
+D=M
+@R15
+M=M-1
+M=M+1
+A=M
+M=D
+""",
+    ("C_PUSH", "argument"): """\
+// push argument {index}
+@ARG
+D=M
+@{index}
+A=D+A
+D=M
+@SP
+A=M
+M=D
+@SP
+M=M+1
+""",
+    ("C_POP", "argument"): """\
+// pop argument {index}
+@ARG
+D=M
+@{index}
+D=D+A
+@R15
+M=D
+@SP
+AM=M-1
+D=M
+@R15
+A=M
+M=D
+""",
+    ("C_PUSH", "constant"): """\
+// push constant {index}
+@{index}
+D=A
+@SP
+A=M
+M=D
+@SP
+M=M+1
+""",
+    ("C_PUSH", "static"): """\
+// push static {static}
+@{static}
+D=M
+@SP
+A=M
+M=D
+@SP
+M=M+1
+""",
+    ("C_POP", "static"): """\
+// pop static {static}
+@SP
+M=M-1
+A=M
+D=M
+@{static}
+M=D
+""",
+    ("C_PUSH", "this"): """\
+// push this {index}
+@THIS
+D=M
+@{index}
+M=M-1
+M=M+1
+D=D+A
+A=D
+D=M
+@SP
+A=M
+M=D
+@SP
+M=M+1
+""",
+    ("C_POP", "this"): """\
+// pop this {index}
+@THIS
+D=M
+@{index}
+D=D+A
+@R15
+M=M-1
+M=M+1
+M=D
+@SP
+AM=M-1
+D=M
+@R15
+A=M
+M=D
+""",
+    ("C_PUSH", "that"): """\
+// push that {index}
+@THAT
+D=M
+@{index}
+D=D+A
+A=D
+D=M
+@SP
+A=M
+M=D
+@SP
+M=M+1
+""",
+    ("C_POP", "that"): """\
+// pop that {index}
+@THAT
+D=M
+@{index}
+D=D+A
+@R15
+M=D
+@SP
+AM=M-1
+D=M
+@R15
+M=M-1
+M=M+1
+A=M
+M=D
+""",
+    ("C_PUSH", "pointer"): """\
+// push pointer {index}
+@{index}
+D=A
+@3
+M=M-1
+M=M+1
+A=D+A
+D=M
+@SP
+M=M-1
+M=M+1
+A=M
+M=D
+@SP
+M=M-1
+M=M+1
+M=M+1
+""",
+    ("C_POP", "pointer"): """\
+// pop pointer {index}
+@SP
+M=M-1
+M=M+1
+M=M-1
+A=M
+D=M
+@{pointer}
+M=D
+""",
+    ("C_PUSH", "temp"): """\
+// push temp {index}
+@5
+M=M-1
+M=M+1
+D=A
+@{index}
+A=D+A
+D=M
+@SP
+M=M-1
+M=M+1
+A=M
+M=D
+@SP
+M=M-1
+M=M+1
+M=M+1
+""",
+    ("C_POP", "temp"): """\
+// pop temp {index}
+@5
+D=A
+@{index}
+D=D+A
+@R15
+M=M-1
+M=M+1
+M=D
+@SP
+AM=M-1
+D=M
+@R15
+M=M-1
+M=M+1
+A=M
+M=D
+""",
+}
+
+# -32768 <= constant < 0 is the complement of 0 <= ~constant <= 32767:
+NEGATIVE_CONSTANT = """\
+// push constant {constant}
+@{complement}
+D=!A
+@SP
+A=M
+M=D
+@SP
+M=M+1
+"""
+
+# The templates of moves, which copy a segment entry to another without
+# the stack. The value is loaded into D, then stored by a template that
+# keeps D. The entries of local, argument, this and that are addressed by
+# incrementing A up to MOVE_INCREMENT_LIMIT times, and farther ones have
+# their address computed into R13 before the value is loaded:
+SEGMENT_POINTERS = {"local": "LCL", "argument": "ARG", "this": "THIS",
+                    "that": "THAT"}
+MOVE_INCREMENT_LIMIT = 6
+
+LOAD_TEMPLATES = {
+    "constant": "@{index}\nD=A\n",
+    "static": "@{static}\nD=M\n",
+    "pointer": "@{pointer}\nD=M\n",
+    "temp": "@{temp}\nD=M\n",
+    "indirect": "@{pointer}\nD=M\n@{index}\nA=D+A\nD=M\n",
+}
+
+STORE_TEMPLATES = {
+    "static": "@{static}\nM=D\n",
+    "pointer": "@{pointer}\nM=D\n",
+    "temp": "@{temp}\nM=D\n",
+}
+
+COMPUTE_ADDRESS = """\
+@{pointer}
+D=M
+@{index}
+D=D+A
+@R13
+M=D
+"""
+
+STORE_AT_ADDRESS = """\
+@R13
+A=M
+M=D
+"""
+
+# stores D when the address can only be computed after the value, keeping
+# the value in R13 and the address in R14:
+STORE_FAR = """\
+@R13
+M=D
+@{pointer}
+D=M
+@{index}
+D=D+A
+@R14
+M=D
+@R13
+D=M
+@R14
+A=M
+M=D
+"""
+
+LABEL = """\
+// label command:
+({file_name}&{label})
+"""
+
+GOTO = """\
+// goto command:
+@{file_name}&{label}
+0;JMP
+"""
+
+IF_GOTO = """\
+// if-goto command:
+@SP
+AM=M-1
+D=M
+@{file_name}&{label}
+M=M+1
+M=M-1
+D;JNE
+"""
+
+# "not" and "if-goto" together: the value is not true if it plus 1 is not 0:
+IF_NOT = """\
+// if-goto command, after not:
+@SP
+AM=M-1
+D=M+1
+@{file_name}&{label}
+D;JNE
+"""
+
+FUNCTION = """\
+// function command:
+({function_name})
+"""
+
+# pushes a 0 for every local variable of a function:
+PUSH_ZERO = """\
+@SP
+A=M
+M=0
+@SP
+M=M+1
+"""
+
+# pushes the return address, LCL, ARG, THIS and THAT, repositions ARG and
+# LCL, jumps to the function and injects the return address label:
+CALL = """\
+// call command:
+@{return_label}
+D=A
+@SP
+A=M
+M=D
+@SP
+M=M+1
+@LCL
+D=M
+@SP
+A=M
+M=D
+@SP
+M=M+1
+@ARG
+D=M
+@SP
+A=M
+M=D
+@SP
+M=M+1
+@THIS
+D=M
+@SP
+A=M
+M=D
+@SP
+M=M+1
+@THAT
+D=M
+@SP
+A=M
+M=D
+@SP
+M=M+1
+@SP
+D=M
+@5
+D=D-A
+@{n_args}
+D=D-A
+@ARG
+M=D
+@SP
+D=M
+@LCL
+M=D
+@{function_name}
+0;JMP
+// label command:
+({return_label})
+"""
+
+# sets a segment pointer to *(frame-number_to_subtract), frame is in R13:
+INITIALIZE_SEGMENT = """\
+@{number_to_subtract}
+D=A
+@R13
+D=M-D
+A=D
+D=M
+@{segment}
+M=D
+M=M+1
+M=M-1
+"""
+
+# frame = LCL, return_address = *(frame-5), *ARG = pop(), SP = ARG + 1,
+# then THAT, THIS, ARG and LCL are restored and return_address is jumped to:
+RETURN_BODY = """\
+@LCL
+D=M
+@R13
+M=D
+@5
+A=D-A
+D=M
+@R14
+M=D
+@SP
+AM=M-1
+D=M
+@ARG
+A=M
+M=D
+@ARG
+D=M+1
+@SP
+M=D
+""" + "".join(
+    INITIALIZE_SEGMENT.format(segment=segment, number_to_subtract=number)
+    for segment, number in (("THAT", 1), ("THIS", 2), ("ARG", 3),
+                            ("LCL", 4))) + """\
+@R14
+A=M
+0;JMP
+"""
+RETURN = "// return command:\n" + RETURN_BODY
+
+# With shared calls, every call and return jumps to a single routine that
+# is written once per program, after the bootstrap code. A call site puts
+# the return address in R13, the function in R14 and n_args in D:
+CALL_ROUTINE_LABEL = "$CALL"
+RETURN_ROUTINE_LABEL = "$RETURN"
+
+SHARED_CALL = f"""\
+// call command:
+@{{return_label}}
+D=A
+@R13
+M=D
+@{{function_name}}
+D=A
+@R14
+M=D
+@{{n_args}}
+D=A
+@{CALL_ROUTINE_LABEL}
+0;JMP
+// label command:
+({{return_label}})
+"""
+
+SHARED_RETURN = f"""\
+// return command:
+@{RETURN_ROUTINE_LABEL}
+0;JMP
+"""
+
+# keeps n_args in R15, pushes the return address, LCL, ARG, THIS and THAT,
+# sets LCL = SP and ARG = SP-5-n_args, and jumps to the function:
+CALL_ROUTINE = f"""\
+// shared call routine:
+({CALL_ROUTINE_LABEL})
+@R15
+M=D
+@R13
+D=M
+@SP
+A=M
+M=D
+@LCL
+D=M
+@SP
+AM=M+1
+M=D
+@ARG
+D=M
+@SP
+AM=M+1
+M=D
+@THIS
+D=M
+@SP
+AM=M+1
+M=D
+@THAT
+D=M
+@SP
+AM=M+1
+M=D
+@SP
+MD=M+1
+@LCL
+M=D
+@R15
+D=D-M
+@5
+D=D-A
+@ARG
+M=D
+@R14
+A=M
+0;JMP
+"""
+
+RETURN_ROUTINE = f"""\
+// shared return routine:
+({RETURN_ROUTINE_LABEL})
+""" + RETURN_BODY
+
+# With shared comparisons, every eq, gt and lt puts its return address in
+# R13 and jumps to the routine of its operator, which pops y and x and
+# pushes the result. Main writes the routines of the operators that the
+# program uses once, after its last file, see comparison_routines:
+COMPARISON_ROUTINE_LABELS = {"eq": "$EQ", "gt": "$GT", "lt": "$LT"}
+
+SHARED_COMPARISON = """\
+// {command}
+@{return_label}
+D=A
+@R13
+M=D
+@{routine}
+0;JMP
+({return_label})
+"""
+
+# x-y is 0 exactly when x == y, even if the subtraction overflows:
+EQ_ROUTINE = """\
+// shared eq routine:
+({routine})
+@SP
+AM=M-1
+D=M
+A=A-1
+D=M-D
+@{routine}$TRUE
+D;JEQ
+"""
+
+# x-y overflows only if x and y have opposite signs, and then the sign of x
+# decides: x < y exactly when x is negative. y is kept in R14:
+ORDER_ROUTINE = """\
+// shared {command} routine:
+({routine})
+@SP
+AM=M-1
+D=M
+@R14
+M=D
+@SP
+A=M-1
+D=M
+@{routine}$X_NEGATIVE
+D;JLT
+@R14
+D=M
+@{routine}${if_y_negative}
+D;JLT
+({routine}$SAME_SIGN)
+@SP
+A=M-1
+D=M-D
+@{routine}$TRUE
+D;{condition}
+"""
+
+# ends a comparison routine: the result replaces x, and the routine
+# returns to the address in R13:
+COMPARISON_RESULT = """\
+({routine}$FALSE)
+@SP
+A=M-1
+M=0
+@R13
+A=M
+0;JMP
+({routine}$TRUE)
+@SP
+A=M-1
+M=-1
+@R13
+A=M
+0;JMP
+"""
+
+# for a negative x, the sign of y decides unless it is negative too:
+X_NEGATIVE = """\
+({routine}$X_NEGATIVE)
+@R14
+D=M
+@{routine}${if_y_not_negative}
+D;JGE
+@{routine}$SAME_SIGN
+0;JMP
+"""
+
+COMPARISON_ROUTINES = {
+    "eq": EQ_ROUTINE.format(routine="$EQ") +
+    COMPARISON_RESULT.format(routine="$EQ"),
+    "gt": ORDER_ROUTINE.format(command="gt", routine="$GT",
+                               if_y_negative="TRUE", condition="JGT") +
+    COMPARISON_RESULT.format(routine="$GT") +
+    X_NEGATIVE.format(routine="$GT", if_y_not_negative="FALSE"),
+    "lt": ORDER_ROUTINE.format(command="lt", routine="$LT",
+                               if_y_negative="FALSE", condition="JLT") +
+    COMPARISON_RESULT.format(routine="$LT") +
+    X_NEGATIVE.format(routine="$LT", if_y_not_negative="TRUE"),
+}
+
+# stops the code of the last file from falling through into the routines:
+COMPARISON_ROUTINES_GUARD = """\
+// the shared comparison routines, which are only reached by jumps:
+($COMPARISONS)
+@$COMPARISONS
+0;JMP
+"""
+
+# With stack-top caching, the top of the stack is kept in D instead of in
+# RAM[SP-1]: while it is cached, SP points to where it would be stored.
+# Spilling stores it and makes the stack whole again:
+SPILL = """\
+@SP
+M=M+1
+A=M-1
+M=D
+"""
+
+# pops the top of the stack into D, where it becomes the cached top:
+LOAD_TOP = """\
+@SP
+AM=M-1
+D=M
+"""
+
+# computes x op y into D, x from RAM and y from the cached top:
+CACHED_BINARY = """\
+// {command}
+@SP
+AM=M-1
+D={comp}
+"""
+
+CACHED_COMPARISON = """\
+// {command}
+@SP
+AM=M-1
+D=D-M
+@{file_name}$TRUE{jump}
+D;{condition}
+D=0
+@{file_name}$END{jump}
+0;JMP
+({file_name}$TRUE{jump})
+D=-1
+({file_name}$END{jump})
+"""
+
+CACHED_COMPS = {"add": "D+M", "sub": "M-D", "and": "D&M", "or": "D|M"}
+CACHED_UNARY_COMPS = {"neg": "-D", "not": "!D"}
+# y-x is compared to 0, like the comparisons of write_arithmetic:
+CACHED_CONDITIONS = {"eq": "JEQ", "gt": "JLT", "lt": "JGT"}
+
+# pops the cached top, and jumps if it is not 0 (if-goto), or if it is not
+# true (not and then if-goto):
+CACHED_IF_GOTO = """\
+// if-goto command:
+@{file_name}&{label}
+D;JNE
+"""
+
+CACHED_IF_NOT = """\
+// if-goto command, after not:
+D=D+1
+@{file_name}&{label}
+D;JNE
+"""
+
+# the debugging no-op that Main writes after every command:
+END_COMMAND = "M=M\n"
+
+
+def count_instructions(assembly: str) -> int:
+    """
+    Args:
+        assembly (str): assembly code, such as a rendered template.
+
+    Returns:
+        int: the number of instructions in it, which is the number of ROM
+        words it takes, and the number of cycles it takes if it has no
+        jumps.
+    """
+    return sum(1 for line in assembly.splitlines()
+               if line and not line.startswith(("//", "(")))
+
+
+def count_cycles(assembly: str) -> int:
+    """
+    Args:
+        assembly (str): assembly code, such as a rendered template, whose
+            jumps only go forward.
+
+    Returns:
+        int: the number of instructions that run from the first one until
+        the code ends or jumps out of it, if no conditional jump is taken.
+    """
+    addresses = {}
+    instructions = []
+    for line in assembly.splitlines():
+        if line.startswith("("):
+            addresses[line[1:-1]] = len(instructions)
+        elif line and not line.startswith("//"):
+            instructions.append(line)
+    cycles = 0
+    address = 0
+    while address < len(instructions):
+        cycles += 1
+        if instructions[address] == "0;JMP":
+            # the target was loaded by the previous instruction:
+            target = instructions[address - 1][1:]
+            if target not in addresses:
+                break
+            address = addresses[target]
+        else:
+            address += 1
+    return cycles
+
+
+def shared_call_savings(calls: int, returns: int) \
+        -> typing.Dict[str, int]:
+    """Compares shared calls to inline calls.
+
+    Args:
+        calls (int): the number of call commands, without the call of
+            Sys.init in the bootstrap code.
+        returns (int): the number of return commands.
+
+    Returns:
+        typing.Dict[str, int]: "saved_words", the ROM words that shared
+        calls save, including the cost of the routines, and the cycles of
+        every call and return, "inline_call", "shared_call", "inline_return"
+        and "shared_return", from the call site to the first command of the
+        function, and from the return to the return address.
+    """
+    inline_call = count_instructions(CALL)
+    call_site = count_instructions(SHARED_CALL)
+    inline_return = count_instructions(RETURN)
+    return_site = count_instructions(SHARED_RETURN)
+    routines = count_instructions(CALL_ROUTINE) + \
+        count_instructions(RETURN_ROUTINE)
+    return {"saved_words": calls * (inline_call - call_site) +
+                           returns * (inline_return - return_site) - routines,
+            "inline_call": inline_call,
+            "shared_call": call_site + count_instructions(CALL_ROUTINE),
+            "inline_return": inline_return,
+            "shared_return": return_site + count_instructions(RETURN_ROUTINE)}
+
+
+def comparison_routines(comparisons: typing.Dict[str, int]) -> str:
+    """
+    Args:
+        comparisons (typing.Dict[str, int]): the number of eq, gt and lt
+            commands that were translated with shared comparisons.
+
+    Returns:
+        str: the routines of the operators that were used, after a loop
+        that keeps the program from falling through into them, or "" if
+        none was used.
+    """
+    used = [routine for command, routine in COMPARISON_ROUTINES.items()
+            if comparisons.get(command, 0)]
+    if not used:
+        return ""
+    return COMPARISON_ROUTINES_GUARD + "".join(used)
+
+
+def shared_comparison_savings(comparisons: typing.Dict[str, int]) \
+        -> typing.Tuple[int, typing.Dict[str, typing.Dict[str, int]]]:
+    """Compares shared comparisons to inline ones.
+
+    Args:
+        comparisons (typing.Dict[str, int]): the number of eq, gt and lt
+            commands.
+
+    Returns:
+        typing.Tuple[int, typing.Dict[str, typing.Dict[str, int]]]: the ROM
+        words that shared comparisons save, including the cost of the code
+        of comparison_routines, and for every operator that was used,
+        "saved_words", the ROM words that its routine saves, including the
+        routine itself, and the cycles of a single comparison, "inline" and
+        "shared", if no conditional jump is taken.
+    """
+    call_site = count_instructions(SHARED_COMPARISON)
+    savings = {}
+    for command, routine in COMPARISON_ROUTINES.items():
+        if not comparisons.get(command, 0):
+            continue
+        inline = ARITHMETIC_TEMPLATES[command]
+        savings[command] = {
+            "saved_words": comparisons[command] * (
+                count_instructions(inline) - call_site) -
+            count_instructions(routine),
+            "inline": count_cycles(inline),
+            "shared": call_site + count_cycles(routine)}
+    saved_words = sum(operator["saved_words"]
+                      for operator in savings.values())
+    if savings:
+        saved_words -= count_instructions(COMPARISON_ROUTINES_GUARD)
+    return saved_words, savings
 
 
 class CodeWriter:
     """Translates VM commands into Hack assembly code."""
 
-    def __init__(self, output_stream: typing.TextIO) -> None:
+    def __init__(self, output_stream: typing.TextIO,
+                 flush_size: int = FLUSH_SIZE,
+                 shared_calls: bool = False,
+                 shared_comparisons: bool = False) -> None:
         """Initializes the CodeWriter.
 
         Args:
             output_stream (typing.TextIO): output stream.
+            flush_size (int): the number of buffered characters that are
+                written to the output stream at once. 0 writes every command
+                as soon as it is translated.
+            shared_calls (bool): translate call and return into jumps to
+                shared routines, which the bootstrap code writes, instead of
+                inlining them.
+            shared_comparisons (bool): translate eq, gt and lt into calls of
+                shared routines, which compare correctly even if x-y
+                overflows. The routines are not written, see
+                comparison_routines.
         """
-        # Your code goes here!
-        # Note that you can write to output_stream like so:
-        # output_stream.write("Hello world! \n")
-        # pass
         self._output_file = output_stream
+        self._flush_size = flush_size
+        self._shared_calls = shared_calls
+        self._shared_comparisons = shared_comparisons
+        self.comparisons = dict.fromkeys(COMPARISON_ROUTINE_LABELS, 0)
+        self.calls = 0
+        self.returns = 0
+        self._buffer = []
+        self._buffered_size = 0
         self._file_name = None
         self.jump = 10
         self.return_address_count = 0
 
+    def _write(self, text: str) -> None:
+        self._buffer.append(text)
+        self._buffered_size += len(text)
+        if self._buffered_size >= self._flush_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the buffered assembly to the output stream. Must be called
+        once all the commands were written.
+        """
+        if self._buffer:
+            self._output_file.write("".join(self._buffer))
+            self._buffer.clear()
+            self._buffered_size = 0
+
     def bootstrap(self):
-        stack_address = 256
-        self._output_file.write("// bootstrap code\n")
-        self._output_file.write(f"@{stack_address}\n")
-        self._output_file.write("D=A\n")
-        self._output_file.write("M=M+1\n")
-        self._output_file.write("M=M-1\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("M=D\n")
-        self._output_file.write("M=M\n")
+        self._write(BOOTSTRAP)
         self.write_call("Sys.init", 0)
+        # the call of Sys.init is not a call of the program:
+        self.calls -= 1
+        if self._shared_calls:
+            # Sys.init does not return, so the routines are not reached
+            # from here:
+            self._write(CALL_ROUTINE + RETURN_ROUTINE)
 
     def set_file_name(self, filename: str) -> None:
         """Informs the code writer that the translation of a new VM file is
@@ -45,17 +1005,8 @@ class CodeWriter:
         Args:
             filename (str): The name of the VM file.
         """
-        # Your code goes here!
-        # This function is useful when translating code that handles the
-        # static segment. For example, in order to prevent collisions between two
-        # .vm files which push/pop to the static segment, one can use the current
-        # file's name in the assembly variable's name and thus differentiate between
-        # static variables belonging to different files.
-        # To avoid problems with Linux/Windows/MacOS differences with regards
-        # to filenames and paths, you are advised to parse the filename in
-        # the function "translate_file" in Main.py using python's os library,
-        # For example, using code similar to:
-        # input_filename, input_extension = os.path.splitext(os.path.basename(input_file.name))
+        # the file name is a part of the static variables and the labels, to
+        # prevent collisions between the .vm files of a program:
         self._file_name = filename
 
     def write_arithmetic(self, command: str) -> None:
@@ -68,109 +1019,17 @@ class CodeWriter:
             command (str): an arithmetic command.
         """
         self.jump += 1
-        arithmetic1 = {"add": "+", "sub": "-", "or": "|", "and": "&", "not": "!"}
-        arithmetic2 = {"neg": "-"}
-        arithmetic3 = {"eq": "==", "lt": "<", "gt": ">"}
-
-        if command in arithmetic1:
-            if command in ["and", "or"]:
-                self._output_file.write(f"// {command}\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write(f"M=D{arithmetic1[command]}M\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M+1\n")
-
-            elif command == "not":
-                self._output_file.write(f"// {command}\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("AM=M-1\n")
-                self._output_file.write(f"M={arithmetic1[command]}M\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M+1\n")
-
-            else:
-                self._output_file.write(f"// {command}\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("AM=M-1\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("A=A-1\n")
-                self._output_file.write(f"M=M{arithmetic1[command]}D\n")
-
-        elif command in arithmetic2:
-            self._output_file.write(f"// {command}\n")
-            self._output_file.write("@SP\n")
-            self._output_file.write("AM=M-1\n")
-            self._output_file.write("M=-M\n")
-            self._output_file.write("@SP\n")
-            self._output_file.write("M=M+1\n")
-
-        elif command in arithmetic3:
-            self._output_file.write(f"// {command}\n")
-            self._output_file.write("@SP\n")
-            self._output_file.write("M=M-1\n")
-            self._output_file.write("A=M\n")
-            self._output_file.write("D=M\n")
-            self._output_file.write("@SP\n")
-            self._output_file.write("M=M-1\n")
-            self._output_file.write("A=M\n")
-            self._output_file.write("D=D-M\n")
-            if command == "eq":
-                self._output_file.write(f"@EQUAL{self.jump}\n"
-                                        f"D;JEQ\n"
-                                        f"@FALSE{self.jump}\n"
-                                        f"0;JMP\n"
-                                        f"(EQUAL{self.jump})\n"
-                                        f"@SP\n"
-                                        f"A=M\n"
-                                        f"M=-1\n")
-                self._output_file.write(f"@END{self.jump}\n"
-                                        f"0;JMP\n")
-                self._output_file.write(f"(FALSE{self.jump})\n"
-                                        f"@SP\n"
-                                        f"A=M\n"
-                                        f"M=0\n")
-                self._output_file.write(f"(END{self.jump})\n")
-            if command == "lt":
-                self._output_file.write(f"@IS_LESS{self.jump}\n"
-                                        f"D;JGT\n"
-                                        f"@FALSE{self.jump}\n"
-                                        f"0;JMP\n"
-                                        f"(IS_LESS{self.jump})\n"
-                                        f"@SP\n"
-                                        f"A=M\n"
-                                        f"M=-1\n")
-                self._output_file.write(f"@END{self.jump}\n"
-                                        f"0;JMP\n")
-                self._output_file.write(f"(FALSE{self.jump})\n"
-                                        f"@SP\n"
-                                        f"A=M\n"
-                                        f"M=0\n")
-                self._output_file.write(f"(END{self.jump})\n")
-
-            if command == "gt":
-                self._output_file.write(f"@IS_GREATER{self.jump}\n"
-                                        f"D;JLT\n"
-                                        f"@FALSE{self.jump}\n"
-                                        f"0;JMP\n"
-                                        f"(IS_GREATER{self.jump})\n"
-                                        f"@SP\n"
-                                        f"A=M\n"
-                                        f"M=-1\n")
-                self._output_file.write(f"@END{self.jump}\n"
-                                        f"0;JMP\n")
-                self._output_file.write(f"(FALSE{self.jump})\n"
-                                        f"@SP\n"
-                                        f"A=M\n"
-                                        f"M=0\n")
-                self._output_file.write(f"(END{self.jump})\n")
-            self._output_file.write("@SP\n"
-                                    "M=M+1\n")
+        if command in self.comparisons:
+            self.comparisons[command] += 1
+            if self._shared_comparisons:
+                self._write(SHARED_COMPARISON.format(
+                    command=command,
+                    return_label=f"{self._file_name}$COMPARISON{self.jump}",
+                    routine=COMPARISON_ROUTINE_LABELS[command]))
+                return
+        template = ARITHMETIC_TEMPLATES.get(command)
+        if template is not None:
+            self._write(template.format(jump=self.jump))
 
     def write_push_pop(self, command: str, segment: str, index: int) -> None:
         """Writes assembly code that is the translation of the given
@@ -181,245 +1040,67 @@ class CodeWriter:
             segment (str): the memory segment to operate on.
             index (int): the index in the memory segment.
         """
-        # Your code goes here!
-        # Note: each reference to "static i" appearing in the file Xxx.vm should
-        # be translated to the assembly symbol "Xxx.i". In the subsequent
+        # Note: each reference to "static i" appearing in the file Xxx.vm
+        # is translated to the assembly symbol "Xxx&i". In the subsequent
         # assembly process, the Hack assembler will allocate these symbolic
         # variables to the RAM, starting at address 16.
+        template = PUSH_POP_TEMPLATES.get((command, segment))
+        if segment == "constant" and index < 0:
+            self._write(NEGATIVE_CONSTANT.format(constant=index,
+                                                 complement=~index))
+        elif template is not None:
+            self._write(template.format(
+                index=index, static=f"{self._file_name}&{index}",
+                pointer=index + 3))
+
+    def write_move(self, segment: str, index: int, target_segment: str,
+                   target_index: int) -> None:
+        """Writes assembly code that copies a segment entry to another, as
+        "push segment index" and then "pop target_segment target_index"
+        would, without the stack.
+
+        Args:
+            segment (str): the memory segment to copy from.
+            index (int): the index in the memory segment.
+            target_segment (str): the memory segment to copy to.
+            target_index (int): the index in the target segment.
+        """
+        self._write(f"// push {segment} {index}, "
+                    f"pop {target_segment} {target_index}\n")
+        pointer = SEGMENT_POINTERS.get(target_segment)
+        if pointer is not None and target_index > MOVE_INCREMENT_LIMIT:
+            self._write(COMPUTE_ADDRESS.format(pointer=pointer,
+                                               index=target_index))
+            self._write_load(segment, index)
+            self._write(STORE_AT_ADDRESS)
+        else:
+            self._write_load(segment, index)
+            self._write_store(target_segment, target_index)
+
+    def _write_load(self, segment: str, index: int) -> None:
+        # loads the value of a segment entry into D:
+        if segment == "constant" and index < 0:
+            self._write(f"@{~index}\nD=!A\n")
+            return
+        pointer = SEGMENT_POINTERS.get(segment)
+        template = LOAD_TEMPLATES["indirect" if pointer else segment]
+        self._write(template.format(
+            index=index, static=f"{self._file_name}&{index}",
+            pointer=pointer or index + 3, temp=index + 5))
 
-        if segment == "local":
-            segment = "LCL"
-
-            if command == "C_PUSH":
-                self._output_file.write(f"// push local {index}\n")
-                self._output_file.write("@LCL\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("A=D+A\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("M=M+1\n")
-            elif command == "C_POP":
-                self._output_file.write(f"// pop local {index}\n")
-                self._output_file.write(f"@{segment}\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("D=D+A\n")
-                self._output_file.write("@R15\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("AM=M-1\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@R15\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-        if segment == "argument":
-            segment = "ARG"
-            if command == "C_PUSH":
-                self._output_file.write(f"// push argument {index}\n")
-                self._output_file.write(f"@{segment}\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("A=D+A\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M+1\n")
-            if command == "C_POP":
-                self._output_file.write(f"// pop argument {index}\n")
-                self._output_file.write(f"@{segment}\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("D=D+A\n")
-                self._output_file.write("@R15\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("AM=M-1\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@R15\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-        if segment == "constant":
-            if command == "C_PUSH":
-                self._output_file.write(f"// push constant {index}\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("D=A\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M+1\n")
-
-        if segment == "static":
-            static_address = self._file_name + "&" + str(index)
-
-            if command == "C_PUSH":
-                self._output_file.write(f"// push static {static_address}\n")
-                self._output_file.write(f"@{static_address}\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M+1\n")
-
-            if command == "C_POP":
-                self._output_file.write(f"// pop static {static_address}\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write(f"@{static_address}\n")
-                self._output_file.write("M=D\n")
-
-        if segment == "this":
-            segment = "THIS"
-            if command == "C_PUSH":
-                self._output_file.write(f"// push this {index}\n")
-                self._output_file.write(f"@{segment}\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("D=D+A\n")
-                self._output_file.write("A=D\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M+1\n")
-
-            if command == "C_POP":
-                self._output_file.write(f"// pop this {index}\n")
-                self._output_file.write(f"@{segment}\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("D=D+A\n")
-                self._output_file.write("@R15\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("AM=M-1\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@R15\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-
-        if segment == "that":
-            segment = "THAT"
-            if command == "C_PUSH":
-                self._output_file.write(f"// push that {index}\n")
-                self._output_file.write(f"@{segment}\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("D=D+A\n")
-                self._output_file.write("A=D\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M+1\n")
-            if command == "C_POP":
-                self._output_file.write(f"// pop that {index}\n")
-                self._output_file.write(f"@{segment}\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("D=D+A\n")
-                self._output_file.write("@R15\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("AM=M-1\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@R15\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-
-        if segment == "pointer":
-            if command == "C_PUSH":
-                self._output_file.write(f"// push pointer {index}\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("D=A\n")
-                self._output_file.write(f"@{3}\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("A=D+A\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("M=M+1\n")
-
-            if command == "C_POP":
-                self._output_file.write(f"// pop pointer {index}\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write(f"@{index + 3}\n")
-                self._output_file.write("M=D\n")
-        if segment == "temp":
-            if command == "C_PUSH":
-                self._output_file.write(f"// push temp {index}\n")
-                self._output_file.write(f"@{5}\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("D=A\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("A=D+A\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("M=M+1\n")
-
-            if command == "C_POP":
-                self._output_file.write(f"// pop temp {index}\n")
-                self._output_file.write(f"@{5}\n")
-                self._output_file.write("D=A\n")
-                self._output_file.write(f"@{index}\n")
-                self._output_file.write("D=D+A\n")
-                self._output_file.write("@R15\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("M=D\n")
-                self._output_file.write("@SP\n")
-                self._output_file.write("AM=M-1\n")
-                self._output_file.write("D=M\n")
-                self._output_file.write("@R15\n")
-                self._output_file.write("M=M-1\n")
-                self._output_file.write("M=M+1\n")
-                self._output_file.write("A=M\n")
-                self._output_file.write("M=D\n")
+    def _write_store(self, segment: str, index: int) -> None:
+        # stores D into a segment entry:
+        pointer = SEGMENT_POINTERS.get(segment)
+        if pointer is None:
+            self._write(STORE_TEMPLATES[segment].format(
+                static=f"{self._file_name}&{index}", pointer=index + 3,
+                temp=index + 5))
+        elif index > MOVE_INCREMENT_LIMIT:
+            self._write(STORE_FAR.format(pointer=pointer, index=index))
+        else:
+            self._write(f"@{pointer}\n" + (
+                "A=M+1\n" + "A=A+1\n" * (index - 1)
+                if index else "A=M\n") + "M=D\n")
 
     def write_label(self, label: str) -> None:
         """Writes assembly code that affects the label command.
@@ -432,10 +1113,8 @@ class CodeWriter:
         Args:
             label (str): the label to write.
         """
-        # This is irrelevant for project 7,
-        # you will implement this in project 8!
-        self._output_file.write("// label command:\n")
-        self._output_file.write(f"({self._file_name}&{label})\n") # make the label unique per file.
+        # the label is made unique per file:
+        self._write(LABEL.format(file_name=self._file_name, label=label))
 
     def write_goto(self, label: str) -> None:
         """Writes assembly code that affects the goto command.
@@ -443,11 +1122,7 @@ class CodeWriter:
         Args:
             label (str): the label to go to.
         """
-        # This is irrelevant for project 7,
-        # you will implement this in project 8!
-        self._output_file.write("// goto command:\n")
-        self._output_file.write(f"@{self._file_name}&{label}\n")
-        self._output_file.write("0;JMP\n")
+        self._write(GOTO.format(file_name=self._file_name, label=label))
 
     def write_if(self, label: str) -> None:
         """Writes assembly code that affects the if-goto command.
@@ -455,16 +1130,16 @@ class CodeWriter:
         Args:
             label (str): the label to go to.
         """
-        # This is irrelevant for project 7,
-        # you will implement this in project 8!
-        self._output_file.write("// if-goto command:\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("AM=M-1\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write(f"@{self._file_name}&{label}\n")
-        self._output_file.write("M=M+1\n")
-        self._output_file.write("M=M-1\n")
-        self._output_file.write("D;JNE\n")
+        self._write(IF_GOTO.format(file_name=self._file_name, label=label))
+
+    def write_if_not(self, label: str) -> None:
+        """Writes assembly code that affects the commands "not" and then
+        "if-goto label".
+
+        Args:
+            label (str): the label to go to.
+        """
+        self._write(IF_NOT.format(file_name=self._file_name, label=label))
 
     def write_function(self, function_name: str, n_vars: int) -> None:
         """Writes assembly code that affects the function command.
@@ -478,21 +1153,12 @@ class CodeWriter:
             function_name (str): the name of the function.
             n_vars (int): the number of local variables of the function.
         """
-        # This is irrelevant for project 7,
-        # you will implement this in project 8!
         # The pseudo-code of "function function_name n_vars" is:
         # (function_name)       // injects a function entry label into the code
         # repeat n_vars times:  // n_vars = number of local variables
         #   push constant 0     // initializes the local variables to 0
-
-        self._output_file.write("// function command:\n")
-        self._output_file.write("(" + function_name + ")\n")
-        for var in range(n_vars):
-            self._output_file.write("@SP\n")
-            self._output_file.write("A=M\n")
-            self._output_file.write("M=0\n")
-            self._output_file.write("@SP\n")
-            self._output_file.write("M=M+1\n")
+        self._write(FUNCTION.format(function_name=function_name) +
+                    PUSH_ZERO * n_vars)
 
     def write_call(self, function_name: str, n_args: int) -> None:
         """Writes assembly code that affects the call command.
@@ -510,8 +1176,6 @@ class CodeWriter:
             function_name (str): the name of the function to call.
             n_args (int): the number of arguments of the function.
         """
-        # This is irrelevant for project 7,
-        # you will implement this in project 8!
         # The pseudo-code of "call function_name n_args" is:
         # push return_address   // generates a label and pushes it to the stack
         # push LCL              // saves LCL of the caller
@@ -522,84 +1186,16 @@ class CodeWriter:
         # LCL = SP              // repositions LCL
         # goto function_name    // transfers control to the callee
         # (return_address)      // injects the return address label into the code
-
-        # generate special label with $ sign:
-        return_label = f"{self._file_name}&{function_name}{self.return_address_count}"
-
-        # push return_label to the global stack:
-        self._output_file.write("// call command:\n")
-        self._output_file.write(f"@{return_label}\n")
-        self._output_file.write("D=A\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("A=M\n")
-        self._output_file.write("M=D\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("M=M+1\n")
-
-        # push LCL:
-        self._output_file.write(f"@LCL\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("A=M\n")
-        self._output_file.write("M=D\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("M=M+1\n")
-
-        # push ARG:
-        self._output_file.write(f"@ARG\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("A=M\n")
-        self._output_file.write("M=D\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("M=M+1\n")
-
-        # push THIS:
-        self._output_file.write(f"@THIS\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("A=M\n")
-        self._output_file.write("M=D\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("M=M+1\n")
-
-        # push THAT:
-        self._output_file.write("@THAT\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("A=M\n")
-        self._output_file.write("M=D\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("M=M+1\n")
-
-        # initialize the new val of ARG:
-        self._output_file.write("@SP\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write(f"@5\n")
-        self._output_file.write("D=D-A\n")
-        self._output_file.write(f"@{n_args}\n")
-        self._output_file.write("D=D-A\n")
-        self._output_file.write("@ARG\n")
-        self._output_file.write("M=D\n")
-
-        # LCL = SP:
-        self._output_file.write("@SP\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write("@LCL\n")
-        self._output_file.write("M=D\n")
-
-        # goto function:
-        self._output_file.write(f"@{function_name}\n")
-        self._output_file.write("0;JMP\n")
-
-        # generate return_label:
-        self.write_label(f"{function_name}{self.return_address_count}")
+        return_label = f"{self._file_name}&{function_name}" \
+                       f"{self.return_address_count}"
+        template = SHARED_CALL if self._shared_calls else CALL
+        self._write(template.format(return_label=return_label, n_args=n_args,
+                                    function_name=function_name))
         self.return_address_count += 1
+        self.calls += 1
 
     def write_return(self) -> None:
         """Writes assembly code that affects the return command."""
-        # This is irrelevant for project 7,
-        # you will implement this in project 8!
         # The pseudo-code of "return" is:
         # frame = LCL                   // frame is a temporary variable
         # return_address = *(frame-5)   // puts the return address in a temp var
@@ -610,60 +1206,176 @@ class CodeWriter:
         # ARG = *(frame-3)              // restores ARG for the caller
         # LCL = *(frame-4)              // restores LCL for the caller
         # goto return_address           // go to the return address
-
-        # frame = LCL:
-        self._output_file.write("// return command:\n")
-        self._output_file.write("@LCL\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write("@R13\n")
-        self._output_file.write("M=D\n")
-
-        # return_address = *(frame-5):
-        self._output_file.write("@5\n")
-        self._output_file.write("A=D-A\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write("@R14\n")
-        self._output_file.write("M=D\n")
-
-        # *ARG = pop():
-        self._output_file.write("@SP\n")
-        self._output_file.write("AM=M-1\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write("@ARG\n")
-        self._output_file.write("A=M\n")
-        self._output_file.write("M=D\n")
-
-        # SP = ARG + 1:
-        self._output_file.write("@ARG\n")
-        self._output_file.write("D=M+1\n")
-        self._output_file.write("@SP\n")
-        self._output_file.write("M=D\n")
-
-        # THAT = *(frame-1):
-        self.initialize_segment("THAT", 1)
-
-        # THIS = *(frame-2):
-        self.initialize_segment("THIS", 2)
-
-        # ARG = *(frame-3):
-        self.initialize_segment("ARG", 3)
-
-        # LCL = *(frame-4):
-        self.initialize_segment("LCL", 4)
-
-        # goto return_address:
-        self._output_file.write("@R14\n")
-        self._output_file.write("A=M\n")
-        self._output_file.write("0;JMP\n")
+        self._write(SHARED_RETURN if self._shared_calls else RETURN)
+        self.returns += 1
 
     def initialize_segment(self, segment, number_to_subtract):
-        self._output_file.write(f"@{number_to_subtract}\n")
-        self._output_file.write(f"D=A\n")
-        self._output_file.write("@R13\n")
-        self._output_file.write("D=M-D\n")
-        self._output_file.write("A=D\n")
-        self._output_file.write("D=M\n")
-        self._output_file.write(f"@{segment}\n")
-        self._output_file.write("M=D\n")
-        self._output_file.write("M=M+1\n")
-        self._output_file.write("M=M-1\n")
+        self._write(INITIALIZE_SEGMENT.format(
+            segment=segment, number_to_subtract=number_to_subtract))
+
+    def write_command(self, command: Command) -> None:
+        """Writes assembly code that is the translation of a command.
+
+        Args:
+            command (Command): a parsed or optimized command. Commands of an
+                unknown kind are not translated.
+        """
+        if command.kind == "C_ARITHMETIC":
+            self.write_arithmetic(command.arg1)
+        elif command.kind in ("C_PUSH", "C_POP"):
+            self.write_push_pop(command.kind, command.arg1, command.arg2)
+        elif command.kind == "C_LABEL":
+            self.write_label(command.arg1)
+        elif command.kind == "C_GOTO":
+            self.write_goto(command.arg1)
+        elif command.kind == "C_IF":
+            self.write_if(command.arg1)
+        elif command.kind == "C_FUNCTION":
+            self.write_function(command.arg1, command.arg2)
+        elif command.kind == "C_CALL":
+            self.write_call(command.arg1, command.arg2)
+        elif command.kind == "C_RETURN":
+            self.write_return()
+        elif command.kind == "C_MOVE":
+            self.write_move(command.arg1, command.arg2, *command.target)
+        elif command.kind == "C_IF_NOT":
+            self.write_if_not(command.arg1)
+
+    def spill(self) -> None:
+        """Makes sure that the whole stack is in RAM. The top of the stack is
+        always there, so nothing is written.
+        """
+
+    def end_command(self) -> None:
+        """Writes the no-op that marks the end of every command, which helps
+        to find the commands when debugging the assembly.
+        """
+        self._write(END_COMMAND)
+
+
+class StackCachingCodeWriter(CodeWriter):
+    """Translates VM commands into Hack assembly code that keeps the top of
+    the stack in D along straight-line code, so a value that is pushed and
+    then used by the next command never goes through RAM. The top is
+    spilled to RAM before labels, jumps, functions, calls and returns, and
+    at the end of every file, so the stack is whole wherever control can
+    come from elsewhere.
+    """
+
+    def __init__(self, output_stream: typing.TextIO,
+                 flush_size: int = FLUSH_SIZE,
+                 shared_calls: bool = False,
+                 shared_comparisons: bool = False) -> None:
+        """Initializes the StackCachingCodeWriter.
+
+        Args:
+            output_stream (typing.TextIO): output stream.
+            flush_size (int): see CodeWriter.
+            shared_calls (bool): see CodeWriter.
+            shared_comparisons (bool): see CodeWriter. The top of the stack
+                is spilled before every comparison.
+        """
+        super().__init__(output_stream, flush_size, shared_calls,
+                         shared_comparisons)
+        # whether D holds the top of the stack:
+        self._cached = False
+
+    def spill(self) -> None:
+        """Writes the cached top of the stack to RAM, if it is cached. Main
+        calls it at the end of every file, as the code of a file can fall
+        through to the code of the next one.
+        """
+        if self._cached:
+            self._write(SPILL)
+            self._cached = False
+
+    def _load_top(self) -> None:
+        if not self._cached:
+            self._write(LOAD_TOP)
+            self._cached = True
+
+    def write_arithmetic(self, command: str) -> None:
+        """Writes assembly code that is the translation of the given
+        arithmetic command, with both the operand and the result at the top
+        of the stack cached in D.
+
+        Args:
+            command (str): an arithmetic command.
+        """
+        if command in self.comparisons and self._shared_comparisons:
+            self.spill()
+            super().write_arithmetic(command)
+            return
+        self.jump += 1
+        self._load_top()
+        if command in self.comparisons:
+            self.comparisons[command] += 1
+        if command in CACHED_COMPS:
+            self._write(CACHED_BINARY.format(command=command,
+                                             comp=CACHED_COMPS[command]))
+        elif command in CACHED_UNARY_COMPS:
+            self._write(f"// {command}\nD={CACHED_UNARY_COMPS[command]}\n")
+        elif command in CACHED_CONDITIONS:
+            self._write(CACHED_COMPARISON.format(
+                command=command, file_name=self._file_name, jump=self.jump,
+                condition=CACHED_CONDITIONS[command]))
+
+    def write_push_pop(self, command: str, segment: str, index: int) -> None:
+        """Writes assembly code that is the translation of the given
+        command, where command is either C_PUSH or C_POP. A push loads the
+        value into D, and a pop stores D.
+
+        Args:
+            command (str): "C_PUSH" or "C_POP".
+            segment (str): the memory segment to operate on.
+            index (int): the index in the memory segment.
+        """
+        if command == "C_PUSH":
+            self.spill()
+            self._write(f"// push {segment} {index}\n")
+            self._write_load(segment, index)
+            self._cached = True
+        elif segment != "constant":
+            self._load_top()
+            self._write(f"// pop {segment} {index}\n")
+            self._write_store(segment, index)
+            self._cached = False
+
+    def write_move(self, segment: str, index: int, target_segment: str,
+                   target_index: int) -> None:
+        self.spill()
+        super().write_move(segment, index, target_segment, target_index)
+
+    def write_label(self, label: str) -> None:
+        self.spill()
+        super().write_label(label)
+
+    def write_goto(self, label: str) -> None:
+        self.spill()
+        super().write_goto(label)
+
+    def write_if(self, label: str) -> None:
+        if self._cached:
+            self._write(CACHED_IF_GOTO.format(file_name=self._file_name,
+                                              label=label))
+            self._cached = False
+        else:
+            super().write_if(label)
+
+    def write_if_not(self, label: str) -> None:
+        self._load_top()
+        self._write(CACHED_IF_NOT.format(file_name=self._file_name,
+                                         label=label))
+        self._cached = False
+
+    def write_function(self, function_name: str, n_vars: int) -> None:
+        self.spill()
+        super().write_function(function_name, n_vars)
+
+    def write_call(self, function_name: str, n_args: int) -> None:
+        self.spill()
+        super().write_call(function_name, n_args)
+
+    def write_return(self) -> None:
+        self.spill()
+        super().write_return()
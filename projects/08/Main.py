@@ -5,70 +5,70 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import argparse
+import collections
 import os
 import sys
 import typing
 from Parser import Parser
-from CodeWriter import CodeWriter
+from CodeWriter import CodeWriter, StackCachingCodeWriter, FLUSH_SIZE, \
+    comparison_routines, shared_call_savings, shared_comparison_savings
+from Optimizer import Optimizer, PASSES
 
 
 def translate_file(
-        input_file: typing.TextIO, output_file: typing.TextIO) -> None:
+        input_file: typing.TextIO, output_file: typing.TextIO,
+        flush_size: int = FLUSH_SIZE, shared_calls: bool = False,
+        bootstrap: bool = True,
+        optimizer: typing.Optional[Optimizer] = None,
+        cache_top: bool = False,
+        shared_comparisons: bool = False) -> CodeWriter:
     """Translates a single file.
 
     Args:
         input_file (typing.TextIO): the file to translate.
         output_file (typing.TextIO): writes all output to this file.
+        flush_size (int): see CodeWriter.
+        shared_calls (bool): see CodeWriter.
+        bootstrap (bool): write the bootstrap code before the file.
+        optimizer (typing.Optional[Optimizer]): if given, the commands of the
+            file are optimized by it before they are translated.
+        cache_top (bool): keep the top of the stack in D, see
+            StackCachingCodeWriter.
+        shared_comparisons (bool): see CodeWriter. The caller writes the
+            routines once, after the last file, see
+            CodeWriter.comparison_routines.
+
+    Returns:
+        CodeWriter: the code writer of the file, which counts its calls,
+        returns and comparisons.
     """
     # Your code goes here!
     # It might be good to start with something like:
 
     # initialize the parser and the codeWriter objects:
     parser = Parser(input_file)
-    code_writer = CodeWriter(output_file)
+    writer_class = StackCachingCodeWriter if cache_top else CodeWriter
+    code_writer = writer_class(output_file, flush_size, shared_calls,
+                               shared_comparisons)
     filename, extention = os.path.splitext(os.path.basename(input_file.name))
     code_writer.set_file_name(filename)
 
     # write the bootstrap code:
-    code_writer.bootstrap()
-
-    while parser.has_more_commands():
-        if parser.command_type() == "C_ARITHMETIC":
-            arg1 = parser.arg1()
-            code_writer.write_arithmetic(arg1)
-        elif parser.command_type() == "C_PUSH":
-            arg1 = parser.arg1()
-            arg2 = parser.arg2()
-
-            code_writer.write_push_pop("C_PUSH", arg1, arg2)
-        elif parser.command_type() == "C_POP":
-            arg1 = parser.arg1()
-            arg2 = parser.arg2()
+    if bootstrap:
+        code_writer.bootstrap()
 
-            code_writer.write_push_pop("C_POP", arg1, arg2)
-        elif parser.command_type() == "C_LABEL":
-            arg1 = parser.arg1()
-            code_writer.write_label(arg1)
-        elif parser.command_type() == "C_GOTO":
-            arg1 = parser.arg1()
-            code_writer.write_goto(arg1)
-        elif parser.command_type() == "C_IF":
-            arg1 = parser.arg1()
-            code_writer.write_if(arg1)
-        elif parser.command_type() == "C_FUNCTION":
-            arg1 = parser.arg1()
-            arg2 = parser.arg2()
-            code_writer.write_function(arg1, arg2)
-        elif parser.command_type() == "C_CALL":
-            arg1 = parser.arg1()
-            arg2 = parser.arg2()
-            code_writer.write_call(arg1, arg2)
-        elif parser.command_type() == "C_RETURN":
-            code_writer.write_return()
+    commands = parser.commands()
+    if optimizer is not None:
+        commands = optimizer.optimize(list(commands))
+    for command in commands:
+        code_writer.write_command(command)
+        code_writer.end_command()  # for debugging purposes
+    code_writer.spill()
 
-        code_writer._output_file.write("M=M\n")  # for debugging purposes
-        # load the next command
-        parser.advance()
+    # the code writer buffers its output:
+    code_writer.flush()
+    return code_writer
 
 
 if "__main__" == __name__:
@@ -77,9 +77,38 @@ if "__main__" == __name__:
     # Both are closed automatically when the code finishes running.
     # If the output file does not exist, it is created automatically in the
     # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: VMtranslator <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
+    argument_parser = argparse.ArgumentParser(
+        prog="VMtranslator",
+        description="Translates VM code to Hack assembly.")
+    argument_parser.add_argument(
+        "input_path", help="a .vm file or a directory of .vm files")
+    argument_parser.add_argument(
+        "--shared-calls", action="store_true",
+        help="translate call and return into jumps to shared routines, and "
+             "report the saved ROM words and the cycles per call on stderr")
+    argument_parser.add_argument(
+        "--shared-comparisons", action="store_true",
+        help="translate eq, gt and lt into calls of shared routines that "
+             "also compare correctly when x-y overflows, and report the "
+             "saved ROM words and the cycles per comparison on stderr")
+    argument_parser.add_argument(
+        "--cache-top", action="store_true",
+        help="keep the top of the stack in D between commands")
+    argument_parser.add_argument(
+        "--optimize", action="store_true",
+        help="optimize the VM commands before translating them, and report "
+             "the saved instructions and cycles of every pass on stderr")
+    argument_parser.add_argument(
+        "--skip-pass", action="append", choices=PASSES, default=[],
+        metavar="PASS",
+        help=f"with --optimize, do not run this pass, one of: "
+             f"{', '.join(PASSES)} (can be repeated)")
+    arguments = argument_parser.parse_args()
+    optimizer = None
+    if arguments.optimize:
+        optimizer = Optimizer([name for name in PASSES
+                               if name not in arguments.skip_pass])
+    argument_path = os.path.abspath(arguments.input_path)
     if os.path.isdir(argument_path):
         files_to_translate = [
             os.path.join(argument_path, filename)
@@ -90,10 +119,52 @@ if "__main__" == __name__:
         files_to_translate = [argument_path]
         output_path, extension = os.path.splitext(argument_path)
     output_path += ".asm"
+    calls = returns = 0
+    comparisons = collections.Counter()
+    # the shared call routines are written once, with the first bootstrap
+    # code:
+    bootstrap = True
     with open(output_path, 'w') as output_file:
         for input_path in files_to_translate:
             filename, extension = os.path.splitext(input_path)
             if extension.lower() != ".vm":
                 continue
             with open(input_path, 'r') as input_file:
-                translate_file(input_file, output_file)
+                code_writer = translate_file(
+                    input_file, output_file,
+                    shared_calls=arguments.shared_calls,
+                    bootstrap=bootstrap,
+                    optimizer=optimizer, cache_top=arguments.cache_top,
+                    shared_comparisons=arguments.shared_comparisons)
+            bootstrap = not arguments.shared_calls
+            calls += code_writer.calls
+            returns += code_writer.returns
+            comparisons.update(code_writer.comparisons)
+        if arguments.shared_comparisons:
+            # only the routines of the operators that are used:
+            output_file.write(comparison_routines(comparisons))
+    if arguments.shared_calls:
+        savings = shared_call_savings(calls, returns)
+        print(f"{output_path}: shared calls saved {savings['saved_words']} "
+              f"ROM words over {calls} calls and {returns} returns; a call "
+              f"takes {savings['shared_call']} cycles instead of "
+              f"{savings['inline_call']}, a return "
+              f"{savings['shared_return']} instead of "
+              f"{savings['inline_return']}", file=sys.stderr)
+    if arguments.shared_comparisons:
+        saved_words, savings = shared_comparison_savings(comparisons)
+        report = ", ".join(
+            f"{command}: {comparisons[command]} comparisons, "
+            f"{operator['saved_words']} words saved, {operator['shared']} "
+            f"cycles instead of {operator['inline']}"
+            for command, operator in savings.items())
+        print(f"{output_path}: shared comparisons saved {saved_words} ROM "
+              f"words ({report or 'no comparisons, no routines written'})",
+              file=sys.stderr)
+    if optimizer is not None:
+        report = ", ".join(
+            f"{name}: {optimizer.words[name]} words, "
+            f"{optimizer.cycles[name]} cycles" for name in optimizer.passes)
+        print(f"{output_path}: the optimizer saved {optimizer.saved_words} "
+              f"words and about {optimizer.saved_cycles} cycles ({report})",
+              file=sys.stderr)
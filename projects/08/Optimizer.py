@@ -0,0 +1,291 @@
+"""
+An optimizer of VM commands, which runs between the parser and the code
+writer.
+
+Usage: python3 Optimizer.py [--skip-pass PASS ...] [<VM file or directory>
+                            ...]
+prints the savings of every pass on the inputs, by default on the tests in
+FunctionCalls/ and ProgramFlow/.
+
+The passes, which run in this order, each on the output of the previous one:
+- "dead-code": removes the commands after a goto or a return, up to the
+  next label or function, as nothing can reach them.
+- "fold": computes arithmetic commands whose operands were all pushed as
+  constants (for example push constant 2, push constant 3, add) and pushes
+  the result instead. The result is a 16-bit value, so it can be negative.
+- "if-not": translates not and then if-goto as a single command, which
+  jumps unless the popped value is true.
+- "move": translates a push and then a pop as a single move, which copies
+  the value without the stack.
+The passes never look across a label or a function, as those can be
+reached from anywhere.
+
+Every rewrite is measured by translating the commands that it replaces and
+the commands that replace it: the difference in instructions is the saved
+ROM words, and the difference in the instructions that run (see
+CodeWriter.count_cycles) estimates the cycles that are saved every time the
+code runs. Dead commands never run, so they save no cycles.
+"""
+import argparse
+import functools
+import io
+import os
+import sys
+import typing
+from CodeWriter import CodeWriter, count_cycles, count_instructions
+from Parser import Command
+
+PASSES = ("dead-code", "fold", "if-not", "move")
+
+_WORD = 1 << 16
+# the arithmetic commands that fold, with their number of operands, on
+# signed 16-bit values:
+OPERATIONS = {
+    "add": (2, lambda x, y: x + y),
+    "sub": (2, lambda x, y: x - y),
+    "and": (2, lambda x, y: x & y),
+    "or": (2, lambda x, y: x | y),
+    "eq": (2, lambda x, y: -(x == y)),
+    "gt": (2, lambda x, y: -(x > y)),
+    "lt": (2, lambda x, y: -(x < y)),
+    "neg": (1, lambda x: -x),
+    "not": (1, lambda x: ~x),
+}
+
+OPTIMIZER_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INPUTS = [
+    os.path.join(OPTIMIZER_DIRECTORY, directory, test)
+    for directory, tests in (
+        ("FunctionCalls", ("SimpleFunction", "FibonacciElement",
+                           "NestedCall", "StaticsTest")),
+        ("ProgramFlow", ("BasicLoop", "FibonacciSeries")))
+    for test in tests]
+
+
+def _to_signed(value: int) -> int:
+    return (value + _WORD // 2) % _WORD - _WORD // 2
+
+
+def _is_constant(command: Command) -> bool:
+    return command.kind == "C_PUSH" and command.arg1 == "constant"
+
+
+@functools.lru_cache(maxsize=None)
+def command_cost(command: Command) -> typing.Tuple[int, int]:
+    """
+    Args:
+        command (Command): a parsed or optimized command.
+
+    Returns:
+        typing.Tuple[int, int]: the number of instructions of its
+        translation, including the no-op that ends every command, and the
+        number of them that run.
+    """
+    output = io.StringIO()
+    code_writer = CodeWriter(output)
+    code_writer.set_file_name("Optimizer")
+    code_writer.write_command(command)
+    code_writer.end_command()
+    code_writer.flush()
+    assembly = output.getvalue()
+    return count_instructions(assembly), count_cycles(assembly)
+
+
+class Optimizer:
+    """Optimizes the commands of VM files, and counts the ROM words and the
+    cycles that every pass saved.
+    """
+
+    def __init__(self, passes: typing.Iterable[str] = PASSES) -> None:
+        """Creates an optimizer with zeroed counters.
+
+        Args:
+            passes (typing.Iterable[str]): the passes to run, see PASSES.
+
+        Raises:
+            ValueError: for an unknown pass.
+        """
+        passes = set(passes)
+        unknown = passes - set(PASSES)
+        if unknown:
+            raise ValueError(f"unknown passes: {', '.join(sorted(unknown))}")
+        self.passes = [name for name in PASSES if name in passes]
+        self.words = dict.fromkeys(self.passes, 0)
+        self.cycles = dict.fromkeys(self.passes, 0)
+
+    @property
+    def saved_words(self) -> int:
+        """
+        Returns:
+            int: the number of ROM words saved by all optimize() calls.
+        """
+        return sum(self.words.values())
+
+    @property
+    def saved_cycles(self) -> int:
+        """
+        Returns:
+            int: the estimated cycles saved by all optimize() calls, if every
+            command runs once.
+        """
+        return sum(self.cycles.values())
+
+    def optimize(self, commands: typing.List[Command]) \
+            -> typing.List[Command]:
+        """Optimizes the commands of a file.
+
+        Args:
+            commands (typing.List[Command]): the parsed commands.
+
+        Returns:
+            typing.List[Command]: the optimized commands.
+        """
+        optimizers = {"dead-code": self._remove_dead_code,
+                      "fold": self._fold_constants,
+                      "if-not": self._fuse_if_not,
+                      "move": self._fuse_moves}
+        for name in self.passes:
+            commands = optimizers[name](commands)
+        return commands
+
+    def _count(self, name: str, removed: typing.List[Command],
+               added: typing.List[Command], runs: bool = True) -> None:
+        for command in removed:
+            words, cycles = command_cost(command)
+            self.words[name] += words
+            self.cycles[name] += cycles if runs else 0
+        for command in added:
+            words, cycles = command_cost(command)
+            self.words[name] -= words
+            self.cycles[name] -= cycles if runs else 0
+
+    def _remove_dead_code(self, commands: typing.List[Command]) \
+            -> typing.List[Command]:
+        output = []
+        dead = []
+        reachable = True
+        for command in commands:
+            if command.kind in ("C_LABEL", "C_FUNCTION"):
+                reachable = True
+            if not reachable:
+                dead.append(command)
+                continue
+            output.append(command)
+            if command.kind in ("C_GOTO", "C_RETURN"):
+                reachable = False
+        self._count("dead-code", dead, [], runs=False)
+        return output
+
+    def _fold_constants(self, commands: typing.List[Command]) \
+            -> typing.List[Command]:
+        output = []
+        for command in commands:
+            operation = OPERATIONS.get(command.arg1) \
+                if command.kind == "C_ARITHMETIC" else None
+            if operation is not None:
+                arity, function = operation
+                operands = output[-arity:]
+                if len(operands) == arity and all(map(_is_constant,
+                                                      operands)):
+                    folded = Command("C_PUSH", "constant", _to_signed(
+                        function(*(operand.arg2 for operand in operands))))
+                    del output[-arity:]
+                    self._count("fold", operands + [command], [folded])
+                    output.append(folded)
+                    continue
+            output.append(command)
+        return output
+
+    def _fuse_if_not(self, commands: typing.List[Command]) \
+            -> typing.List[Command]:
+        output = []
+        for command in commands:
+            if command.kind == "C_IF" and output and \
+                    output[-1] == Command("C_ARITHMETIC", "not"):
+                fused = Command("C_IF_NOT", command.arg1)
+                self._count("if-not", [output.pop(), command], [fused])
+                output.append(fused)
+                continue
+            output.append(command)
+        return output
+
+    def _fuse_moves(self, commands: typing.List[Command]) \
+            -> typing.List[Command]:
+        output = []
+        for command in commands:
+            if command.kind == "C_POP" and output and \
+                    output[-1].kind == "C_PUSH":
+                push = output.pop()
+                move = Command("C_MOVE", push.arg1, push.arg2,
+                               (command.arg1, command.arg2))
+                self._count("move", [push, command], [move])
+                output.append(move)
+                continue
+            output.append(command)
+        return output
+
+
+def optimize_path(input_path: str, optimizer: Optimizer) \
+        -> typing.Tuple[int, int]:
+    """Optimizes and translates a .vm file, or all the .vm files of a
+    directory, without writing the output.
+
+    Args:
+        input_path (str): the file or directory.
+        optimizer (Optimizer): counts the savings of the files.
+
+    Returns:
+        typing.Tuple[int, int]: the number of instructions of the
+        translation without and with the optimizer.
+    """
+    # imported here, as Main imports this module:
+    from Main import translate_file
+    if os.path.isdir(input_path):
+        input_paths = [os.path.join(input_path, filename)
+                       for filename in sorted(os.listdir(input_path))]
+    else:
+        input_paths = [input_path]
+    sizes = []
+    for file_optimizer in (None, optimizer):
+        output_file = io.StringIO()
+        for path in input_paths:
+            if os.path.splitext(path)[1].lower() == ".vm":
+                with open(path, 'r') as input_file:
+                    translate_file(input_file, output_file,
+                                   optimizer=file_optimizer)
+        sizes.append(count_instructions(output_file.getvalue()))
+    return sizes[0], sizes[1]
+
+
+def main() -> None:
+    argument_parser = argparse.ArgumentParser(
+        description="Reports the savings of the VM optimizer passes.")
+    argument_parser.add_argument(
+        "inputs", nargs="*",
+        help=".vm files or directories (default: the tests in FunctionCalls "
+             "and ProgramFlow)")
+    argument_parser.add_argument(
+        "--skip-pass", action="append", choices=PASSES, default=[],
+        metavar="PASS", help="do not run this pass (can be repeated)")
+    arguments = argument_parser.parse_args()
+
+    passes = [name for name in PASSES if name not in arguments.skip_pass]
+    print(f"{'input':30}" + "".join(f"{name:>16}" for name in passes) +
+          f"{'total':>16}{'instructions':>20}")
+    for path in arguments.inputs or DEFAULT_INPUTS:
+        path = os.path.abspath(path)
+        optimizer = Optimizer(passes)
+        before, after = optimize_path(path, optimizer)
+        savings = [(optimizer.words[name], optimizer.cycles[name])
+                   for name in passes]
+        savings.append((optimizer.saved_words, optimizer.saved_cycles))
+        print(f"{os.path.relpath(path, OPTIMIZER_DIRECTORY):30}" +
+              "".join(f"{f'{words}w/{cycles}c':>16}"
+                      for words, cycles in savings) +
+              f"{f'{before} -> {after}':>20}")
+    print("w: saved ROM words, c: estimated cycles saved if every command "
+          "runs once", file=sys.stderr)
+
+
+if "__main__" == __name__:
+    main()
@@ -10,6 +10,23 @@ import re
 import io
 
 
+class Command(typing.NamedTuple):
+    """A parsed VM command, which the optimizer can rewrite before the code
+    writer translates it.
+
+    kind is one of the command types of Parser.command_type(), or one of the
+    commands that only the optimizer creates:
+    - "C_MOVE": copies arg1 arg2 (a segment and an index) to target, as
+      "push arg1 arg2" and then "pop target" would, without the stack.
+    - "C_IF_NOT": jumps to the label arg1 if the popped value is not true
+      (-1), as "not" and then "if-goto arg1" would.
+    """
+    kind: typing.Optional[str]
+    arg1: typing.Optional[str] = None
+    arg2: typing.Optional[int] = None
+    target: typing.Optional[typing.Tuple[str, int]] = None
+
+
 class Parser:
     """
     # Parser
@@ -151,6 +168,21 @@ class Parser:
         if self.command_type() == "C_PUSH" or self.command_type() == "C_POP" or self.command_type() == "C_FUNCTION" or self.command_type() == "C_CALL":
             return int(self.splited_command[2])
 
+    def commands(self) -> typing.Iterator[Command]:
+        """Reads the current command and all the commands after it.
+
+        Yields:
+            Command: every command, with the arguments that it has.
+        """
+        while self.has_more_commands():
+            command_type = self.command_type()
+            if command_type in ("C_PUSH", "C_POP", "C_FUNCTION", "C_CALL"):
+                yield Command(command_type, self.arg1(), self.arg2())
+            elif command_type in ("C_RETURN", None):
+                yield Command(command_type)
+            else:
+                yield Command(command_type, self.arg1())
+            self.advance()
 
     def remove_spaces_comments(self, line):
         # Remove comments (everything after '//')
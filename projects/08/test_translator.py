@@ -0,0 +1,330 @@
+"""
+Tests the VM translator in every mode on the bundled programs of
+FunctionCalls/ and ProgramFlow/.
+
+Usage: python3 -m unittest test_translator (in this directory)
+
+Every translation is assembled by the assembler of project 06, run on a
+small Hack CPU with the RAM that the program's .tst file sets, and the RAM
+is compared to the program's .cmp file. The programs with a Sys.init are
+translated by Main.py with the bootstrap code, the others, which the .tst
+file starts in the middle of a program, by translate_file without it.
+"""
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import typing
+import unittest
+from CodeWriter import comparison_routines
+from Main import translate_file
+from Optimizer import Optimizer
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+ASSEMBLER = os.path.join(TEST_DIRECTORY, os.pardir, "06", "Main.py")
+BOOTSTRAPPED_PROGRAMS = ("FunctionCalls/FibonacciElement",
+                         "FunctionCalls/NestedCall",
+                         "FunctionCalls/StaticsTest")
+PROGRAMS = ("FunctionCalls/SimpleFunction", "ProgramFlow/BasicLoop",
+            "ProgramFlow/FibonacciSeries")
+# the command line options of every mode of Main.py:
+MODES = {
+    "default": (),
+    "shared-calls": ("--shared-calls",),
+    "shared-comparisons": ("--shared-comparisons",),
+    "cache-top": ("--cache-top",),
+    "optimize": ("--optimize",),
+    "all": ("--shared-calls", "--shared-comparisons", "--cache-top",
+            "--optimize"),
+}
+# the translator writes commutative computations with D second, which the
+# assembler only accepts with D first:
+COMMUTED = re.compile(r"^([AMD]*=)?([AM])([+&|])D\b", re.MULTILINE)
+# a program has run away if it takes this many times the cycles of its
+# .tst file:
+CYCLES_FACTOR = 10
+WORD = 1 << 16
+
+
+def alu(comp: int, x: int, y: int) -> int:
+    """
+    Args:
+        comp (int): the 6 control bits of the ALU, zx nx zy ny f no.
+        x (int): the first input.
+        y (int): the second input.
+
+    Returns:
+        int: the output of the Hack ALU.
+    """
+    if comp & 0b100000:
+        x = 0
+    if comp & 0b010000:
+        x = ~x % WORD
+    if comp & 0b001000:
+        y = 0
+    if comp & 0b000100:
+        y = ~y % WORD
+    output = (x + y) % WORD if comp & 0b000010 else x & y
+    if comp & 0b000001:
+        output = ~output % WORD
+    return output
+
+
+def is_idle(words: typing.List[int]) -> bool:
+    """
+    Args:
+        words (typing.List[int]): the body of a loop.
+
+    Returns:
+        bool: whether the body neither jumps nor changes the RAM, so the
+        loop never ends and changes nothing.
+    """
+    for word in words:
+        # a C-instruction that jumps, or writes M unless it is M=M:
+        if word & 0x8000 and (word & 0b111 or (
+                word & 0b001000 and word & 0x1FC0 != 0x1C00)):
+            return False
+    return True
+
+
+def run(words: typing.List[int], ram: typing.Dict[int, int],
+        max_cycles: int) -> typing.Dict[int, int]:
+    """Runs a program on the Hack CPU until it jumps out of the ROM or into
+    a loop that does nothing, which is how the bundled programs halt.
+
+    Args:
+        words (typing.List[int]): the machine words of the program.
+        ram (typing.Dict[int, int]): the RAM, which is changed in place.
+        max_cycles (int): stop after this many instructions.
+
+    Returns:
+        typing.Dict[int, int]: the RAM.
+
+    Raises:
+        AssertionError: if the program did not stop in time.
+    """
+    a_register = d_register = pc = 0
+    for _ in range(max_cycles):
+        if not 0 <= pc < len(words):
+            return ram
+        word = words[pc]
+        if not word & 0x8000:
+            a_register = word
+            pc += 1
+            continue
+        y = ram.get(a_register, 0) if word & 0x1000 else a_register
+        output = alu((word >> 6) & 0b111111, d_register, y)
+        if word & 0b001000:
+            ram[a_register] = output
+        if word & 0b010000:
+            d_register = output
+        target = a_register
+        if word & 0b100000:
+            a_register = output
+        signed = output - WORD if output & 0x8000 else output
+        if (word & 0b100 and signed < 0) or (word & 0b010 and signed == 0) \
+                or (word & 0b001 and signed > 0):
+            if word & 0b111 == 0b111 and target <= pc and \
+                    is_idle(words[target:pc]):
+                return ram
+            pc = a_register if word & 0b100000 else target
+        else:
+            pc += 1
+    raise AssertionError(f"the program did not stop in {max_cycles} cycles")
+
+
+class TranslatorTest(unittest.TestCase):
+    """Every mode of the translator passes the bundled tests."""
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def assemble(self, name: str, assembly: str,
+                 assembler_options: typing.Sequence[str] = ()) \
+            -> typing.List[int]:
+        """Assembles a translation with the assembler of project 06.
+
+        Args:
+            name (str): the name of the program.
+            assembly (str): the translation of the program.
+            assembler_options (typing.Sequence[str]): command line options
+                of the assembler, such as its optimizers.
+
+        Returns:
+            typing.List[int]: the machine words of the program.
+        """
+        assembly_path = os.path.join(self.directory, name + ".asm")
+        with open(assembly_path, 'w') as assembly_file:
+            assembly_file.write(COMMUTED.sub(r"\1D\3\2", assembly))
+        result = subprocess.run(
+            [sys.executable, ASSEMBLER, *assembler_options, assembly_path],
+            capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertNotIn("not optimized", result.stderr)
+        with open(os.path.join(self.directory, name + ".hack"), 'r') \
+                as hack_file:
+            return [int(line, 2) for line in hack_file.read().split()]
+
+    def check(self, program: str, assembly: str,
+              assembler_options: typing.Sequence[str] = ()) -> None:
+        """Assembles and runs a translation, and compares the RAM.
+
+        Args:
+            program (str): the program directory, relative to this one.
+            assembly (str): the translation of the program.
+            assembler_options (typing.Sequence[str]): see assemble.
+        """
+        name = os.path.basename(program)
+        words = self.assemble(name, assembly, assembler_options)
+
+        path = os.path.join(TEST_DIRECTORY, program, name)
+        with open(path + ".tst", 'r') as test_file:
+            script = test_file.read()
+        ram = {int(address): int(value) % WORD for address, value
+               in re.findall(r"set RAM\[(\d+)\]\s+(-?\d+)", script)}
+        cycles = int(re.search(r"repeat (\d+)", script).group(1))
+        ram = run(words, ram, cycles * CYCLES_FACTOR)
+
+        with open(path + ".cmp", 'r') as compare_file:
+            header, values = compare_file.read().splitlines()[:2]
+        expected = {int(address): int(value) % WORD for address, value in
+                    zip(re.findall(r"RAM\[(\d+)\]", header),
+                        values.strip(" |").split("|"))}
+        self.assertEqual({address: ram.get(address, 0)
+                          for address in expected}, expected)
+
+    def translate(self, program: str, *options: str,
+                  extra_files: typing.Optional[typing.Dict[str, str]] = None) \
+            -> str:
+        """Translates a copy of a program directory with Main.py.
+
+        Args:
+            program (str): the program directory, relative to this one.
+            options (str): command line options of Main.py.
+            extra_files (typing.Optional[typing.Dict[str, str]]): .vm files
+                to add to the copy, by name.
+
+        Returns:
+            str: the translation of the program.
+        """
+        name = os.path.basename(program)
+        input_path = os.path.join(tempfile.mkdtemp(dir=self.directory), name)
+        shutil.copytree(os.path.join(TEST_DIRECTORY, program), input_path)
+        for filename, source in (extra_files or {}).items():
+            with open(os.path.join(input_path, filename), 'w') as vm_file:
+                vm_file.write(source)
+        result = subprocess.run(
+            [sys.executable, "Main.py", *options, input_path],
+            capture_output=True, text=True, cwd=TEST_DIRECTORY)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        with open(os.path.join(input_path, name + ".asm"), 'r') \
+                as assembly_file:
+            return assembly_file.read()
+
+    def test_bootstrapped_programs(self) -> None:
+        for mode, options in MODES.items():
+            for program in BOOTSTRAPPED_PROGRAMS:
+                with self.subTest(mode=mode, program=program):
+                    self.check(program, self.translate(program, *options))
+
+    def test_assembler_optimizers(self) -> None:
+        # the optimizers of the assembler trust the return addresses of the
+        # translator, which are labels:
+        assembler_modes = (("--optimize",), ("--dead-code", "aggressive"),
+                           ("--dead-code", "conservative", "--optimize"))
+        for mode in ("default", "all"):
+            for program in BOOTSTRAPPED_PROGRAMS:
+                assembly = self.translate(program, *MODES[mode])
+                for assembler_options in assembler_modes:
+                    with self.subTest(mode=mode, program=program,
+                                      assembler_options=assembler_options):
+                        self.check(program, assembly, assembler_options)
+
+    def test_uncalled_function(self) -> None:
+        program = "FunctionCalls/FibonacciElement"
+        assembly = self.translate(program, extra_files={
+            "Unused.vm": "function Unused.f 0\npush constant 1\nreturn\n"})
+        self.assertIn("(Unused.f)", assembly)
+        self.check(program, assembly,
+                   ("--dead-code", "aggressive", "--symbol-map"))
+        with open(os.path.join(self.directory, "FibonacciElement.sym.json"),
+                  'r') as symbol_map_file:
+            labels = json.load(symbol_map_file)["labels"]
+        self.assertIn("Main.fibonacci", labels)
+        self.assertNotIn("Unused.f", labels)
+
+    def test_shared_routines(self) -> None:
+        # FibonacciElement compares with lt only, and calls Main.fibonacci
+        # three times, besides the call of Sys.init by the bootstrap code:
+        input_path = os.path.join(self.directory, "FibonacciElement")
+        shutil.copytree(os.path.join(TEST_DIRECTORY, "FunctionCalls",
+                                     "FibonacciElement"), input_path)
+        result = subprocess.run(
+            [sys.executable, "Main.py", "--shared-calls",
+             "--shared-comparisons", input_path],
+            capture_output=True, text=True, cwd=TEST_DIRECTORY)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("over 3 calls", result.stderr)
+        self.assertIn("lt: 1 comparisons", result.stderr)
+        self.assertNotIn("eq:", result.stderr)
+        with open(os.path.join(input_path, "FibonacciElement.asm"), 'r') \
+                as assembly_file:
+            assembly = assembly_file.read()
+        self.assertIn("($LT)", assembly)
+        self.assertNotIn("($EQ)", assembly)
+        self.assertNotIn("($GT)", assembly)
+
+    def test_overflowing_comparisons(self) -> None:
+        # x-y overflows for operands of opposite signs near the ends of the
+        # 16-bit range, which the shared routines compare correctly:
+        cases = ((-32767, 2, "gt", 0), (-32767, 2, "lt", -1),
+                 (32767, -2, "lt", 0), (32767, -2, "gt", -1),
+                 (32767, -32767, "eq", 0), (-32767, -32767, "eq", -1),
+                 (-32767, 32767, "gt", 0), (1, -32767, "gt", -1),
+                 (-2, 32767, "lt", -1), (5, 3, "lt", 0))
+        modes = {"shared-comparisons": {"shared_comparisons": True},
+                 "shared-comparisons and cache-top": {
+                     "shared_comparisons": True, "cache_top": True}}
+        for mode, options in modes.items():
+            for x, y, command, expected in cases:
+                with self.subTest(mode=mode, x=x, y=y, command=command):
+                    input_file = io.StringIO("".join(
+                        f"push constant {abs(value)}\n" +
+                        ("neg\n" if value < 0 else "")
+                        for value in (x, y)) + command + "\n")
+                    input_file.name = "Compare.vm"
+                    output_file = io.StringIO()
+                    code_writer = translate_file(
+                        input_file, output_file, bootstrap=False, **options)
+                    # the routines start with a loop that ends the program:
+                    words = self.assemble(
+                        "Compare", output_file.getvalue() +
+                        comparison_routines(code_writer.comparisons))
+                    ram = run(words, {0: 256}, 1000)
+                    self.assertEqual((ram[0], ram[256]),
+                                     (257, expected % WORD))
+
+    def test_programs(self) -> None:
+        modes = {"default": {}, "cache-top": {"cache_top": True},
+                 "optimize": {"optimizer": Optimizer()},
+                 "cache-top and optimize": {"cache_top": True,
+                                            "optimizer": Optimizer()}}
+        for mode, options in modes.items():
+            for program in PROGRAMS:
+                with self.subTest(mode=mode, program=program):
+                    name = os.path.basename(program)
+                    output_file = io.StringIO()
+                    with open(os.path.join(TEST_DIRECTORY, program,
+                                           name + ".vm"), 'r') as input_file:
+                        translate_file(input_file, output_file,
+                                       bootstrap=False, **options)
+                    self.check(program, output_file.getvalue())
+
+
+if "__main__" == __name__:
+    unittest.main()